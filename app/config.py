@@ -6,6 +6,8 @@ load_dotenv()
 
 
 redis_client = None
+# Same server without response decoding, for binary-encoded records
+redis_binary_client = None
 try:
     import redis
     REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
@@ -13,6 +15,7 @@ try:
 
     try:
         redis_client.ping()
+        redis_binary_client = redis.from_url(REDIS_URL)
         print("✅ Redis connected")
     except Exception as e:
         print(f"⚠️ Redis ping failed: {e} — continuing with redis_client=None")
@@ -22,15 +25,44 @@ except Exception as e:
     redis_client = None
 
 
+def _worker_count() -> int:
+    """Worker processes serving the app (WEB_CONCURRENCY, 'auto' = one per core)."""
+    raw = os.getenv("WEB_CONCURRENCY", "1").strip().lower()
+    if raw == "auto":
+        return os.cpu_count() or 1
+    try:
+        return max(1, int(raw))
+    except ValueError:
+        return 1
+
+WORKER_COUNT = _worker_count()
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "./shared_state.db")
+
+# Per-process memory fallbacks would split jobs between workers, so multi-worker
+# mode without Redis uses a SQLite file shared by all workers on this node.
+if redis_client is None and WORKER_COUNT > 1:
+    if not SHARED_STATE_PATH:
+        raise RuntimeError(
+            f"WEB_CONCURRENCY={WORKER_COUNT} needs shared state: configure REDIS_URL or SHARED_STATE_PATH"
+        )
+    from app.utils.sqlite_store import SQLiteStore
+    redis_client = redis_binary_client = SQLiteStore(SHARED_STATE_PATH)
+    print(f"✅ Using shared SQLite state at {SHARED_STATE_PATH} for {WORKER_COUNT} workers")
+
+
 twilio_client = None
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_WHATSAPP_FROM = os.getenv("TWILIO_WHATSAPP_FROM", "whatsapp:+14155238886")
+# Override the Twilio REST host (e.g. the local stand-in used by the benchmarks)
+TWILIO_API_BASE_URL = os.getenv("TWILIO_API_BASE_URL")
 
 try:
     if TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN:
         from twilio.rest import Client
         twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+        if TWILIO_API_BASE_URL:
+            twilio_client.api.base_url = TWILIO_API_BASE_URL.rstrip("/")
         print("✅ Twilio client initialized")
     else:
         print("⚠️ Twilio credentials not set (TWILIO_ACCOUNT_SID / TWILIO_AUTH_TOKEN). twilio_client=None")
@@ -41,14 +73,130 @@ except Exception as e:
 VIDU_API_KEY = os.getenv("VIDU_API_KEY")
 VIDU_BASE_URL = os.getenv("VIDU_BASE_URL", "https://api.vidu.com")
 HUGGINGFACE_TOKEN = os.getenv("HUGGINGFACE_TOKEN")
+HF_SPACE = os.getenv("HF_SPACE", "hysts/zeroscope-v2")  # Space id or URL of a local stub
+HF_MAX_CONCURRENCY = int(os.getenv("HF_MAX_CONCURRENCY", "2"))
+HF_QUEUE_TIMEOUT_SECONDS = float(os.getenv("HF_QUEUE_TIMEOUT_SECONDS", "30"))
+HF_PREDICT_TIMEOUT_SECONDS = float(os.getenv("HF_PREDICT_TIMEOUT_SECONDS", "300"))
 PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "http://localhost:8000")
+# Near-duplicate prompts: offer an existing video above the first, reuse it silently above the second
+DEDUPE_OFFER_THRESHOLD = float(os.getenv("DEDUPE_OFFER_THRESHOLD", "0.6"))
+DEDUPE_AUTO_THRESHOLD = float(os.getenv("DEDUPE_AUTO_THRESHOLD", "0.95"))
+PROMPT_INDEX_PATH = os.getenv("PROMPT_INDEX_PATH", "./prompt_index.npz")  # empty disables persistence
+
+# Video delivery: "app" streams files from Python, "x-accel" (nginx) / "x-sendfile" (Apache, lighttpd)
+# only authorise the request and let the front proxy send the bytes
+VIDEO_DELIVERY_MODE = os.getenv("VIDEO_DELIVERY_MODE", "app").lower()
+VIDEO_ACCEL_PREFIX = os.getenv("VIDEO_ACCEL_PREFIX", "/_protected/videos/")  # internal nginx location
+# Download links carry an expiring signature when set (the proxy can check it without the app)
+DOWNLOAD_URL_SECRET = os.getenv("DOWNLOAD_URL_SECRET", "")
+DOWNLOAD_URL_TTL_SECONDS = int(os.getenv("DOWNLOAD_URL_TTL_SECONDS", str(60 * 60 * 24)))
+
+# Static frontend (reload edited files from disk; development only)
+STATIC_RELOAD = os.getenv("STATIC_RELOAD", "false").lower() in ("1", "true", "yes")
+
+# WhatsApp rejects media above 16MB; encodes are sized to land under this budget
+WHATSAPP_MAX_MEDIA_BYTES = int(os.getenv("WHATSAPP_MAX_MEDIA_BYTES", str(16_000_000)))
+# Pipe provider downloads straight into ffmpeg instead of download-then-encode
+STREAM_TRANSCODE = os.getenv("STREAM_TRANSCODE", "false").lower() in ("1", "true", "yes")
+
+# Video provider routing
+VIDEO_PROVIDER_ORDER = [p.strip() for p in os.getenv("VIDEO_PROVIDER_ORDER", "vidu,huggingface,mock").split(",") if p.strip()]
+PROVIDER_HEDGE_AFTER_SECONDS = float(os.getenv("PROVIDER_HEDGE_AFTER_SECONDS", "0"))  # 0 disables hedging
+CIRCUIT_WINDOW = int(os.getenv("CIRCUIT_WINDOW", "20"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "3"))
+CIRCUIT_FAILURE_THRESHOLD = float(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "0.5"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "60"))
+
+
+def _provider_seconds(raw: str) -> dict:
+    """Parse '300' (every provider) or 'vidu:300,huggingface:240' into {provider: seconds}, '*' = default."""
+    limits = {}
+    for part in raw.split(","):
+        name, _, seconds = part.rpartition(":")
+        if seconds.strip():
+            limits[name.strip() or "*"] = float(seconds)
+    return limits
+
+
+# Successful calls slower than this count as failures towards opening the circuit (0 = latency ignored)
+CIRCUIT_SLOW_CALL_SECONDS = _provider_seconds(os.getenv("CIRCUIT_SLOW_CALL_SECONDS", "300"))
+
+
+def _class_weights(raw: str) -> dict:
+    """Parse 'whatsapp:4,web:2,batch:1' into {class: weight}."""
+    weights = {}
+    for part in raw.split(","):
+        name, _, weight = part.partition(":")
+        if name.strip() and weight.strip():
+            weights[name.strip()] = max(0.1, float(weight))
+    return weights
+
+
+# Fair scheduling of generation jobs (per process)
+SCHEDULER_MAX_CONCURRENCY = int(os.getenv("SCHEDULER_MAX_CONCURRENCY", "8"))
+SCHEDULER_PER_USER_LIMIT = int(os.getenv("SCHEDULER_PER_USER_LIMIT", "2"))
+SCHEDULER_BATCH_LIMIT = int(os.getenv("SCHEDULER_BATCH_LIMIT", "4"))  # in-flight cap per batch
+SCHEDULER_CLASS_WEIGHTS = _class_weights(os.getenv("SCHEDULER_CLASS_WEIGHTS", "whatsapp:4,web:2,batch:1"))
+
+# Time budget of a job from the moment it starts running; every stage's timeout comes out of it
+JOB_DEADLINE_SECONDS = float(os.getenv("JOB_DEADLINE_SECONDS", "600"))
+
+# Longest multi-clip video a request may ask for
+LONG_VIDEO_MAX_SECONDS = int(os.getenv("LONG_VIDEO_MAX_SECONDS", "32"))
+
+# Admission control: refuse new jobs that could not finish within the SLA
+ADMISSION_SLA_SECONDS = float(os.getenv("ADMISSION_SLA_SECONDS", "600"))
+ADMISSION_MAX_QUEUED_PER_USER = int(os.getenv("ADMISSION_MAX_QUEUED_PER_USER", "3"))
+# Batches are admitted whole: unfinished batch items per client, and the time the last item may take
+ADMISSION_MAX_BATCH_JOBS_PER_CLIENT = int(os.getenv("ADMISSION_MAX_BATCH_JOBS_PER_CLIENT", "200"))
+ADMISSION_BATCH_SLA_SECONDS = float(os.getenv("ADMISSION_BATCH_SLA_SECONDS", "3600"))
+
+# Diagnostics: report event-loop stalls and the stack of the call that blocked
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR", "false").lower() in ("1", "true", "yes")
+LOOP_BLOCK_THRESHOLD_MS = int(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
 
 __all__ = [
     "redis_client",
+    "redis_binary_client",
+    "WORKER_COUNT",
+    "SHARED_STATE_PATH",
     "twilio_client",
     "TWILIO_WHATSAPP_FROM",
     "VIDU_API_KEY",
     "VIDU_BASE_URL",
     "HUGGINGFACE_TOKEN",
+    "HF_SPACE",
+    "HF_MAX_CONCURRENCY",
+    "HF_QUEUE_TIMEOUT_SECONDS",
+    "HF_PREDICT_TIMEOUT_SECONDS",
     "PUBLIC_BASE_URL",
+    "PROMPT_INDEX_PATH",
+    "STATIC_RELOAD",
+    "VIDEO_DELIVERY_MODE",
+    "VIDEO_ACCEL_PREFIX",
+    "DOWNLOAD_URL_SECRET",
+    "DOWNLOAD_URL_TTL_SECONDS",
+    "DEDUPE_OFFER_THRESHOLD",
+    "DEDUPE_AUTO_THRESHOLD",
+    "WHATSAPP_MAX_MEDIA_BYTES",
+    "STREAM_TRANSCODE",
+    "VIDEO_PROVIDER_ORDER",
+    "PROVIDER_HEDGE_AFTER_SECONDS",
+    "CIRCUIT_WINDOW",
+    "CIRCUIT_MIN_CALLS",
+    "CIRCUIT_FAILURE_THRESHOLD",
+    "CIRCUIT_OPEN_SECONDS",
+    "CIRCUIT_SLOW_CALL_SECONDS",
+    "SCHEDULER_MAX_CONCURRENCY",
+    "SCHEDULER_PER_USER_LIMIT",
+    "SCHEDULER_BATCH_LIMIT",
+    "SCHEDULER_CLASS_WEIGHTS",
+    "JOB_DEADLINE_SECONDS",
+    "LONG_VIDEO_MAX_SECONDS",
+    "ADMISSION_SLA_SECONDS",
+    "ADMISSION_MAX_QUEUED_PER_USER",
+    "ADMISSION_MAX_BATCH_JOBS_PER_CLIENT",
+    "ADMISSION_BATCH_SLA_SECONDS",
+    "LOOP_MONITOR_ENABLED",
+    "LOOP_BLOCK_THRESHOLD_MS",
 ]
@@ -1,10 +1,13 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List, Dict
 
 
 # Existing models
 class Video_Request(BaseModel):
     prompt: str
+    allow_reuse: bool = True  # serve an existing video for a near-identical prompt
+    duration: Optional[int] = None  # seconds; longer than one clip makes a multi-clip video
+    shots: Optional[List[str]] = None  # one prompt per clip, in order (overrides duration)
 
 class Video_Job_Created_Response(BaseModel):
     job_id: str
@@ -16,3 +19,39 @@ class Status_Response(BaseModel):
     status: str
     message: str
     video_url: Optional[str] = None
+    poster_url: Optional[str] = None
+    preview_url: Optional[str] = None
+    eta_seconds: Optional[int] = None   # estimated seconds until the video is ready
+    progress: int = 0
+    next_poll_ms: Optional[int] = None  # when polling again is likely to see a change
+
+class Job_Cancel_Response(BaseModel):
+    job_id: str
+    status: str
+    message: str
+
+class Video_Batch_Request(BaseModel):
+    items: List[Video_Request]
+
+class Video_Batch_Created_Response(BaseModel):
+    batch_id: str
+    status: str
+    total: int
+    job_ids: List[str]
+
+class Batch_Item_Status(BaseModel):
+    job_id: str
+    status: str
+    message: str
+    progress: int = 0
+    video_url: Optional[str] = None
+
+class Batch_Status_Response(BaseModel):
+    batch_id: str
+    status: str
+    total: int
+    finished: int
+    counts: Dict[str, int]
+    progress: int
+    provider_slots: Dict[str, int]
+    items: List[Batch_Item_Status]
@@ -1,101 +1,329 @@
 # app/routes/web.py
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import HTMLResponse, FileResponse
-from pathlib import Path
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import HTMLResponse, StreamingResponse
 import os
 import uuid
 import asyncio
+import json
+import hashlib
+import time
+from typing import Optional
 
-from app.models import Video_Request, Video_Job_Created_Response, Status_Response
-from app.services.video_service import video_generation_process
+from app.models import (
+    Video_Request, Video_Job_Created_Response, Status_Response, Job_Cancel_Response,
+    Video_Batch_Request, Video_Batch_Created_Response, Batch_Status_Response
+)
+from app.services.video_service import video_generation_process, plan_shots, VIDU_CLIP_SECONDS
+from app.services.provider_service import get_provider_status
+from app.services.scheduler_service import schedule_job, get_scheduler_status
+from app.services.admission_service import (
+    AdmissionRejected, check_admission, check_batch_admission, get_admission_status,
+)
+from app.services.dedupe_service import find_similar_video_async, reuse_video
+from app.config import DEDUPE_AUTO_THRESHOLD, LONG_VIDEO_MAX_SECONDS
+from app.services.huggingface_service import get_hf_status
+from app.services.batch_service import (
+    BATCH_MAX_ITEMS, TERMINAL_STATUSES, create_batch, run_batch,
+    get_batch_data, get_batch_items, get_batch_summary
+)
 from app.services.redis_service import store_job_data, get_job_data
+from app.services.timeline_service import start_job_timeline, get_job_timeline, get_timeline_percentiles
+from app.services.static_service import get_asset, asset_response, etag_matches
+from app.services.job_watch_service import MAX_WAIT_SECONDS, wait_for_job_change
+from app.services.eta_service import estimate_job
+from app.services.delivery_service import sign_url, verify_signature, file_response
+from app.services.cancel_service import cancel_job
+from app.services.loop_monitor_service import get_loop_metrics, get_recent_stalls, reset_loop_metrics
 
 router = APIRouter()
 
-# Compute STATIC_DIR robustly relative to this file:
-BASE_DIR = Path(__file__).resolve().parents[1]  # <project_root>/app
-STATIC_DIR = BASE_DIR / "static"
-
-def _static_path(filename: str) -> Path:
-    """Return resolved static path if exists, else None."""
-    candidate = (STATIC_DIR / filename).resolve()
-    # ensure the resolved path is still within STATIC_DIR (safety)
-    try:
-        if STATIC_DIR.resolve() in candidate.parents or candidate == STATIC_DIR.resolve():
-            if candidate.exists():
-                return candidate
-    except Exception:
-        pass
-    return None
-
 @router.get("/", response_class=HTMLResponse)
-async def serve_html():
-    """Serves the HTML page"""
-    index_file = _static_path("index.html")
+async def serve_html(request: Request):
+    """Serves the HTML page (from memory, asset links fingerprinted)"""
+    index_file = get_asset("index.html")
     if index_file:
-        return HTMLResponse(content=index_file.read_text(encoding="utf-8"))
+        return asset_response(index_file, request)
     return HTMLResponse("<h1>AI Video Generator</h1><p>Frontend not available</p>")
 
+@router.get("/assets/{filename}")
+async def serve_fingerprinted_asset(filename: str, request: Request):
+    """Fingerprinted assets never change, so they may be cached for a year"""
+    asset = get_asset(filename)
+    if asset and filename == asset.fingerprinted_name:
+        return asset_response(asset, request, immutable=True)
+    # an outdated fingerprint (e.g. a page cached across a deploy): serve the current file, uncached
+    stem, _, suffix = filename.rpartition(".")
+    asset = get_asset(f"{stem.rpartition('.')[0]}.{suffix}")
+    if asset:
+        return asset_response(asset, request)
+    raise HTTPException(status_code=404, detail=f"{filename} not found")
+
 @router.get("/style.css")
-async def serve_css():
+async def serve_css(request: Request):
     """Serves the CSS file"""
-    css = _static_path("style.css")
-    if css:
-        return FileResponse(str(css), media_type="text/css")
-    raise HTTPException(status_code=404, detail="style.css not found")
+    return _serve_static("style.css", request)
 
 @router.get("/script.js")
-async def serve_js():
+async def serve_js(request: Request):
     """Serves the Javascript file"""
-    js = _static_path("script.js")
-    if js:
-        return FileResponse(str(js), media_type="text/javascript")
-    raise HTTPException(status_code=404, detail="script.js not found")
+    return _serve_static("script.js", request)
+
+@router.get("/static/{filename}")
+async def serve_static(filename: str, request: Request):
+    """Unfingerprinted URLs used by older pages; revalidated with the ETag"""
+    return _serve_static(filename, request)
+
+def _serve_static(filename: str, request: Request):
+    asset = get_asset(filename)
+    if not asset or filename == "index.html":
+        raise HTTPException(status_code=404, detail=f"{filename} not found")
+    return asset_response(asset, request)
+
+async def _admit(admission) -> None:
+    """Reject early (429/503 with Retry-After, 413 without) instead of queueing work that would miss the SLA"""
+    try:
+        await admission
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.reason,
+            headers={"Retry-After": str(e.retry_after)} if e.retry_after is not None else None
+        )
+
+def _plan_shots(request: Video_Request) -> list:
+    """The clip prompts of a request: its shot list, or the prompt split to fill `duration`."""
+    if request.shots is not None:
+        shots = [shot.strip() for shot in request.shots if shot.strip()]
+        if not shots:
+            raise HTTPException(status_code=400, detail="Shots must not be empty")
+        if len(shots) * VIDU_CLIP_SECONDS > LONG_VIDEO_MAX_SECONDS:
+            raise HTTPException(status_code=400, detail=f"At most {LONG_VIDEO_MAX_SECONDS // VIDU_CLIP_SECONDS} shots")
+        return shots
+
+    duration = request.duration or VIDU_CLIP_SECONDS
+    if not 0 < duration <= LONG_VIDEO_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"Duration must be between 1 and {LONG_VIDEO_MAX_SECONDS} seconds")
+    return plan_shots(request.prompt, duration)
 
 @router.post("/api/generate-video", response_model=Video_Job_Created_Response)
-async def generate_video(request: Video_Request):
+async def generate_video(request: Video_Request, http_request: Request):
     """Start the Video Generation Process (for web app)."""
     if not request.prompt.strip():
         raise HTTPException(status_code=400, detail="Prompt is required")
 
+    shots = _plan_shots(request)
+
+    # a near-identical prompt is served from the existing video, no generation needed
+    if request.allow_reuse and len(shots) < 2:
+        match = await find_similar_video_async(request.prompt, threshold=DEDUPE_AUTO_THRESHOLD)
+        reused_job_id = reuse_video(match["job_id"], request.prompt) if match else None
+        if reused_job_id:
+            return Video_Job_Created_Response(
+                job_id=reused_job_id,
+                status="completed",
+                message="A very similar video already existed"
+            )
+
+    # browsers are keyed by client address for fairness and per-user limits
+    client = http_request.client.host if http_request.client else "unknown"
+    await _admit(check_admission(f"web:{client}", "web"))
+
     job_id = str(uuid.uuid4())
 
     # Store in Redis / fallback
     job_data = {
-        "status": "processing",
-        "message": "Video generation has started",
+        "status": "queued",
+        "message": "Waiting for a free generation slot...",
         "video_url": None,
         "prompt": request.prompt
     }
+    if len(shots) > 1:
+        job_data["shots"] = shots
 
     store_job_data(job_id, job_data)
+    start_job_timeline(job_id)
 
-    # Start generation in background (non-blocking)
-    asyncio.create_task(video_generation_process(job_id, request.prompt))
+    # Queue generation in the background (non-blocking)
+    schedule_job(job_id, f"web:{client}", "web", video_generation_process, job_id, request.prompt)
 
     return Video_Job_Created_Response(
         job_id=job_id,
-        status="processing",
-        message="Video generation has started"
+        status="queued",
+        message="Waiting for a free generation slot..."
     )
 
+@router.post("/api/generate-video/batch", response_model=Video_Batch_Created_Response)
+async def generate_video_batch(request: Video_Batch_Request, http_request: Request):
+    """Queue many prompts at once; they run within the provider's concurrency limit."""
+    if not request.items:
+        raise HTTPException(status_code=400, detail="At least one item is required")
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+
+    if not all(item.prompt.strip() for item in request.items):
+        raise HTTPException(status_code=400, detail="Every item needs a prompt")
+    # items take the same options as single requests (invalid durations are a 400 here too)
+    items = [
+        {"prompt": item.prompt.strip(), "shots": _plan_shots(item), "allow_reuse": item.allow_reuse}
+        for item in request.items
+    ]
+
+    # the whole batch must fit, and a client's batches are capped together
+    client = http_request.client.host if http_request.client else "unknown"
+    await _admit(check_batch_admission(client, len(items)))
+
+    batch = await create_batch(items, client)
+    asyncio.create_task(run_batch(batch["batch_id"]))
+
+    return Video_Batch_Created_Response(
+        batch_id=batch["batch_id"],
+        status=batch["status"],
+        total=len(batch["job_ids"]),
+        job_ids=batch["job_ids"]
+    )
+
+@router.get("/api/batches/{batch_id}", response_model=Batch_Status_Response)
+async def get_batch_status(batch_id: str):
+    """Aggregate progress of a batch and the status of every item"""
+    summary = get_batch_summary(batch_id)
+    if not summary:
+        raise HTTPException(status_code=404, detail="Batch ID not found")
+    return summary
+
+@router.get("/api/batches/{batch_id}/events")
+async def stream_batch_events(batch_id: str):
+    """Server-sent events: one event per item status change, then a final summary"""
+    batch = get_batch_data(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch ID not found")
+
+    async def events():
+        last_seen = {}
+        while True:
+            items = get_batch_items(batch)
+            for item in items:
+                key = (item["status"], item["progress"], item["message"])
+                if last_seen.get(item["job_id"]) != key:
+                    last_seen[item["job_id"]] = key
+                    yield f"event: item\ndata: {json.dumps(item)}\n\n"
+            if all(item["status"] in TERMINAL_STATUSES + ("unknown",) for item in items):
+                summary = get_batch_summary(batch_id) or {}
+                summary.pop("items", None)
+                yield f"event: done\ndata: {json.dumps(summary)}\n\n"
+                return
+            await asyncio.sleep(1)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def _status_etag(job_data: dict) -> str:
+    """
+    Changes only with what the status response shows. Internal fields, link signatures and
+    the time-derived ETA/progress don't count, clients extrapolate those between responses.
+    """
+    visible = [job_data.get(k) for k in ("status", "message", "video_url", "poster_path", "preview_path")]
+    return f'W/"{hashlib.sha1(json.dumps(visible).encode()).hexdigest()[:16]}"'
+
 @router.get("/api/status/{job_id}", response_model=Status_Response)
-async def get_status(job_id: str):
-    """Get the status of Video generation"""
+async def get_status(job_id: str, request: Request, response: Response, wait: float = 0):
+    """
+    Get the status of Video generation. With If-None-Match and ?wait=N the request is held
+    until the status changes (or N seconds pass, 304 then) instead of being polled.
+    """
     job_data = get_job_data(job_id)
     if not job_data:
         raise HTTPException(status_code=404, detail="Job ID not found")
 
+    if_none_match = request.headers.get("if-none-match", "")
+    deadline = time.monotonic() + min(max(wait, 0), MAX_WAIT_SECONDS)
+    while (etag_matches(if_none_match, _status_etag(job_data))
+           and job_data.get("status") not in TERMINAL_STATUSES
+           and time.monotonic() < deadline):
+        job_data = await wait_for_job_change(job_id, job_data.get("version", 0), deadline - time.monotonic()) or job_data
+
+    headers = {"ETag": _status_etag(job_data), "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
     return Status_Response(
         job_id=job_id,
         status=job_data.get("status", "unknown"),
         message=job_data.get("message", ""),
-        video_url=job_data.get("video_url")
+        video_url=sign_url(job_data.get("video_url")),
+        poster_url=f"/api/preview/{job_id}/poster.jpg" if job_data.get("poster_path") else None,
+        preview_url=f"/api/preview/{job_id}/preview.gif" if job_data.get("preview_path") else None,
+        **estimate_job(job_id, job_data)
     )
 
+@router.get("/api/jobs/{job_id}/timeline")
+async def get_timeline(job_id: str):
+    """Get the stage timeline of a video generation job"""
+    timeline = get_job_timeline(job_id)
+    if not timeline:
+        raise HTTPException(status_code=404, detail="Job ID not found")
+    return timeline
+
+@router.delete("/api/jobs/{job_id}", response_model=Job_Cancel_Response)
+async def delete_job(job_id: str):
+    """Cancel a queued or running job and free everything it holds"""
+    status = await cancel_job(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job ID not found")
+    if status != "cancelled":
+        raise HTTPException(status_code=409, detail=f"Job already {status}")
+    return Job_Cancel_Response(job_id=job_id, status="cancelled", message="Video generation cancelled")
+
+@router.get("/api/timeline/percentiles")
+async def get_stage_percentiles(limit: int = 200):
+    """Stage duration percentiles across recent finished jobs"""
+    return get_timeline_percentiles(limit=max(1, min(limit, 500)))
+
+@router.get("/api/providers")
+async def get_providers():
+    """Routing order and circuit breaker state of the video providers"""
+    return dict(get_provider_status(), huggingface=get_hf_status())
+
+@router.get("/api/scheduler")
+async def get_scheduler():
+    """Queue depth per priority class and in-flight jobs of the fair scheduler"""
+    return dict(get_scheduler_status(), admission=get_admission_status())
+
+@router.get("/api/debug/loop")
+async def get_loop_diagnostics(limit: int = 20, reset: bool = False):
+    """Event-loop lag, stalls per route/job and blocking call site, and the latest stall stacks"""
+    report = dict(get_loop_metrics(), recent=get_recent_stalls(max(0, min(limit, 50))))
+    if reset:
+        reset_loop_metrics()
+    return report
+
+PREVIEW_FILES = {
+    "poster.jpg": ("poster_path", "image/jpeg"),
+    "preview.gif": ("preview_path", "image/gif"),
+}
+
+@router.get("/api/preview/{job_id}/{name}")
+async def download_preview(job_id: str, name: str):
+    """Serve the poster frame or animated preview (available before the video is done)"""
+    if name not in PREVIEW_FILES:
+        raise HTTPException(status_code=404, detail="Unknown preview")
+
+    job_data = get_job_data(job_id)
+    if not job_data:
+        raise HTTPException(status_code=404, detail="Job ID not found")
+
+    key, media_type = PREVIEW_FILES[name]
+    path = job_data.get(key)
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Preview not ready")
+
+    return file_response(path, media_type)
+
 @router.get("/api/download/{job_id}")
-async def download_video(job_id: str):
-    """Serve the Video File (real or mock)"""
+async def download_video(job_id: str, expires: Optional[int] = None, md5: Optional[str] = None):
+    """Serve the Video File (real or mock); the bytes come from the front proxy in the offload modes"""
+    if not verify_signature(f"/api/download/{job_id}", expires, md5):
+        raise HTTPException(status_code=403, detail="Download link is invalid or has expired")
+
     job_data = get_job_data(job_id)
     if not job_data:
         raise HTTPException(status_code=404, detail="Job ID not found")
@@ -107,9 +335,9 @@ async def download_video(job_id: str):
     if not video_path or not os.path.exists(video_path):
         raise HTTPException(status_code=404, detail="Video file not found")
 
-    return FileResponse(
+    return file_response(
         video_path,
-        media_type="video/mp4",
+        "video/mp4",
         headers={
             "Content-Disposition": f"inline; filename={job_id}.mp4",
             "Accept-Ranges": "bytes"
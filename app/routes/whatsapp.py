@@ -3,19 +3,86 @@ from app.services.whatsapp_service import (
     send_whatsapp_message,
     handle_whatsapp_command,
     handle_whatsapp_video_generation,
+    reject_if_busy,
+    deliver_video_result,
     send_progress_update
 )
 
 from app.services.redis_service import (
     store_user_state, get_user_state, clear_user_state,
-    store_conversation_context, is_user_rate_limited,
-    get_rate_limit_message, generate_contextual_response, get_smart_suggestions
+    store_conversation_context, clear_conversation_context, is_user_rate_limited,
+    get_rate_limit_message
 )
+from app.services.suggestion_service import generate_contextual_response, get_smart_suggestions
+from app.services.dedupe_service import find_similar_video_async, reuse_video
 from app.utils.filters import comprehensive_content_filter
-from app.config import twilio_client, redis_client
+from app.config import twilio_client, redis_client, DEDUPE_AUTO_THRESHOLD
 
 router = APIRouter()
 
+
+def _send_enhancement_choice(user_phone: str, prompt: str) -> dict:
+    """Offer the enhanced prompt and wait for the 1/2/3 reply"""
+    from app.services.video_service import enhance_prompt_free
+
+    # Generate enhanced version
+    enhanced_prompt = enhance_prompt_free(prompt)
+    
+    # Ask user for enhancement choice
+    choice_msg = f"""✨ *Enhance your prompt for better video quality?*
+
+*Original:* {prompt}
+
+*Enhanced:* {enhanced_prompt[:120]}{'...' if len(enhanced_prompt) > 120 else ''}
+
+*Choose an option:*
+1️⃣ *YES* - Use enhanced version (recommended)
+2️⃣ *NO* - Keep original
+3️⃣ *EDIT* - Edit enhanced version
+
+Reply with *1*, *2*, or *3* """
+    
+    # Store state with SAFE dictionary access
+    store_user_state(user_phone, {
+        "state": "awaiting_enhancement_choice",
+        "data": {
+            "original_prompt": prompt,  # Use the current prompt, not data["original_prompt"]
+            "enhanced_prompt": enhanced_prompt
+        }
+    })
+    
+    send_whatsapp_message(user_phone, choice_msg)
+    return {"status": "enhancement_choice_sent"}
+
+
+def _offer_similar_video(user_phone: str, prompt: str, match: dict, background_tasks: BackgroundTasks) -> dict:
+    """Serve a near-identical existing video, or ask whether to reuse a similar one"""
+    if match["similarity"] >= DEDUPE_AUTO_THRESHOLD:
+        job_id = reuse_video(match["job_id"], prompt, user_phone)
+        if job_id:
+            send_whatsapp_message(user_phone, "♻️ We already made a video for this prompt, sending it right away!")
+            background_tasks.add_task(deliver_video_result, job_id, user_phone)
+            return {"status": "reused_video"}
+
+    offer_msg = f"""🎞️ *A very similar video already exists*
+
+*Your prompt:* {prompt}
+*Existing video:* {match['prompt'][:120]}{'...' if len(match['prompt']) > 120 else ''}
+*Similarity:* {int(match['similarity'] * 100)}%
+
+*Choose an option:*
+1️⃣ *USE IT* - Get the existing video now
+2️⃣ *NEW* - Generate a fresh video
+
+Reply with *1* or *2* """
+    store_user_state(user_phone, {
+        "state": "awaiting_duplicate_choice",
+        "data": {"prompt": prompt, "match_job_id": match["job_id"]}
+    })
+    send_whatsapp_message(user_phone, offer_msg)
+    return {"status": "duplicate_choice_sent"}
+
+
 @router.post("/webhook/whatsapp")
 async def whatsapp_webhook(
     background_tasks: BackgroundTasks,
@@ -46,7 +113,8 @@ async def whatsapp_webhook(
         print(f"🚫 Rate limited user: {user_phone}")
         return {"status": "rate_limited"}
     
-    if not message_text.startswith('/'):
+    # a pending choice (duplicate video, prompt enhancement) takes the reply, not the suggestions
+    if not message_text.startswith('/') and not get_user_state(user_phone):
         contextual_response = generate_contextual_response(user_phone, message_text)
         if contextual_response:
             send_whatsapp_message(user_phone, contextual_response)
@@ -55,17 +123,28 @@ async def whatsapp_webhook(
     # Handle /suggestions command
     if message_text.lower() == '/suggestions':
         suggestions = get_smart_suggestions(user_phone)
-        send_whatsapp_message(user_phone, f"💡 *Personalized Suggestions:*\n\n{suggestions}")
+        suggestion_lines = "\n".join(f"• {s}" for s in suggestions)
+        send_whatsapp_message(user_phone, f"💡 *Personalized Suggestions:*\n\n{suggestion_lines}")
         return {"status": "suggestions_sent"}
     
     # Handle /clear command
     if message_text.lower() == '/clear':
-        context_key = f"context:{user_phone}"
-        if redis_client:
-            redis_client.delete(context_key)
+        clear_conversation_context(user_phone)
         clear_response = "🧹 *Conversation history cleared!*\n\nYour chat history has been reset. Fresh start! 🆕"
         send_whatsapp_message(user_phone, clear_response)
         return {"status": "history_cleared"}
+
+    # Handle /cancel command
+    if message_text.lower() == '/cancel':
+        from app.services.cancel_service import cancel_user_jobs
+
+        clear_user_state(user_phone)  # drops a pending enhancement choice too
+        cancelled = await cancel_user_jobs(user_phone)
+        if cancelled:
+            send_whatsapp_message(user_phone, f"🛑 Cancelled {cancelled} video{'s' if cancelled != 1 else ''} in progress.")
+        else:
+            send_whatsapp_message(user_phone, "Nothing to cancel, no video is in progress.")
+        return {"status": "jobs_cancelled", "cancelled": cancelled}
  
     from app.services.video_service import get_vidu_credits, calculate_videos_remaining, enhance_prompt_free
     
@@ -107,7 +186,7 @@ Try `/help` for other commands or contact support."""
         send_whatsapp_message(user_phone, credits_message)
         return {"status": "credits_sent"}
     
-    if not redis_client.get(f"user_welcomed:{user_phone}"):
+    if redis_client and not redis_client.get(f"user_welcomed:{user_phone}"):
         if not Body.strip().startswith("/"):
             welcome_text = """🤖 *Welcome*
 
@@ -118,6 +197,7 @@ Try `/help` for other commands or contact support."""
 • `/history` - View recent prompts
 • `/credits` - Check no of credits left
 • `/suggestions` - Get personalized video prompts based on user history
+• `/cancel` - Stop the video being generated
 • `/clear` - Reset conversation history for privacy
 
 *Example:*
@@ -198,6 +278,22 @@ Just type: `/generate dancing robot`
                     send_whatsapp_message(user_phone, "❌ Please reply with:\n*1* (YES), *2* (NO) or *3* (EDIT)")
                     return {"status": "invalid_choice"}
 
+            elif state == "awaiting_duplicate_choice":
+                if message_text == '1':
+                    clear_user_state(user_phone)
+                    job_id = reuse_video(data.get("match_job_id", ""), data.get("prompt", ""), user_phone)
+                    if job_id:
+                        background_tasks.add_task(deliver_video_result, job_id, user_phone)
+                        return {"status": "reused_video"}
+                    send_whatsapp_message(user_phone, "😔 That video is no longer available, let's make a new one.")
+                    return _send_enhancement_choice(user_phone, data.get("prompt", ""))
+                elif message_text == '2':
+                    clear_user_state(user_phone)
+                    return _send_enhancement_choice(user_phone, data.get("prompt", ""))
+                else:
+                    send_whatsapp_message(user_phone, "❌ Please reply with:\n*1* (USE IT) or *2* (NEW)")
+                    return {"status": "invalid_choice"}
+
             elif state == "awaiting_user_edit":
                 # User has typed their edited prompt
                 edited_prompt = message_text.strip()
@@ -231,6 +327,22 @@ Make it more descriptive for better results """
                 send_whatsapp_message(user_phone, error_msg)
                 return {"status": "prompt_too_short"}
             
+            is_safe, filter_error = comprehensive_content_filter(prompt)
+            if not is_safe:
+                if filter_error and filter_error.strip():
+                    send_whatsapp_message(user_phone, filter_error)
+                else:
+                    send_whatsapp_message(user_phone, "❌ Content not allowed. Please try a different prompt.")
+                print(f"🚫 Content blocked from {user_phone}: {prompt[:50]}...")
+                return {"status": "content_blocked"}
+
+            match = await find_similar_video_async(prompt)
+            if match:
+                return _offer_similar_video(user_phone, prompt, match, background_tasks)
+
+            if await reject_if_busy(user_phone):
+                return {"status": "busy"}
+            
             remaining, package_info = await get_vidu_credits()
     
             if remaining is not None:
@@ -252,43 +364,7 @@ You have *{remaining} credits* remaining, but need at least *4 credits* to gener
             else:
                 credits_info = "\n\n💳 *Credits:* Unable to check current balance"
                 
-            is_safe, filter_error = comprehensive_content_filter(prompt)
-            if not is_safe:
-                if filter_error and filter_error.strip():
-                    send_whatsapp_message(user_phone, filter_error)
-                else:
-                    send_whatsapp_message(user_phone, "❌ Content not allowed. Please try a different prompt.")
-                print(f"🚫 Content blocked from {user_phone}: {prompt[:50]}...")
-                return {"status": "content_blocked"}
-            
-            # Generate enhanced version
-            enhanced_prompt = enhance_prompt_free(prompt)
-            
-            # Ask user for enhancement choice
-            choice_msg = f"""✨ *Enhance your prompt for better video quality?*
-
-*Original:* {prompt}
-
-*Enhanced:* {enhanced_prompt[:120]}{'...' if len(enhanced_prompt) > 120 else ''}
-
-*Choose an option:*
-1️⃣ *YES* - Use enhanced version (recommended)
-2️⃣ *NO* - Keep original
-3️⃣ *EDIT* - Edit enhanced version
-
-Reply with *1*, *2*, or *3* """
-            
-            # Store state with SAFE dictionary access
-            store_user_state(user_phone, {
-                "state": "awaiting_enhancement_choice",
-                "data": {
-                    "original_prompt": prompt,  # Use the current prompt, not data["original_prompt"]
-                    "enhanced_prompt": enhanced_prompt
-                }
-            })
-            
-            send_whatsapp_message(user_phone, choice_msg)
-            return {"status": "enhancement_choice_sent"}
+            return _send_enhancement_choice(user_phone, prompt)
 
         elif message_text.startswith('/'):
             response = handle_whatsapp_command(message_text, user_phone)
@@ -311,6 +387,7 @@ Other commands:
 /credits - To show no of credits
 /history - To show prompt history
 /suggestions - Get personalized video prompts based on user history
+/cancel - Stop the video being generated
 /clear - Reset conversation history for privacy"""
             send_whatsapp_message(user_phone, help_text)
             return {"status": "help_sent"}
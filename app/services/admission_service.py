@@ -0,0 +1,146 @@
+# app/services/admission_service.py
+import math
+import os
+import time
+from typing import Optional
+
+from app.config import (
+    ADMISSION_SLA_SECONDS,
+    ADMISSION_MAX_QUEUED_PER_USER,
+    ADMISSION_MAX_BATCH_JOBS_PER_CLIENT,
+    ADMISSION_BATCH_SLA_SECONDS,
+)
+from app.services import media_service
+from app.services.batch_service import VIDU_GATE
+from app.services.scheduler_service import SCHEDULER, vidu_gates_dispatch
+from app.services.timeline_service import get_recent_job_ids, stage_durations
+from app.services.redis_service import get_job_data
+
+# Used until enough jobs have finished to measure it
+DEFAULT_JOB_SECONDS = 180
+LATENCY_SAMPLE_JOBS = 100
+LATENCY_CACHE_SECONDS = 30
+MIN_RETRY_AFTER_SECONDS = 30
+
+_latency_cache = {"value": float(DEFAULT_JOB_SECONDS), "at": 0.0}
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a new job can't be accepted; carries the HTTP status and Retry-After hint.
+    retry_after is None when retrying the same request can never succeed.
+    """
+
+    def __init__(self, status_code: int, retry_after: Optional[int], reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+def job_service_seconds() -> float:
+    """p90 time a job spends running (excluding its wait in the queue) over recent finished jobs."""
+    if time.monotonic() - _latency_cache["at"] < LATENCY_CACHE_SECONDS:
+        return _latency_cache["value"]
+
+    samples = []
+    for job_id in get_recent_job_ids(LATENCY_SAMPLE_JOBS):
+        job = get_job_data(job_id)
+        if not job or job.get("status") != "completed":
+            continue
+        durations = stage_durations(job.get("timeline") or [])
+        if "total" in durations:
+            samples.append((durations["total"] - durations.get("queued", 0) - durations.get("completed", 0)) / 1000)
+
+    if len(samples) >= 5:
+        samples.sort()
+        _latency_cache["value"] = max(1.0, samples[math.ceil(0.9 * len(samples)) - 1])
+    _latency_cache["at"] = time.monotonic()
+    return _latency_cache["value"]
+
+
+def provider_capacity() -> int:
+    """Jobs that can run at once: scheduler slots, capped by the Vidu slots left to us while jobs go to Vidu."""
+    if not vidu_gates_dispatch():
+        return SCHEDULER.max_concurrency
+    return max(1, min(SCHEDULER.max_concurrency, VIDU_GATE.limit - VIDU_GATE.external))
+
+
+def estimate_completion_seconds(job_class: str = "web", extra_jobs: int = 1) -> float:
+    """
+    Rough time until a job submitted now would finish: the backlog ahead of it
+    drains in waves of `capacity` jobs, each taking about one service time.
+    Queued jobs of lower-weight classes are mostly overtaken, so they don't count.
+    A batch's own items run at most SCHEDULER_BATCH_LIMIT at a time.
+    ffmpeg work beyond the CPU count stretches service time proportionally.
+    """
+    weight = SCHEDULER.weights.get(job_class, 1.0)
+    ahead = sum(
+        count for c, count in SCHEDULER.queued_by_class().items()
+        if SCHEDULER.weights.get(c, 1.0) >= weight
+    )
+    capacity = provider_capacity()
+    backlog = ahead + SCHEDULER.in_flight + VIDU_GATE.queue_count
+    cpus = os.cpu_count() or 1
+    slowdown = max(1.0, media_service.ACTIVE_FFMPEG / cpus)
+    if job_class == "batch":
+        waves = math.ceil(backlog / capacity) + math.ceil(extra_jobs / min(capacity, SCHEDULER.batch_limit))
+    else:
+        waves = math.ceil((backlog + extra_jobs) / capacity)
+    return waves * job_service_seconds() * slowdown
+
+
+async def check_admission(user: str, job_class: str, extra_jobs: int = 1) -> None:
+    """Raise AdmissionRejected if the user or the whole system can't take another job in time."""
+    await VIDU_GATE.refresh()
+    user_limit = SCHEDULER.per_user_limit + ADMISSION_MAX_QUEUED_PER_USER
+    if SCHEDULER.user_load(user) + extra_jobs > user_limit:
+        retry_after = max(MIN_RETRY_AFTER_SECONDS, int(job_service_seconds()))
+        raise AdmissionRejected(429, retry_after, "Too many videos in progress for this user")
+
+    estimate = estimate_completion_seconds(job_class, extra_jobs)
+    if estimate > ADMISSION_SLA_SECONDS:
+        retry_after = max(MIN_RETRY_AFTER_SECONDS, int(estimate - ADMISSION_SLA_SECONDS))
+        raise AdmissionRejected(503, retry_after, "Video generation is at capacity")
+
+
+async def check_batch_admission(client: str, items: int) -> None:
+    """Admit a whole batch or none of it: per-client cap on unfinished batch items, then the batch SLA."""
+    await VIDU_GATE.refresh()
+    if SCHEDULER.prefix_load(f"batch:{client}:") + items > ADMISSION_MAX_BATCH_JOBS_PER_CLIENT:
+        retry_after = max(MIN_RETRY_AFTER_SECONDS, int(job_service_seconds()))
+        raise AdmissionRejected(429, retry_after, "Too many batch videos in progress for this client")
+
+    # a batch that can't finish in time even on an idle system will never fit: say how big one may be
+    wave_seconds = job_service_seconds() * max(1.0, media_service.ACTIVE_FFMPEG / (os.cpu_count() or 1))
+    max_items = int(ADMISSION_BATCH_SLA_SECONDS // wave_seconds) * min(provider_capacity(), SCHEDULER.batch_limit)
+    if items > max_items:
+        # no Retry-After: the same batch won't fit later either, only a smaller one will
+        raise AdmissionRejected(413, None, f"Batch too large to finish in time: send at most {max(1, max_items)} items per batch")
+
+    estimate = estimate_completion_seconds("batch", items)
+    if estimate > ADMISSION_BATCH_SLA_SECONDS:
+        retry_after = max(MIN_RETRY_AFTER_SECONDS, int(estimate - ADMISSION_BATCH_SLA_SECONDS))
+        raise AdmissionRejected(503, retry_after, "Video generation can't fit this batch right now")
+
+
+def get_admission_status() -> dict:
+    return {
+        "sla_seconds": ADMISSION_SLA_SECONDS,
+        "job_service_seconds": round(job_service_seconds(), 1),
+        "estimated_completion_seconds": {
+            c: round(estimate_completion_seconds(c), 1) for c in SCHEDULER.weights
+        },
+        "active_ffmpeg": media_service.ACTIVE_FFMPEG,
+        "provider_queue": VIDU_GATE.queue_count,
+    }
+
+
+__all__ = [
+    "AdmissionRejected",
+    "check_admission",
+    "check_batch_admission",
+    "provider_capacity",
+    "estimate_completion_seconds",
+    "get_admission_status",
+]
@@ -0,0 +1,255 @@
+# app/services/batch_service.py
+import asyncio
+import json
+import time
+import uuid
+from typing import Dict, Any, List, Optional
+
+from app.config import redis_client, DEDUPE_AUTO_THRESHOLD
+from app.services.redis_service import store_job_data, get_job_data, update_job_data, JOB_TTL_SECONDS
+from app.services.timeline_service import start_job_timeline
+from app.services.delivery_service import sign_url
+from app.services.dedupe_service import find_similar_video, reuse_video
+
+# In-memory fallback
+BATCHES: Dict[str, Dict[str, Any]] = {}
+
+BATCH_MAX_ITEMS = 100
+# Used until the provider has reported its own limit
+DEFAULT_PROVIDER_CONCURRENCY = 2
+CREDITS_REFRESH_SECONDS = 10
+
+TERMINAL_STATUSES = ("completed", "error", "cancelled")
+
+
+class ProviderConcurrencyGate:
+    """
+    Admits work only while the provider has free concurrency, based on the
+    concurrency_limit / current_concurrency it reports on the credits endpoint.
+    Slots busy with work we did not start (other workers, other clients) are respected.
+    """
+
+    def __init__(self, default_limit: int = DEFAULT_PROVIDER_CONCURRENCY,
+                 refresh_seconds: float = CREDITS_REFRESH_SECONDS):
+        self.limit = default_limit
+        self.refresh_seconds = refresh_seconds
+        self.in_flight = 0
+        self.external = 0  # provider slots used by someone else
+        self.queue_count = 0
+        self._checked_at = 0.0
+
+    async def refresh(self, force: bool = False) -> None:
+        if not force and time.monotonic() - self._checked_at < self.refresh_seconds:
+            return
+        from app.services.video_service import get_vidu_credits
+
+        self._checked_at = time.monotonic()
+        _, packages = await get_vidu_credits()
+        if not packages:
+            return
+        limit = sum(p.get("concurrency_limit", 0) for p in packages)
+        busy = sum(p.get("current_concurrency", 0) for p in packages)
+        if limit > 0:
+            self.limit = limit
+        self.external = max(0, busy - self.in_flight)
+        self.queue_count = sum(p.get("queue_count", 0) for p in packages)
+
+    def free_slots(self) -> int:
+        return max(0, self.limit - self.in_flight - self.external)
+
+    def claim(self, count: int) -> int:
+        """Take up to `count` free slots for extra work of a running job; returns how many."""
+        taken = max(0, min(count, self.free_slots()))
+        self.in_flight += taken
+        return taken
+
+    def release(self, count: int = 1) -> None:
+        self.in_flight = max(0, self.in_flight - count)
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "external": self.external,
+            "provider_queue": self.queue_count,
+        }
+
+
+VIDU_GATE = ProviderConcurrencyGate()
+
+
+# Batch storage
+def store_batch_data(batch_id: str, data: dict) -> None:
+    if redis_client:
+        try:
+            redis_client.setex(f"batch:{batch_id}", JOB_TTL_SECONDS, json.dumps(data))
+            return
+        except Exception as e:
+            print(f"Redis store batch failed: {e} — falling back to memory")
+    BATCHES[batch_id] = data
+
+
+def get_batch_data(batch_id: str) -> Optional[dict]:
+    if redis_client:
+        try:
+            raw = redis_client.get(f"batch:{batch_id}")
+            if raw:
+                return json.loads(raw)
+        except Exception as e:
+            print(f"Redis get batch failed: {e} — falling back to memory")
+    return BATCHES.get(batch_id)
+
+
+async def create_batch(items: List[dict], client: str = "unknown") -> dict:
+    """
+    Create the batch and one job per item ({"prompt", "shots", "allow_reuse"}).
+    Its items are one scheduler flow, named after the client so admission can count them.
+    Items served from an existing near-identical video start out completed.
+    """
+    def lookup():
+        return [
+            find_similar_video(item["prompt"], threshold=DEDUPE_AUTO_THRESHOLD)
+            if item.get("allow_reuse") and len(item.get("shots") or []) < 2 else None
+            for item in items
+        ]
+    # all similarity lookups in one trip off the event loop
+    matches = await asyncio.to_thread(lookup)
+
+    batch_id = str(uuid.uuid4())
+    job_ids = []
+    for item, match in zip(items, matches):
+        shots = item.get("shots") or []
+        if match:
+            reused_job_id = reuse_video(match["job_id"], item["prompt"])
+            if reused_job_id:
+                update_job_data(reused_job_id, {"batch_id": batch_id})
+                job_ids.append(reused_job_id)
+                continue
+
+        job_id = str(uuid.uuid4())
+        job_data = {
+            "status": "queued",
+            "message": "Waiting for a free generation slot...",
+            "video_url": None,
+            "prompt": item["prompt"],
+            "batch_id": batch_id
+        }
+        if len(shots) > 1:
+            job_data["shots"] = shots
+        store_job_data(job_id, job_data)
+        start_job_timeline(job_id)
+        job_ids.append(job_id)
+
+    batch = {
+        "batch_id": batch_id,
+        "status": "processing",
+        "created_at": time.time(),
+        "flow": f"batch:{client}:{batch_id}",
+        "job_ids": job_ids
+    }
+    store_batch_data(batch_id, batch)
+    return batch
+
+
+async def run_batch(batch_id: str) -> None:
+    """Run every item of a batch, never exceeding the provider's concurrency"""
+    batch = get_batch_data(batch_id)
+    if not batch:
+        return
+    await VIDU_GATE.refresh(force=True)
+
+    from app.services.video_service import video_generation_process
+    from app.services.scheduler_service import schedule_job
+
+    # the whole batch is one flow in the lowest class, so it can't crowd out other users
+    flow = batch.get("flow") or f"batch:{batch_id}"
+    items = []
+    for job_id in batch["job_ids"]:
+        job = get_job_data(job_id) or {}
+        if job.get("status") in TERMINAL_STATUSES:
+            continue  # reused video
+        items.append(schedule_job(job_id, flow, "batch",
+                                  video_generation_process, job_id, job.get("prompt", "")))
+    await asyncio.gather(*items, return_exceptions=True)
+    finish_batch_if_done(batch_id)
+
+
+def finish_batch_if_done(batch_id: str) -> bool:
+    """Record the batch outcome once every item has finished (items may finish in another worker)"""
+    batch = get_batch_data(batch_id)
+    if not batch or batch.get("finished_at"):
+        return False
+    for job_id in batch["job_ids"]:
+        job = get_job_data(job_id)
+        if job and job.get("status") not in TERMINAL_STATUSES:
+            return False
+    batch["status"] = batch_outcome(batch["job_ids"])
+    batch["finished_at"] = time.time()
+    store_batch_data(batch_id, batch)
+    return True
+
+
+def batch_outcome(job_ids: List[str]) -> str:
+    """completed if every item produced a video, partial if some did, error (or cancelled) if none did"""
+    statuses = [(get_job_data(job_id) or {}).get("status") for job_id in job_ids]
+    completed = statuses.count("completed")
+    if completed == len(statuses):
+        return "completed"
+    if completed:
+        return "partial"
+    return "cancelled" if statuses.count("cancelled") == len(statuses) else "error"
+
+
+def get_batch_items(batch: dict) -> List[dict]:
+    from app.services.eta_service import estimate_job
+
+    items = []
+    for job_id in batch.get("job_ids", []):
+        job = get_job_data(job_id) or {}
+        items.append({
+            "job_id": job_id,
+            "status": job.get("status", "unknown"),
+            "message": job.get("message", ""),
+            "progress": estimate_job(job_id, job)["progress"] if job else 0,
+            "video_url": sign_url(job.get("video_url")),
+        })
+    return items
+
+
+def get_batch_summary(batch_id: str) -> Optional[dict]:
+    """Aggregate progress over all items of a batch"""
+    batch = get_batch_data(batch_id)
+    if not batch:
+        return None
+
+    items = get_batch_items(batch)
+    counts: Dict[str, int] = {}
+    for item in items:
+        counts[item["status"]] = counts.get(item["status"], 0) + 1
+    finished = sum(counts.get(s, 0) for s in TERMINAL_STATUSES)
+    total = len(items)
+
+    return {
+        "batch_id": batch_id,
+        "status": batch.get("status", "unknown"),
+        "total": total,
+        "finished": finished,
+        "counts": counts,
+        "progress": int(sum(item["progress"] for item in items) / total) if total else 100,
+        "provider_slots": VIDU_GATE.snapshot(),
+        "items": items,
+    }
+
+
+__all__ = [
+    "VIDU_GATE",
+    "BATCH_MAX_ITEMS",
+    "TERMINAL_STATUSES",
+    "create_batch",
+    "run_batch",
+    "batch_outcome",
+    "finish_batch_if_done",
+    "get_batch_data",
+    "get_batch_items",
+    "get_batch_summary",
+]
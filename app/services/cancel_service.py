@@ -0,0 +1,86 @@
+# app/services/cancel_service.py
+import asyncio
+import glob
+import os
+from typing import Optional
+
+from app.services.redis_service import (
+    get_job_data, update_job_data, mark_job_cancelled, get_user_job_ids
+)
+from app.services.timeline_service import record_stage
+from app.services.scheduler_service import SCHEDULER
+from app.services.lease_service import get_lease_owner
+
+CANCELLABLE_STATUSES = ("queued", "processing")
+# How long a DELETE waits for a running job here to unwind (ffmpeg killed, files removed)
+CANCEL_WAIT_SECONDS = 5
+
+
+async def cancel_job(job_id: str) -> Optional[str]:
+    """
+    Cancel a queued or running job. Returns None for an unknown job, the job's
+    status if it had already finished, and "cancelled" otherwise.
+
+    A job queued or running in this process is stopped right away; one running in
+    another worker is stopped by that worker's lease heartbeat, which watches the
+    job and sees the cancel flag on the status write below.
+    """
+    job = get_job_data(job_id)
+    if not job:
+        return None
+    if job.get("status") not in CANCELLABLE_STATUSES:
+        return job.get("status")
+
+    mark_job_cancelled(job_id)
+    update_job_data(job_id, {"status": "cancelled", "message": "Cancelling..."})
+
+    task = SCHEDULER.running.get(job_id)
+    if SCHEDULER.cancel(job_id):
+        if task:
+            # run_with_lease cleans up as the task unwinds
+            await asyncio.wait([task], timeout=CANCEL_WAIT_SECONDS)
+        else:
+            await finish_cancellation(job_id)
+    elif not get_lease_owner(job_id):
+        # queued in another worker, or its owner is gone: nothing is running it
+        await finish_cancellation(job_id)
+    return "cancelled"
+
+
+async def finish_cancellation(job_id: str) -> None:
+    """Stop the provider task, remove the job's partial files and mark it cancelled."""
+    from app.services.video_service import cancel_vidu_task
+
+    job = get_job_data(job_id) or {}
+    if job.get("stage") in ("submitting", "generating"):
+        task_ids = [job.get("provider_task_id")] + (job.get("clip_task_ids") or [])
+        await asyncio.gather(*(cancel_vidu_task(t) for t in task_ids if t))
+
+    # only this job's own files: a reused video or the shared mock stays
+    for path in glob.glob(f"./videos/{glob.escape(job_id)}*"):
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Could not remove {path}: {e}")
+
+    record_stage(job_id, "cancelled", {
+        "status": "cancelled",
+        "message": "🛑 Cancelled",
+        "video_url": None,
+        "video_path": None,
+        "poster_path": None,
+        "preview_path": None,
+    })
+    print(f"🛑 Job {job_id} cancelled")
+
+
+async def cancel_user_jobs(user_phone: str) -> int:
+    """Cancel every queued or running job of a WhatsApp user; returns how many were."""
+    cancelled = 0
+    for job_id in get_user_job_ids(user_phone):
+        if await cancel_job(job_id) == "cancelled":
+            cancelled += 1
+    return cancelled
+
+
+__all__ = ["cancel_job", "finish_cancellation", "cancel_user_jobs"]
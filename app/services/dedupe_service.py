@@ -0,0 +1,178 @@
+# app/services/dedupe_service.py
+import asyncio
+import os
+import re
+import uuid
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.config import redis_client, redis_binary_client, DEDUPE_OFFER_THRESHOLD
+from app.services.redis_service import store_job_data, get_job_data, JOB_TTL_SECONDS
+from app.services.timeline_service import start_job_timeline, record_stage
+
+# 16 bands x 4 rows: pairs above ~0.5 Jaccard almost always share a band
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# Newest entries per bucket; keeps lookups constant-time however large the corpus gets
+BUCKET_LIMIT = 20
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = np.random.RandomState(20240917)  # fixed so every worker hashes the same way
+_A = _rng.randint(1, 2 ** 31 - 1, NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, 2 ** 31 - 1, NUM_PERM).astype(np.uint64)
+
+# Words that don't change what the video shows
+FILLER_WORDS = {
+    "a", "an", "the", "of", "in", "on", "at", "with", "and", "please", "video", "clip",
+    "4k", "8k", "hd", "uhd", "hq", "high", "quality", "resolution", "realistic", "make", "me",
+}
+
+# In-memory fallback
+LSH_BUCKETS: Dict[str, List[str]] = {}
+SIGNATURES: Dict[str, bytes] = {}
+
+
+def normalize_prompt(prompt: str) -> str:
+    words = re.findall(r"[a-z0-9]+", prompt.lower())
+    return " ".join(w for w in words if w not in FILLER_WORDS)
+
+
+def _shingles(prompt: str) -> set:
+    """Words (crudely singularised) and word pairs of the normalised prompt."""
+    words = [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w
+             for w in normalize_prompt(prompt).split()]
+    return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+def minhash_signature(prompt: str) -> Optional[np.ndarray]:
+    """MinHash over the prompt's shingles (None if nothing is left after normalising)."""
+    shingles = _shingles(prompt)
+    if not shingles:
+        return None
+    hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+    permuted = (np.outer(_A, hashes) + _B[:, None]) % _MERSENNE_PRIME
+    return (permuted.min(axis=1) & 0xFFFFFFFF).astype(np.uint32)
+
+
+def _band_keys(signature: np.ndarray) -> List[str]:
+    bands = signature.reshape(BANDS, ROWS)
+    return [f"lsh:{i}:{zlib.crc32(band.tobytes()):08x}" for i, band in enumerate(bands)]
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def index_video(job_id: str, prompt: str) -> None:
+    """Make a finished video findable by prompts similar to its own"""
+    signature = minhash_signature(prompt)
+    if signature is None:
+        return
+    if redis_client:
+        try:
+            redis_binary_client.setex(f"minhash:{job_id}", JOB_TTL_SECONDS, signature.tobytes())
+            pipe = redis_client.pipeline(transaction=False)
+            for key in _band_keys(signature):
+                pipe.lpush(key, job_id)
+                pipe.ltrim(key, 0, BUCKET_LIMIT - 1)
+                pipe.expire(key, JOB_TTL_SECONDS)
+            pipe.execute()
+            return
+        except Exception as e:
+            print(f"Redis LSH index failed: {e} — using memory fallback")
+    SIGNATURES[job_id] = signature.tobytes()
+    for key in _band_keys(signature):
+        bucket = LSH_BUCKETS.setdefault(key, [])
+        bucket.insert(0, job_id)
+        del bucket[BUCKET_LIMIT:]
+
+
+def _candidates(signature: np.ndarray) -> Dict[str, bytes]:
+    keys = _band_keys(signature)
+    if redis_client:
+        try:
+            # two round trips: all buckets in one pipeline, then all signatures in one MGET
+            pipe = redis_client.pipeline(transaction=False)
+            for key in keys:
+                pipe.lrange(key, 0, -1)
+            job_ids = list({j for bucket in pipe.execute() for j in bucket})
+            if not job_ids:
+                return {}
+            signatures = redis_binary_client.mget([f"minhash:{j}" for j in job_ids])
+            return {j: raw for j, raw in zip(job_ids, signatures) if raw}
+        except Exception as e:
+            print(f"Redis LSH lookup failed: {e} — using memory fallback")
+    job_ids = {j for key in keys for j in LSH_BUCKETS.get(key, [])}
+    return {j: SIGNATURES[j] for j in job_ids if j in SIGNATURES}
+
+
+def find_similar_video(prompt: str, threshold: float = DEDUPE_OFFER_THRESHOLD) -> Optional[dict]:
+    """Best finished video whose prompt is at least `threshold` similar, or None."""
+    signature = minhash_signature(prompt)
+    if signature is None:
+        return None
+
+    best = None
+    for job_id, raw in _candidates(signature).items():
+        score = similarity(signature, np.frombuffer(raw, dtype=np.uint32))
+        if score < threshold or (best and score <= best["similarity"]):
+            continue
+        job = get_job_data(job_id)
+        if not job or job.get("status") != "completed":
+            continue
+        if not job.get("video_path") or not os.path.exists(job["video_path"]):
+            continue
+        best = {"job_id": job_id, "prompt": job.get("prompt", ""), "similarity": score}
+    return best
+
+
+async def find_similar_video_async(prompt: str, threshold: float = DEDUPE_OFFER_THRESHOLD) -> Optional[dict]:
+    """find_similar_video in a worker thread: its index and job reads block."""
+    return await asyncio.to_thread(find_similar_video, prompt, threshold)
+
+
+def reuse_video(source_job_id: str, prompt: str, user_phone: Optional[str] = None) -> Optional[str]:
+    """Create a completed job serving the video of source_job_id; returns the new job id."""
+    source = get_job_data(source_job_id)
+    if not source or not source.get("video_path") or not os.path.exists(source["video_path"]):
+        return None
+
+    job_id = str(uuid.uuid4())
+    job_data = {
+        "status": "processing",
+        "message": "Reusing a very similar video",
+        "video_url": None,
+        "prompt": prompt,
+        "reused_from": source_job_id,
+    }
+    if user_phone:
+        job_data["user_phone"] = user_phone
+    store_job_data(job_id, job_data, user_phone)
+    start_job_timeline(job_id)
+
+    from app.services.video_service import PUBLIC_BASE_URL
+
+    record_stage(job_id, "completed", {
+        "status": "completed",
+        "message": "♻️ A very similar video already existed, here it is!",
+        "video_url": f"{PUBLIC_BASE_URL}/api/download/{job_id}",
+        "video_path": source["video_path"],
+        "poster_path": source.get("poster_path"),
+        "preview_path": source.get("preview_path"),
+    })
+    print(f"♻️ Job {job_id} reuses the video of {source_job_id}")
+    return job_id
+
+
+__all__ = [
+    "normalize_prompt",
+    "minhash_signature",
+    "index_video",
+    "find_similar_video",
+    "find_similar_video_async",
+    "reuse_video",
+]
@@ -0,0 +1,70 @@
+# app/services/delivery_service.py
+import base64
+import hashlib
+import hmac
+import os
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+from fastapi.responses import FileResponse, Response
+
+from app.config import (
+    VIDEO_DELIVERY_MODE, VIDEO_ACCEL_PREFIX, DOWNLOAD_URL_SECRET, DOWNLOAD_URL_TTL_SECONDS
+)
+
+VIDEOS_DIR = os.path.abspath("./videos")
+DELIVERY_MODES = ("app", "x-accel", "x-sendfile")
+# Expiry is rounded up to this step so repeated status polls hand out the same URL
+EXPIRY_STEP_SECONDS = 300
+
+if VIDEO_DELIVERY_MODE not in DELIVERY_MODES:
+    print(f"⚠️ Unknown VIDEO_DELIVERY_MODE '{VIDEO_DELIVERY_MODE}', serving files from the app")
+
+
+def _signature(path: str, expires: int) -> str:
+    """
+    The scheme of nginx's secure_link module (secure_link_md5 "$secure_link_expires$uri <secret>"),
+    so the proxy can reject bad or expired links itself. MD5 is what that module supports.
+    """
+    digest = hashlib.md5(f"{expires}{path} {DOWNLOAD_URL_SECRET}".encode()).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+def sign_url(url: Optional[str], ttl: int = DOWNLOAD_URL_TTL_SECONDS) -> Optional[str]:
+    """Append expires/md5 query parameters to a download URL (unchanged when signing is off)."""
+    if not url or not DOWNLOAD_URL_SECRET:
+        return url
+    expires = -(-(int(time.time()) + ttl) // EXPIRY_STEP_SECONDS) * EXPIRY_STEP_SECONDS
+    return f"{url}?expires={expires}&md5={_signature(urlsplit(url).path, expires)}"
+
+
+def verify_signature(path: str, expires: Optional[int], md5: Optional[str]) -> bool:
+    """True when signing is off, or the link is unexpired and signed for this path."""
+    if not DOWNLOAD_URL_SECRET:
+        return True
+    if not expires or not md5 or expires < time.time():
+        return False
+    # compare bytes: compare_digest raises TypeError on non-ASCII str
+    return hmac.compare_digest(md5.encode(), _signature(path, expires).encode())
+
+
+def file_response(path: str, media_type: str, headers: Optional[dict] = None) -> Response:
+    """
+    Respond with the file at `path`. In the offload modes the response is only an
+    internal redirect header and the front proxy streams the file (ranges included).
+    """
+    headers = dict(headers or {})
+    full_path = os.path.abspath(path)
+    inside_videos = os.path.commonpath([full_path, VIDEOS_DIR]) == VIDEOS_DIR
+
+    if VIDEO_DELIVERY_MODE == "x-accel" and inside_videos:
+        headers["X-Accel-Redirect"] = VIDEO_ACCEL_PREFIX + os.path.relpath(full_path, VIDEOS_DIR).replace(os.sep, "/")
+        return Response(media_type=media_type, headers=headers)
+    if VIDEO_DELIVERY_MODE == "x-sendfile" and inside_videos:
+        headers["X-Sendfile"] = full_path
+        return Response(media_type=media_type, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+__all__ = ["sign_url", "verify_signature", "file_response"]
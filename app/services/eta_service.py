@@ -0,0 +1,247 @@
+# app/services/eta_service.py
+import asyncio
+import math
+import time
+from typing import Dict, List, Optional
+
+from app.config import VIDEO_PROVIDER_ORDER
+from app.services.admission_service import provider_capacity
+from app.services.redis_service import get_jobs_data
+from app.services.scheduler_service import SCHEDULER
+from app.services.timeline_service import get_recent_job_ids, stage_durations
+from app.utils.record_codec import STAGES
+
+# Stages a job works through, in pipeline order
+PIPELINE = tuple(s for s in STAGES if s not in ("completed", "error", "delivered", "cancelled"))
+FINISHED_STATUSES = ("completed", "error", "cancelled")
+
+# Used until enough jobs have finished to learn from
+DEFAULT_STAGE_SECONDS = {
+    "queued": 5, "connecting": 1, "submitting": 3, "generating": 90, "downloading": 5,
+    "huggingface": 120, "mock": 1, "probing": 1, "remuxing": 2, "transcoding": 20, "concatenating": 3,
+}
+DEFAULT_STAGE_SHARE = {"huggingface": 0.0, "mock": 0.0, "transcoding": 0.0, "concatenating": 0.0}
+MODEL_SAMPLE_JOBS = 500
+MODEL_REFRESH_SECONDS = 60
+MIN_SAMPLES = 5
+
+MIN_POLL_MS = 1000
+MAX_POLL_MS = 30000
+VIDU_MIN_POLL_SECONDS = 2.0
+VIDU_MAX_POLL_SECONDS = 15.0
+
+
+def _daypart(ts: Optional[float]) -> int:
+    """Four 6-hour bands of local time; provider latency follows the daily load curve."""
+    return time.localtime(ts or time.time()).tm_hour // 6
+
+
+def _depth_bucket(depth: int) -> int:
+    return 0 if depth <= 1 else 1 if depth <= 4 else 2
+
+
+def _provider(job: dict) -> str:
+    if job.get("provider"):
+        return job["provider"]
+    stages = {stage for stage, _ in job.get("timeline") or []}
+    for provider in ("huggingface", "mock"):
+        if provider in stages:
+            return provider
+    return VIDEO_PROVIDER_ORDER[0] if VIDEO_PROVIDER_ORDER else "vidu"
+
+
+def _median(values: List[float]) -> float:
+    return values[(len(values) - 1) // 2]
+
+
+class EtaModel:
+    """
+    Stage duration distributions learned from finished jobs, keyed from the most specific
+    (provider, stage, time of day, queue depth at start) down to the stage alone; the first
+    key with enough samples wins. Also tracks how often each provider's jobs pass through
+    a stage, so alternative stages (remux vs transcode) count by their likelihood.
+    """
+
+    def __init__(self):
+        self.samples: Dict[tuple, List[float]] = {}
+        self.passes: Dict[tuple, int] = {}
+        self.jobs: Dict[str, int] = {}
+
+    @classmethod
+    def fit(cls, jobs: List[dict]) -> "EtaModel":
+        model = cls()
+        for job in jobs:
+            timeline = job.get("timeline") or []
+            if job.get("status") != "completed" or len(timeline) < 2:
+                continue
+            provider = _provider(job)
+            daypart = _daypart(job.get("started_at"))
+            depth = _depth_bucket(job.get("queue_depth", 0))
+            model.jobs[provider] = model.jobs.get(provider, 0) + 1
+            for stage, ms in stage_durations(timeline).items():
+                if stage not in PIPELINE:
+                    continue
+                seconds = ms / 1000
+                for key in ((provider, stage, daypart, depth), (provider, stage, depth), (provider, stage), (stage,)):
+                    model.samples.setdefault(key, []).append(seconds)
+                model.passes[(provider, stage)] = model.passes.get((provider, stage), 0) + 1
+        for values in model.samples.values():
+            values.sort()
+        return model
+
+    def _durations(self, provider: str, stage: str, daypart: int, depth: int) -> List[float]:
+        for key in ((provider, stage, daypart, depth), (provider, stage, depth), (provider, stage), (stage,)):
+            values = self.samples.get(key)
+            if values and len(values) >= MIN_SAMPLES:
+                return values
+        return []
+
+    def share(self, provider: str, stage: str) -> float:
+        """Likelihood that a job of this provider goes through the stage."""
+        jobs = self.jobs.get(provider, 0)
+        if jobs >= MIN_SAMPLES:
+            return self.passes.get((provider, stage), 0) / jobs
+        if stage in ("huggingface", "mock"):
+            return 1.0 if stage == provider else 0.0
+        return DEFAULT_STAGE_SHARE.get(stage, 1.0)
+
+    def expected(self, provider: str, stage: str, daypart: int, depth: int) -> float:
+        values = self._durations(provider, stage, daypart, depth)
+        return _median(values) if values else DEFAULT_STAGE_SECONDS.get(stage, 5)
+
+    def remaining_in_stage(self, provider: str, stage: str, daypart: int, depth: int, elapsed: float) -> float:
+        """Median remaining time given the stage has already lasted `elapsed` seconds."""
+        values = self._durations(provider, stage, daypart, depth)
+        if not values:
+            return max(DEFAULT_STAGE_SECONDS.get(stage, 5) - elapsed, 1.0)
+        longer = [v - elapsed for v in values if v > elapsed]
+        # running longer than anything seen: expect it to end soon, but not instantly
+        return _median(longer) if longer else max(1.0, 0.1 * elapsed)
+
+    def remaining_after(self, provider: str, stage: str, daypart: int, depth: int) -> float:
+        """Expected time of the stages following `stage`."""
+        start = PIPELINE.index(stage) + 1 if stage in PIPELINE else 0
+        return sum(
+            self.share(provider, s) * self.expected(provider, s, daypart, depth)
+            for s in PIPELINE[start:] if s != "queued"
+        )
+
+    def service_seconds(self, provider: str, daypart: int, depth: int) -> float:
+        """Expected running time of a whole job, queue excluded."""
+        return self.remaining_after(provider, "queued", daypart, depth)
+
+
+# Until the first fit finishes the defaults apply
+_model = EtaModel()
+
+
+def get_eta_model() -> EtaModel:
+    """The last fitted model; never fits on the request path (see eta_model_loop)."""
+    return _model
+
+
+def fit_recent_jobs() -> EtaModel:
+    """Fit a model on the recent finished jobs (blocking: one bulk read plus decoding)."""
+    jobs = get_jobs_data(get_recent_job_ids(MODEL_SAMPLE_JOBS))
+    return EtaModel.fit([job for job in jobs if job])
+
+
+async def eta_model_loop() -> None:
+    """Refit the model in a worker thread every MODEL_REFRESH_SECONDS and swap it in."""
+    global _model
+    while True:
+        try:
+            _model = await asyncio.to_thread(fit_recent_jobs)
+        except Exception as e:
+            print(f"ETA model refit failed: {e}")
+        await asyncio.sleep(MODEL_REFRESH_SECONDS)
+
+
+def current_queue_depth() -> int:
+    return SCHEDULER.queued() + SCHEDULER.in_flight
+
+
+def estimate_job(job_id: str, job: dict, now: Optional[float] = None) -> dict:
+    """
+    eta_seconds, progress (0-100) and next_poll_ms for a job. next_poll_ms is when the
+    current stage is expected to end, the earliest a poll is likely to see a change.
+    """
+    status = job.get("status")
+    if status in FINISHED_STATUSES:
+        return {"eta_seconds": 0 if status == "completed" else None,
+                "progress": 100 if status == "completed" else 0, "next_poll_ms": None}
+
+    now = now or time.time()
+    model = get_eta_model()
+    provider = _provider(job)
+    daypart = _daypart(job.get("started_at"))
+    timeline = job.get("timeline") or [["queued", 0]]
+    stage = timeline[-1][0]
+    elapsed = max(0.0, now - job["started_at"]) if job.get("started_at") else 0.0
+    in_stage = _seconds_in_stage(job, now)
+
+    if status == "queued" or stage == "queued":
+        depth = _depth_bucket(current_queue_depth())
+        position = SCHEDULER.queue_position(job_id)
+        service = model.service_seconds(provider, daypart, depth)
+        if position is not None:
+            # `capacity` jobs run at once, so one finishes every service / capacity seconds on average
+            stage_left = position / provider_capacity() * service
+        else:
+            stage_left = model.remaining_in_stage(provider, "queued", daypart, depth, in_stage)
+        eta = stage_left + service
+    else:
+        depth = _depth_bucket(job.get("queue_depth", 0))
+        stage_left = model.remaining_in_stage(provider, stage, daypart, depth, in_stage)
+        eta = stage_left + model.remaining_after(provider, stage, daypart, depth)
+
+    progress = int(100 * elapsed / (elapsed + eta)) if elapsed + eta > 0 else 0
+    return {
+        "eta_seconds": int(math.ceil(eta)),
+        "progress": min(99, max(1, progress)),
+        "next_poll_ms": int(min(MAX_POLL_MS, max(MIN_POLL_MS, stage_left * 1000))),
+    }
+
+
+def _seconds_in_stage(job: dict, now: Optional[float] = None) -> float:
+    timeline = job.get("timeline")
+    if not timeline or not job.get("started_at"):
+        return 0.0
+    return max(0.0, (now or time.time()) - job["started_at"] - timeline[-1][1] / 1000)
+
+
+def vidu_poll_delay(job: dict) -> float:
+    """Seconds until the next Vidu task check: sparse early on, tighter as the expected finish nears."""
+    remaining = get_eta_model().remaining_in_stage(
+        "vidu", "generating", _daypart(job.get("started_at")), _depth_bucket(job.get("queue_depth", 0)),
+        _seconds_in_stage(job)
+    )
+    return min(VIDU_MAX_POLL_SECONDS, max(VIDU_MIN_POLL_SECONDS, remaining / 2))
+
+
+def typical_job_seconds() -> float:
+    """Expected queue-free running time of a job submitted now."""
+    provider = VIDEO_PROVIDER_ORDER[0] if VIDEO_PROVIDER_ORDER else "vidu"
+    return get_eta_model().service_seconds(provider, _daypart(None), _depth_bucket(current_queue_depth()))
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    """'about 40 seconds' / 'about 3 minutes' for user-facing messages."""
+    if seconds is None:
+        return "a few minutes"
+    if seconds < 60:
+        return f"about {max(10, int(round(seconds / 10)) * 10)} seconds"
+    minutes = int(round(seconds / 60))
+    return f"about {minutes} minute{'s' if minutes != 1 else ''}"
+
+
+__all__ = [
+    "EtaModel",
+    "get_eta_model",
+    "fit_recent_jobs",
+    "eta_model_loop",
+    "estimate_job",
+    "vidu_poll_delay",
+    "typical_job_seconds",
+    "format_duration",
+]
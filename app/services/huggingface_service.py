@@ -0,0 +1,128 @@
+# app/services/huggingface_service.py
+import asyncio
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from app.config import (
+    HUGGINGFACE_TOKEN,
+    HF_SPACE,
+    HF_MAX_CONCURRENCY,
+    HF_QUEUE_TIMEOUT_SECONDS,
+    HF_PREDICT_TIMEOUT_SECONDS,
+)
+
+# Dedicated threads so blocking predictions never starve the default executor
+_executor = ThreadPoolExecutor(max_workers=HF_MAX_CONCURRENCY, thread_name_prefix="hf-predict")
+_semaphore: Optional[asyncio.Semaphore] = None
+
+# Idle gradio clients, reused across jobs (at most HF_MAX_CONCURRENCY exist)
+_idle_clients = queue.SimpleQueue()
+_login_lock = threading.Lock()
+_logged_in = False
+
+HF_STATS = {"predictions": 0, "failures": 0, "queue_timeouts": 0, "clients_created": 0, "waiting": 0}
+_stats_lock = threading.Lock()
+
+
+class HuggingFaceBusy(Exception):
+    """No prediction slot became free within HF_QUEUE_TIMEOUT_SECONDS."""
+
+
+def _count(name: str, n: int = 1) -> None:
+    """HF_STATS is updated from the executor threads as well as the loop."""
+    with _stats_lock:
+        HF_STATS[name] += n
+
+
+def _login_once() -> None:
+    global _logged_in
+    if _logged_in or not HUGGINGFACE_TOKEN:
+        return
+    with _login_lock:
+        if not _logged_in:
+            from huggingface_hub import login
+            login(HUGGINGFACE_TOKEN)
+            _logged_in = True
+
+
+def _new_client():
+    """Handshake with the Space (HF_SPACE may also be the URL of a local stub)."""
+    from gradio_client import Client
+    _login_once()
+    client = Client(HF_SPACE, verbose=False)
+    _count("clients_created")
+    print(f"🤗 HuggingFace client ready for {HF_SPACE}")
+    return client
+
+
+def _predict(prompt: str, seed: int, num_frames: int, num_inference_steps: int):
+    """Runs in the HF executor: borrow a client, predict, hand the client back."""
+    try:
+        client = _idle_clients.get_nowait()
+    except queue.Empty:
+        client = _new_client()
+    result = client.predict(
+        prompt=prompt,
+        seed=seed,
+        num_frames=num_frames,
+        num_inference_steps=num_inference_steps,
+        api_name="/run"
+    )
+    # only healthy clients go back to the pool
+    _idle_clients.put(client)
+    return result
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(HF_MAX_CONCURRENCY)
+    return _semaphore
+
+
+async def hf_generate(prompt: str, seed: int = 0, num_frames: int = 24, num_inference_steps: int = 25) -> str:
+    """
+    Generate a video on the HuggingFace Space without blocking the event loop.
+    Returns the local path of the produced file.
+    """
+    semaphore = _get_semaphore()
+    _count("waiting")
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout=HF_QUEUE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        _count("queue_timeouts")
+        raise HuggingFaceBusy(f"No HuggingFace slot free within {HF_QUEUE_TIMEOUT_SECONDS}s")
+    finally:
+        _count("waiting", -1)
+
+    # The slot is released when the thread is really done, not when we stop waiting,
+    # so a timed-out prediction still counts against the cap while it runs.
+    loop = asyncio.get_running_loop()
+    try:
+        future = _executor.submit(_predict, prompt, seed, num_frames, num_inference_steps)
+    except Exception:
+        semaphore.release()
+        raise
+    future.add_done_callback(lambda _: loop.call_soon_threadsafe(semaphore.release))
+
+    try:
+        result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=HF_PREDICT_TIMEOUT_SECONDS)
+    except Exception:
+        _count("failures")
+        raise
+
+    _count("predictions")
+    if isinstance(result, dict) and 'video' in result:
+        return result['video']
+    return result
+
+
+def get_hf_status() -> dict:
+    with _stats_lock:
+        stats = dict(HF_STATS)
+    return dict(stats, space=HF_SPACE, max_concurrency=HF_MAX_CONCURRENCY, idle_clients=_idle_clients.qsize())
+
+
+__all__ = ["HuggingFaceBusy", "hf_generate", "get_hf_status"]
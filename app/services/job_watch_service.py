@@ -0,0 +1,106 @@
+# app/services/job_watch_service.py
+import asyncio
+import threading
+import time
+from typing import Dict, Optional, Set
+
+from app.config import redis_client
+
+JOB_UPDATES_CHANNEL = "job_updates"
+MAX_WAIT_SECONDS = 30
+# Shared state without pub/sub (SQLite shim): other workers' updates are only seen by re-reading
+RECHECK_SECONDS = 2.0
+
+# job id -> futures of the requests waiting on it (touched on the event loop only)
+_WAITERS: Dict[str, Set[asyncio.Future]] = {}
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_LISTENING = False
+_CAN_PUBLISH = hasattr(redis_client, "pubsub")
+
+
+def _wake(job_id: str) -> None:
+    for fut in _WAITERS.pop(job_id, ()):
+        if not fut.done():
+            fut.set_result(None)
+
+
+def _wake_soon(job_id: str) -> None:
+    """Wake local waiters from any thread."""
+    loop = _LOOP
+    if loop is None or job_id not in _WAITERS:
+        return
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        _wake(job_id)
+    else:
+        loop.call_soon_threadsafe(_wake, job_id)
+
+
+def notify_job_changed(job_id: str) -> None:
+    """Called on every job write: wakes waiters here and, through Redis, in the other workers."""
+    _wake_soon(job_id)
+    if _CAN_PUBLISH:
+        try:
+            redis_client.publish(JOB_UPDATES_CHANNEL, job_id)
+        except Exception as e:
+            print(f"Redis publish of job update failed: {e}")
+
+
+def _listen() -> None:
+    global _LISTENING
+    while True:
+        try:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(JOB_UPDATES_CHANNEL)
+            _LISTENING = True
+            for message in pubsub.listen():
+                _wake_soon(message["data"])
+        except Exception as e:
+            print(f"Job update subscription lost: {e} — retrying in 5s")
+        _LISTENING = False
+        time.sleep(5)
+
+
+def start_job_watch() -> None:
+    """Bind to the running loop and subscribe to other workers' job updates"""
+    global _LOOP
+    _LOOP = asyncio.get_running_loop()
+    if _CAN_PUBLISH:
+        threading.Thread(target=_listen, name="job-updates", daemon=True).start()
+
+
+async def wait_for_job_change(job_id: str, version: int, timeout: float) -> Optional[dict]:
+    """The job as soon as its version differs from `version`, or as it is once `timeout` passes."""
+    from app.services.redis_service import get_job_data
+
+    global _LOOP
+    loop = asyncio.get_running_loop()
+    _LOOP = _LOOP or loop
+    deadline = loop.time() + min(timeout, MAX_WAIT_SECONDS)
+    recheck = redis_client is not None and not _LISTENING
+
+    while True:
+        # register before reading so an update in between isn't missed
+        fut = loop.create_future()
+        _WAITERS.setdefault(job_id, set()).add(fut)
+        try:
+            job = get_job_data(job_id)
+            remaining = deadline - loop.time()
+            if not job or job.get("version", 0) != version or remaining <= 0:
+                return job
+            try:
+                await asyncio.wait_for(fut, min(remaining, RECHECK_SECONDS) if recheck else remaining)
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            waiters = _WAITERS.get(job_id)
+            if waiters is not None:
+                waiters.discard(fut)
+                if not waiters:
+                    _WAITERS.pop(job_id, None)
+
+
+__all__ = ["MAX_WAIT_SECONDS", "notify_job_changed", "start_job_watch", "wait_for_job_change"]
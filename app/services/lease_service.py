@@ -0,0 +1,160 @@
+# app/services/lease_service.py
+import asyncio
+import os
+import socket
+import time
+from typing import Dict, Optional, Tuple
+
+from app.config import redis_client
+from app.services.redis_service import get_job_data, update_job_data, is_job_cancelled
+from app.services.job_watch_service import wait_for_job_change
+from app.services.loop_monitor_service import tag_job
+from app.utils.sqlite_store import SQLiteStore
+
+LEASE_TTL_SECONDS = 60
+LEASE_RENEW_SECONDS = 20
+
+# In-memory fallback (single process only)
+JOB_LEASES: Dict[str, Tuple[str, float]] = {}
+
+# Check the owner and act in one step, so a lease that expired and was taken over
+# by another worker is never extended or deleted by its previous owner
+RENEW_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def worker_id() -> str:
+    """Identity of this worker process, e.g. 'web-1:4312'."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def acquire_job_lease(job_id: str, ttl: int = LEASE_TTL_SECONDS) -> bool:
+    """Claim ownership of a job; False if another live worker holds it."""
+    owner = worker_id()
+    if redis_client:
+        try:
+            if redis_client.set(f"lease:{job_id}", owner, ex=ttl, nx=True):
+                return True
+            return redis_client.get(f"lease:{job_id}") == owner
+        except Exception as e:
+            print(f"Redis lease acquire failed: {e} — using memory fallback")
+
+    current = JOB_LEASES.get(job_id)
+    if current and current[0] != owner and current[1] > time.time():
+        return False
+    JOB_LEASES[job_id] = (owner, time.time() + ttl)
+    return True
+
+
+def get_lease_owner(job_id: str) -> Optional[str]:
+    if redis_client:
+        try:
+            return redis_client.get(f"lease:{job_id}")
+        except Exception as e:
+            print(f"Redis lease read failed: {e} — using memory fallback")
+    current = JOB_LEASES.get(job_id)
+    if current and current[1] > time.time():
+        return current[0]
+    return None
+
+
+def renew_job_lease(job_id: str, ttl: int = LEASE_TTL_SECONDS) -> bool:
+    """Extend our lease; False if it was lost to another worker."""
+    owner = worker_id()
+    if redis_client:
+        try:
+            if isinstance(redis_client, SQLiteStore):
+                return redis_client.expire_if_equal(f"lease:{job_id}", owner, ttl)
+            return bool(redis_client.eval(RENEW_LEASE_SCRIPT, 1, f"lease:{job_id}", owner, ttl))
+        except Exception as e:
+            print(f"Redis lease renew failed: {e} — using memory fallback")
+
+    current = JOB_LEASES.get(job_id)
+    if current and current[0] != owner and current[1] > time.time():
+        return False
+    JOB_LEASES[job_id] = (owner, time.time() + ttl)
+    return True
+
+
+def release_job_lease(job_id: str) -> None:
+    owner = worker_id()
+    if redis_client:
+        try:
+            if isinstance(redis_client, SQLiteStore):
+                redis_client.delete_if_equal(f"lease:{job_id}", owner)
+            else:
+                redis_client.eval(RELEASE_LEASE_SCRIPT, 1, f"lease:{job_id}", owner)
+        except Exception as e:
+            print(f"Redis lease release failed: {e}")
+    current = JOB_LEASES.get(job_id)
+    if current and current[0] == owner:
+        del JOB_LEASES[job_id]
+
+
+async def _heartbeat(job_id: str, job_task: asyncio.Task) -> None:
+    """Renew the lease every LEASE_RENEW_SECONDS and stop the job as soon as it is cancelled."""
+    renew_at = time.monotonic() + LEASE_RENEW_SECONDS
+    job = get_job_data(job_id)
+    while True:
+        if job:
+            # any write to the job wakes this, including a cancel from another worker
+            job = await wait_for_job_change(job_id, job.get("version", 0), renew_at - time.monotonic())
+        else:
+            await asyncio.sleep(max(0.0, renew_at - time.monotonic()))
+            job = get_job_data(job_id)
+        if is_job_cancelled(job_id):
+            job_task.cancel()
+            return
+        if time.monotonic() >= renew_at:
+            if not renew_job_lease(job_id):
+                # another worker may already be running it: stop rather than race it
+                print(f"⚠️ Lost lease on job {job_id}, stopping it here")
+                job_task.cancel()
+                return
+            renew_at = time.monotonic() + LEASE_RENEW_SECONDS
+
+
+async def run_with_lease(job_id: str, coro_fn, *args, **kwargs):
+    """
+    Run a job coroutine only while this worker holds the job's lease,
+    renewing it in the background so other workers know the job is alive.
+    A cancelled job is stopped here and cleaned up before the lease goes.
+    """
+    if not acquire_job_lease(job_id):
+        print(f"Job {job_id} is owned by {get_lease_owner(job_id)}, not running it here")
+        return None
+
+    update_job_data(job_id, {"owner": worker_id()})
+    tag_job(job_id)
+    heartbeat = asyncio.create_task(_heartbeat(job_id, asyncio.current_task()))
+    try:
+        return await coro_fn(*args, **kwargs)
+    except asyncio.CancelledError:
+        heartbeat.cancel()  # before awaiting, so it can't interrupt the cleanup
+        if is_job_cancelled(job_id):
+            from app.services.cancel_service import finish_cancellation
+            await finish_cancellation(job_id)
+        raise
+    finally:
+        heartbeat.cancel()
+        release_job_lease(job_id)
+
+
+__all__ = [
+    "worker_id",
+    "acquire_job_lease",
+    "renew_job_lease",
+    "release_job_lease",
+    "get_lease_owner",
+    "run_with_lease",
+]
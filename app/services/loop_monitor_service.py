@@ -0,0 +1,239 @@
+# app/services/loop_monitor_service.py
+"""
+Event-loop blocking detector.
+
+A heartbeat coroutine ticks every TICK_SECONDS and records how late the loop woke it
+(loop lag). A watchdog thread notices when the heartbeat stops ticking for longer than
+LOOP_BLOCK_THRESHOLD_MS, and grabs the loop thread's stack while the blocking call is
+still running. Each stall is attributed to the route or job of the task that was running.
+"""
+import asyncio
+import contextvars
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import deque
+
+from app.config import LOOP_MONITOR_ENABLED, LOOP_BLOCK_THRESHOLD_MS
+
+TICK_SECONDS = 0.05
+RECENT_STALLS_LIMIT = 50
+STACK_DEPTH = 30
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAG_SAMPLES = deque(maxlen=10_000)  # ms per heartbeat tick
+RECENT_STALLS = deque(maxlen=RECENT_STALLS_LIMIT)
+STALLS_BY_SOURCE = {}  # route template or "job" -> {"count", "total_ms", "max_ms"}
+STALLS_BY_SITE = {}  # innermost app frame -> {"count", "total_ms", "max_ms"}
+STATS = {"stalls": 0, "blocked_ms": 0}
+
+# What the current task is working for: an ASGI scope or ("job", job_id)
+_current_source = contextvars.ContextVar("loop_monitor_source", default=None)
+_TASK_SOURCES = weakref.WeakKeyDictionary()
+
+_lock = threading.Lock()
+_state = {"loop": None, "thread_id": None, "tick": 0.0, "pending": None}
+
+
+def tag_current_task(source) -> None:
+    """Attribute the running task, and the tasks it creates from now on, to a route or job."""
+    if _state["loop"] is None:
+        return
+    _current_source.set(source)
+    task = asyncio.current_task()
+    if task is not None:
+        _TASK_SOURCES[task] = source
+
+
+def tag_job(job_id: str) -> None:
+    tag_current_task(("job", job_id))
+
+
+def _describe(source) -> tuple:
+    """(source name, job_id) of a tag; routes are named by their template once matched."""
+    if isinstance(source, tuple):
+        return "job", source[1]
+    if isinstance(source, dict):
+        route = source.get("route")
+        path = getattr(route, "path", None) or source.get("path", "?")
+        return f"{source.get('method', 'WS')} {path}", None
+    return "loop", None
+
+
+def _task_factory(previous):
+    def factory(loop, coro, **kwargs):
+        if previous is not None:
+            task = previous(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        source = _current_source.get()
+        if source is not None:
+            _TASK_SOURCES[task] = source
+        return task
+    return factory
+
+
+def _blocking_site(frames: list) -> str:
+    """Innermost frame inside the app, which is usually the call that should not block."""
+    for frame in reversed(frames):
+        if frame.filename.startswith(APP_ROOT) and frame.filename != __file__:
+            return f"{os.path.relpath(frame.filename, os.path.dirname(APP_ROOT))}:{frame.lineno} in {frame.name}"
+    if frames:
+        frame = frames[-1]
+        return f"{os.path.basename(frame.filename)}:{frame.lineno} in {frame.name}"
+    return "unknown"
+
+
+def _capture(tick: float) -> None:
+    """Snapshot the loop thread while it is blocked (runs in the watchdog thread)."""
+    frame = sys._current_frames().get(_state["thread_id"])
+    if frame is None:
+        return
+    frames = traceback.extract_stack(frame, limit=STACK_DEPTH)
+    try:
+        task = asyncio.current_task(_state["loop"])
+        source = _TASK_SOURCES.get(task) if task is not None else None
+    except Exception:
+        task, source = None, None
+    name, job_id = _describe(source)
+
+    with _lock:
+        if _state["tick"] != tick:
+            return  # the loop moved on while we were looking
+        _state["pending"] = {
+            "tick": tick,
+            "source": name,
+            "job_id": job_id,
+            "task": task.get_name() if task is not None else None,
+            "site": _blocking_site(frames),
+            "stack": traceback.format_list(frames),
+        }
+
+
+def _watchdog() -> None:
+    threshold = LOOP_BLOCK_THRESHOLD_MS / 1000
+    captured = None
+    while True:
+        time.sleep(min(threshold / 4, TICK_SECONDS))
+        tick = _state["tick"]
+        if tick == captured or time.monotonic() - tick - TICK_SECONDS < threshold:
+            continue
+        captured = tick
+        _capture(tick)
+
+
+def _add(table: dict, key: str, ms: int) -> None:
+    entry = table.setdefault(key, {"count": 0, "total_ms": 0, "max_ms": 0})
+    entry["count"] += 1
+    entry["total_ms"] += ms
+    entry["max_ms"] = max(entry["max_ms"], ms)
+
+
+def _record_stall(tick: float, lag_ms: int) -> None:
+    with _lock:
+        pending = _state["pending"]
+        _state["pending"] = None
+    STATS["stalls"] += 1
+    STATS["blocked_ms"] += lag_ms
+    if not pending or pending["tick"] != tick:
+        _add(STALLS_BY_SOURCE, "unattributed", lag_ms)
+        print(f"🐢 Event loop blocked for {lag_ms}ms (no stack captured)")
+        return
+
+    del pending["tick"]
+    event = dict(pending, at=time.time(), duration_ms=lag_ms)
+    RECENT_STALLS.appendleft(event)
+    _add(STALLS_BY_SOURCE, event["source"], lag_ms)
+    _add(STALLS_BY_SITE, event["site"], lag_ms)
+    job = f" (job {event['job_id']})" if event["job_id"] else ""
+    print(f"🐢 Event loop blocked for {lag_ms}ms by {event['source']}{job} at {event['site']}")
+
+
+async def _heartbeat() -> None:
+    threshold_ms = LOOP_BLOCK_THRESHOLD_MS
+    while True:
+        tick = time.monotonic()
+        _state["tick"] = tick
+        await asyncio.sleep(TICK_SECONDS)
+        lag_ms = max(0, int((time.monotonic() - tick - TICK_SECONDS) * 1000))
+        LAG_SAMPLES.append(lag_ms)
+        if lag_ms >= threshold_ms:
+            _record_stall(tick, lag_ms)
+
+
+def start_loop_monitor() -> bool:
+    """Start the heartbeat and watchdog on the running loop (no-op unless LOOP_MONITOR is set)."""
+    if not LOOP_MONITOR_ENABLED or _state["loop"] is not None:
+        return False
+    loop = asyncio.get_running_loop()
+    _state.update(loop=loop, thread_id=threading.get_ident(), tick=time.monotonic())
+    loop.set_task_factory(_task_factory(loop.get_task_factory()))
+    loop.create_task(_heartbeat())
+    threading.Thread(target=_watchdog, name="loop-watchdog", daemon=True).start()
+    print(f"🩺 Event loop monitor on, reporting callbacks blocking over {LOOP_BLOCK_THRESHOLD_MS}ms")
+    return True
+
+
+class LoopMonitorMiddleware:
+    """ASGI middleware tagging each request's task with its scope, so stalls name the route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket"):
+            tag_current_task(scope)
+        await self.app(scope, receive, send)
+
+
+def get_loop_metrics() -> dict:
+    samples = sorted(LAG_SAMPLES)
+
+    def pct(p):
+        return samples[min(len(samples) - 1, int(p / 100 * len(samples)))] if samples else 0
+
+    def top(table):
+        return dict(sorted(table.items(), key=lambda item: -item[1]["total_ms"]))
+
+    return {
+        "enabled": _state["loop"] is not None,
+        "threshold_ms": LOOP_BLOCK_THRESHOLD_MS,
+        "lag_ms": {
+            "samples": len(samples),
+            "p50": pct(50),
+            "p90": pct(90),
+            "p99": pct(99),
+            "max": samples[-1] if samples else 0,
+        },
+        "stalls": STATS["stalls"],
+        "blocked_ms": STATS["blocked_ms"],
+        "by_source": top(STALLS_BY_SOURCE),
+        "by_site": top(STALLS_BY_SITE),
+    }
+
+
+def get_recent_stalls(limit: int = RECENT_STALLS_LIMIT) -> list:
+    return list(RECENT_STALLS)[:limit]
+
+
+def reset_loop_metrics() -> None:
+    LAG_SAMPLES.clear()
+    RECENT_STALLS.clear()
+    STALLS_BY_SOURCE.clear()
+    STALLS_BY_SITE.clear()
+    STATS.update(stalls=0, blocked_ms=0)
+
+
+__all__ = [
+    "start_loop_monitor",
+    "tag_current_task",
+    "tag_job",
+    "LoopMonitorMiddleware",
+    "get_loop_metrics",
+    "get_recent_stalls",
+    "reset_loop_metrics",
+]
@@ -0,0 +1,156 @@
+# app/services/provider_service.py
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from app.config import (
+    VIDEO_PROVIDER_ORDER,
+    PROVIDER_HEDGE_AFTER_SECONDS,
+    CIRCUIT_WINDOW,
+    CIRCUIT_MIN_CALLS,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_OPEN_SECONDS,
+    CIRCUIT_SLOW_CALL_SECONDS,
+)
+from app.utils.circuit_breaker import CircuitBreaker
+from app.utils.deadline import Deadline, DeadlineExceeded
+
+# generate(job_id, prompt, user_phone, deadline) -> local video path
+GenerateFn = Callable[[str, str, Optional[str], Deadline], Awaitable[str]]
+
+
+class ProviderError(Exception):
+    """A video provider could not produce a video."""
+
+
+class Provider:
+    def __init__(self, name: str, generate: GenerateFn, hedgeable: bool = True):
+        self.name = name
+        self.generate = generate
+        # placeholder providers (mock) should never race a real generation
+        self.hedgeable = hedgeable
+        slow_call_seconds = CIRCUIT_SLOW_CALL_SECONDS.get(name, CIRCUIT_SLOW_CALL_SECONDS.get("*", 0))
+        self.breaker = CircuitBreaker(
+            name,
+            window=CIRCUIT_WINDOW,
+            min_calls=CIRCUIT_MIN_CALLS,
+            failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+            open_seconds=CIRCUIT_OPEN_SECONDS,
+            slow_call_seconds=slow_call_seconds or None,
+        )
+
+
+PROVIDERS: Dict[str, Provider] = {}
+
+
+def register_provider(name: str, generate: GenerateFn, hedgeable: bool = True) -> None:
+    PROVIDERS[name] = Provider(name, generate, hedgeable)
+
+
+def get_provider_status() -> dict:
+    """Circuit state of every registered provider, in routing order."""
+    return {
+        "order": [name for name in VIDEO_PROVIDER_ORDER if name in PROVIDERS],
+        "hedge_after_seconds": PROVIDER_HEDGE_AFTER_SECONDS or None,
+        "providers": {name: p.breaker.snapshot() for name, p in PROVIDERS.items()},
+    }
+
+
+def first_available_provider() -> Optional[str]:
+    """The provider a job starting now would try first: the first in order whose circuit lets calls through."""
+    for name in VIDEO_PROVIDER_ORDER:
+        provider = PROVIDERS.get(name)
+        if provider and provider.breaker.accepting():
+            return name
+    return None
+
+
+async def _attempt(provider: Provider, job_id: str, prompt: str, user_phone: Optional[str],
+                   deadline: Deadline) -> str:
+    """Run one provider and feed the outcome into its circuit breaker."""
+    start = time.monotonic()
+    try:
+        video_path = await provider.generate(job_id, prompt, user_phone, deadline)
+    except (asyncio.CancelledError, DeadlineExceeded):
+        # the job ran out of time or was stopped; says nothing about the provider
+        provider.breaker.release()
+        raise
+    except Exception as e:
+        provider.breaker.record_failure(time.monotonic() - start)
+        raise ProviderError(f"{provider.name}: {e}") from e
+
+    if not video_path:
+        provider.breaker.record_failure(time.monotonic() - start)
+        raise ProviderError(f"{provider.name}: no video produced")
+
+    provider.breaker.record_success(time.monotonic() - start)
+    return video_path
+
+
+def _hedge_candidate(remaining: list) -> Optional[Provider]:
+    for provider in remaining:
+        if provider.hedgeable:
+            return provider
+    return None
+
+
+async def generate_with_providers(job_id: str, prompt: str, user_phone: Optional[str],
+                                  deadline: Deadline) -> Tuple[str, str]:
+    """
+    Try providers in the configured order, skipping those whose circuit is open.
+    With PROVIDER_HEDGE_AFTER_SECONDS set, the next hedgeable provider is started
+    alongside a primary that has not finished by then; the first success wins.
+    No provider is tried once the deadline has passed (DeadlineExceeded).
+    Returns (video_path, provider_name).
+    """
+    remaining = [PROVIDERS[name] for name in VIDEO_PROVIDER_ORDER if name in PROVIDERS]
+    errors = []
+
+    while remaining:
+        provider = remaining.pop(0)
+        deadline.check(provider.name)
+        if not provider.breaker.allow_request():
+            print(f"⏭️ Skipping provider '{provider.name}' (circuit {provider.breaker.state})")
+            errors.append(f"{provider.name}: circuit open")
+            continue
+
+        running = {asyncio.create_task(_attempt(provider, job_id, prompt, user_phone, deadline)): provider}
+        try:
+            hedge = _hedge_candidate(remaining) if PROVIDER_HEDGE_AFTER_SECONDS > 0 else None
+            if hedge:
+                done, _ = await asyncio.wait(set(running), timeout=PROVIDER_HEDGE_AFTER_SECONDS)
+                if not done and hedge.breaker.allow_request():
+                    print(f"🔀 '{provider.name}' slower than {PROVIDER_HEDGE_AFTER_SECONDS}s, hedging with '{hedge.name}'")
+                    remaining.remove(hedge)
+                    running[asyncio.create_task(_attempt(hedge, job_id, prompt, user_phone, deadline))] = hedge
+
+            while running:
+                done, _ = await asyncio.wait(set(running), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    winner = running.pop(task)
+                    try:
+                        video_path = task.result()
+                    except DeadlineExceeded:
+                        raise
+                    except Exception as e:
+                        print(f" Provider failed: {e}")
+                        errors.append(str(e))
+                        continue
+                    return video_path, winner.name
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+    raise ProviderError("All video providers failed: " + "; ".join(errors))
+
+
+__all__ = [
+    "ProviderError",
+    "PROVIDERS",
+    "register_provider",
+    "get_provider_status",
+    "first_available_provider",
+    "generate_with_providers",
+]
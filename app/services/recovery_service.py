@@ -0,0 +1,141 @@
+# app/services/recovery_service.py
+import asyncio
+import os
+import time
+
+from app.services.redis_service import get_job_data, update_job_data, is_job_cancelled
+from app.services.timeline_service import get_recent_job_ids
+from app.services.lease_service import acquire_job_lease, get_lease_owner, run_with_lease
+from app.config import JOB_DEADLINE_SECONDS
+from app.utils.deadline import Deadline
+
+RECOVERY_INTERVAL_SECONDS = 60
+# Jobs younger than this may simply not have taken their lease yet
+RECOVERY_GRACE_SECONDS = 30
+
+POLLING_STAGES = ("generating", "downloading")
+# a multi-clip job can re-attach to its clip tasks until the joined file exists
+LONG_VIDEO_STAGES = ("submitting", "generating", "concatenating")
+POST_PROCESSING_STAGES = ("probing", "remuxing", "transcoding")
+
+
+def _is_orphaned(job: dict) -> bool:
+    status = job.get("status")
+    undelivered = status == "completed" and job.get("user_phone") and job.get("stage") == "completed"
+    # queued jobs are leased by the worker whose scheduler holds them, so unleased ones are lost too
+    if status not in ("processing", "queued") and not undelivered:
+        return False
+    started_at = job.get("started_at") or 0
+    return time.time() - started_at > RECOVERY_GRACE_SECONDS
+
+
+async def resume_job(job_id: str, job: dict) -> None:
+    """Continue an orphaned job from the furthest stage that can be resumed"""
+    from app.services.video_service import (
+        video_generation_process, finish_video_job, resume_vidu_task, generate_long_video, LONG_VIDEO_PROVIDER
+    )
+    from app.services.whatsapp_service import deliver_video_result
+
+    stage = job.get("stage")
+    prompt = job.get("prompt", "")
+    user_phone = job.get("user_phone")
+    raw_video_path = job.get("raw_video_path")
+    # the budget set when the job first started still applies
+    deadline = Deadline(job["deadline_at"]) if job.get("deadline_at") else Deadline.after(JOB_DEADLINE_SECONDS)
+    print(f"♻️ Recovering job {job_id} from stage '{stage}'")
+
+    if job.get("status") == "processing":
+        try:
+            if stage in POST_PROCESSING_STAGES and raw_video_path and os.path.exists(raw_video_path):
+                await finish_video_job(job_id, prompt, raw_video_path, job.get("provider", "vidu"), user_phone, deadline)
+            elif stage in LONG_VIDEO_STAGES and len(job.get("shots") or []) > 1 and job.get("clip_task_ids"):
+                # the clips submitted by the dead worker are still running at Vidu: poll them, don't pay again
+                video_path = await generate_long_video(job_id, job["shots"], deadline, job["clip_task_ids"])
+                await finish_video_job(job_id, prompt, video_path, LONG_VIDEO_PROVIDER, user_phone, deadline)
+            elif stage in POLLING_STAGES and job.get("provider_task_id"):
+                video_path = await resume_vidu_task(job_id, job["provider_task_id"], deadline)
+                await finish_video_job(job_id, prompt, video_path, "vidu", user_phone, deadline)
+            else:
+                # nothing was submitted yet (or the provider can't be re-attached)
+                await video_generation_process(job_id, prompt, user_phone, deadline)
+        except Exception as e:
+            # out of time shows up here too: the retry then fails fast with the timeout status
+            print(f" Resume of job {job_id} failed ({e}), generating again")
+            await video_generation_process(job_id, prompt, user_phone, deadline)
+
+    if user_phone:
+        await deliver_video_result(job_id, user_phone)
+    if job.get("batch_id"):
+        from app.services.batch_service import finish_batch_if_done
+        finish_batch_if_done(job["batch_id"])
+
+
+def _job_flow(job: dict) -> tuple:
+    """(class, flow) a job was scheduled under; guessed for jobs queued before they were stored."""
+    if job.get("job_class") and job.get("flow"):
+        return job["job_class"], job["flow"]
+    if job.get("user_phone"):
+        return "whatsapp", f"whatsapp:{job['user_phone']}"
+    if job.get("batch_id"):
+        return "batch", f"batch:{job['batch_id']}"
+    return "web", "web:recovered"
+
+
+async def requeue_job(job_id: str, job: dict) -> None:
+    """Put a job queued by a dead worker back into this worker's scheduler, in its own class and flow"""
+    from app.services.scheduler_service import schedule_job
+    from app.services.video_service import video_generation_process
+    from app.services.whatsapp_service import deliver_video_result
+    from app.services.batch_service import finish_batch_if_done
+
+    job_class, flow = _job_flow(job)
+    user_phone = job.get("user_phone")
+    args = (job_id, job.get("prompt", ""), user_phone) if user_phone else (job_id, job.get("prompt", ""))
+    print(f"♻️ Re-queueing job {job_id} in flow '{flow}'")
+
+    try:
+        await schedule_job(job_id, flow, job_class, video_generation_process, *args)
+    except asyncio.CancelledError:
+        if is_job_cancelled(job_id):
+            return
+        raise
+
+    if user_phone:
+        await deliver_video_result(job_id, user_phone)
+    if job.get("batch_id"):
+        finish_batch_if_done(job["batch_id"])
+
+
+async def recover_orphaned_jobs() -> int:
+    """One sweep over recent jobs: claim and resume the ones no live worker owns"""
+    recovered = 0
+    for job_id in get_recent_job_ids():
+        job = get_job_data(job_id)
+        if not job or not _is_orphaned(job) or get_lease_owner(job_id) or is_job_cancelled(job_id):
+            continue
+        if not acquire_job_lease(job_id):
+            continue  # another worker got there first
+        # keep the stage as-is so a second crash can still resume from it
+        update_job_data(job_id, {"recoveries": job.get("recoveries", 0) + 1})
+        if job.get("status") == "queued":
+            asyncio.create_task(requeue_job(job_id, job))
+        else:
+            asyncio.create_task(run_with_lease(job_id, resume_job, job_id, job))
+        recovered += 1
+
+    if recovered:
+        print(f"♻️ Recovered {recovered} orphaned job(s)")
+    return recovered
+
+
+async def recovery_loop() -> None:
+    """Sweep at startup and then periodically, so jobs of crashed workers are picked up too"""
+    while True:
+        try:
+            await recover_orphaned_jobs()
+        except Exception as e:
+            print(f"Recovery sweep failed: {e}")
+        await asyncio.sleep(RECOVERY_INTERVAL_SECONDS)
+
+
+__all__ = ["recover_orphaned_jobs", "recovery_loop", "resume_job", "requeue_job"]
@@ -1,30 +1,46 @@
 # app/services/redis_service.py
 import json
 import time
+from collections import deque
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 
-from app.config import redis_client
+from app.config import redis_client, redis_binary_client
+from app.utils.record_codec import encode_job, decode_job, encode_record, decode_record, is_legacy
+from app.services.job_watch_service import notify_job_changed
 
 # In-memory fallback
 VIDEO_GENERATION_STATUS: Dict[str, Dict[str, Any]] = {}
 USER_STATE: Dict[str, Dict[str, Any]] = {}
 CONVERSATION_CONTEXT: Dict[str, Any] = {}
 RATE_LIMITS: Dict[str, float] = {}
+CANCELLED_JOBS = set()
 
 JOB_TTL_SECONDS = 60 * 60 * 24  # 24 hours fallback
 
 
-# Job storage 
+# Job storage
+# Jobs live once under job:{id}; WhatsApp users get a capped index of their job ids.
+USER_JOBS_LIMIT = 50
+
+
+def _index_user_job(clean_phone: str, job_id: str) -> None:
+    key = f"user_jobs:{clean_phone}"
+    redis_client.lpush(key, job_id)
+    redis_client.ltrim(key, 0, USER_JOBS_LIMIT - 1)
+    redis_client.expire(key, JOB_TTL_SECONDS)
+
+
 def store_job_data(job_id: str, data: dict, user_phone: Optional[str] = None) -> None:
-    """Store job data in Redis or in-memory fallback."""
-    payload = json.dumps(data)
-    if redis_client:
+    """Store job data in Redis or in-memory fallback. Every write bumps the job's version."""
+    data["version"] = data.get("version", 0) + 1
+    if redis_binary_client:
         try:
-            redis_client.setex(f"job:{job_id}", JOB_TTL_SECONDS, payload)
+            redis_binary_client.setex(f"job:{job_id}", JOB_TTL_SECONDS, encode_job(job_id, data))
             if user_phone:
                 clean_phone = user_phone.replace("whatsapp:", "").replace("+", "").replace("-", "").replace(" ", "")
-                redis_client.setex(f"user_job:{clean_phone}:{job_id}", JOB_TTL_SECONDS, payload)
+                _index_user_job(clean_phone, job_id)
+            notify_job_changed(job_id)
             return
         except Exception as e:
             print(f"Redis store failed: {e} — falling back to memory")
@@ -34,30 +50,96 @@ def store_job_data(job_id: str, data: dict, user_phone: Optional[str] = None) ->
         clean_phone = user_phone.replace("whatsapp:", "").replace("+", "").replace("-", "").replace(" ", "")
         USER_STATE.setdefault(clean_phone, {})
         USER_STATE[clean_phone].setdefault("jobs", []).append(job_id)
+    notify_job_changed(job_id)
 
 def get_job_data(job_id: str) -> Optional[dict]:
     """Retrieve job data from Redis or fallback."""
-    if redis_client:
+    if redis_binary_client:
         try:
-            raw = redis_client.get(f"job:{job_id}")
+            raw = redis_binary_client.get(f"job:{job_id}")
             if raw:
-                return json.loads(raw)
+                job = decode_job(job_id, raw)
+                if is_legacy(raw):
+                    _migrate_legacy_job(job_id, job)
+                return job
         except Exception as e:
             print(f"Redis get failed: {e} — falling back to memory")
     return VIDEO_GENERATION_STATUS.get(job_id)
 
+def get_jobs_data(job_ids: list) -> list:
+    """Several job records in one MGET (None for missing ones); for bulk readers like the ETA model."""
+    if redis_binary_client and job_ids:
+        try:
+            raws = redis_binary_client.mget([f"job:{job_id}" for job_id in job_ids])
+            return [
+                decode_job(job_id, raw) if raw else VIDEO_GENERATION_STATUS.get(job_id)
+                for job_id, raw in zip(job_ids, raws)
+            ]
+        except Exception as e:
+            print(f"Redis mget failed: {e} — falling back to memory")
+    return [VIDEO_GENERATION_STATUS.get(job_id) for job_id in job_ids]
+
+def _migrate_legacy_job(job_id: str, job: dict) -> None:
+    """Rewrite a JSON job record in the binary format, keeping its remaining TTL."""
+    ttl = redis_binary_client.ttl(f"job:{job_id}")
+    if ttl and ttl > 0:
+        redis_binary_client.setex(f"job:{job_id}", ttl, encode_job(job_id, job))
+
 def update_job_data(job_id: str, update: dict) -> None:
     """Merge update into existing job data and persist."""
     current = get_job_data(job_id) or {}
     current.update(update)
     store_job_data(job_id, current)
 
+def mark_job_cancelled(job_id: str) -> None:
+    """Flag a job as cancelled; kept apart from the record so in-flight writes can't undo it."""
+    if redis_client:
+        try:
+            redis_client.setex(f"cancel:{job_id}", JOB_TTL_SECONDS, "1")
+            return
+        except Exception as e:
+            print(f"Redis cancel flag failed: {e} — using memory fallback")
+    CANCELLED_JOBS.add(job_id)
+
+def is_job_cancelled(job_id: str) -> bool:
+    if redis_client:
+        try:
+            return bool(redis_client.get(f"cancel:{job_id}"))
+        except Exception as e:
+            print(f"Redis cancel flag read failed: {e} — using memory fallback")
+    return job_id in CANCELLED_JOBS
+
+def get_user_job_ids(user_phone: str, limit: int = 10) -> list:
+    """Most recent job ids of a user, newest first."""
+    clean_phone = user_phone.replace("whatsapp:", "").replace("+", "").replace("-", "").replace(" ", "")
+    if redis_client:
+        try:
+            return redis_client.lrange(f"user_jobs:{clean_phone}", 0, limit - 1)
+        except Exception as e:
+            print(f"Redis user jobs read failed: {e} — using memory fallback")
+    return list(reversed(USER_STATE.get(clean_phone, {}).get("jobs", [])))[:limit]
+
+def migrate_legacy_user_jobs(clean_phone: str) -> list:
+    """
+    Replace the per-user JSON copies (user_job:{phone}:{id}) with the job id index.
+    Run once per user by the migration tool (benchmarks/storage_footprint.py --migrate),
+    never on the read path: finding the copies means scanning the keyspace.
+    """
+    legacy_keys = list(redis_client.scan_iter(match=f"user_job:{clean_phone}:*", count=1000))
+    job_ids = [k.split(":")[-1] for k in legacy_keys]
+    job_ids = [j for j in job_ids if redis_binary_client.ttl(f"job:{j}") != -2]
+    for job_id in reversed(job_ids):
+        _index_user_job(clean_phone, job_id)
+    if legacy_keys:
+        redis_client.delete(*legacy_keys)
+    return job_ids
+
 # User state helpers
 def store_user_state(user_phone: str, state: dict) -> None:
     clean_phone = user_phone.replace("whatsapp:", "").replace("+", "").replace("-", "").replace(" ", "")
-    if redis_client:
+    if redis_binary_client:
         try:
-            redis_client.setex(f"user_state:{clean_phone}", JOB_TTL_SECONDS, json.dumps(state))
+            redis_binary_client.setex(f"user_state:{clean_phone}", JOB_TTL_SECONDS, encode_record(state))
             return
         except Exception as e:
             print(f"Redis store user state failed: {e} — using memory fallback")
@@ -65,11 +147,11 @@ def store_user_state(user_phone: str, state: dict) -> None:
 
 def get_user_state(user_phone: str) -> Optional[dict]:
     clean_phone = user_phone.replace("whatsapp:", "").replace("+", "").replace("-", "").replace(" ", "")
-    if redis_client:
+    if redis_binary_client:
         try:
-            raw = redis_client.get(f"user_state:{clean_phone}")
+            raw = redis_binary_client.get(f"user_state:{clean_phone}")
             if raw:
-                return json.loads(raw)
+                return decode_record(raw)
         except Exception as e:
             print(f"Redis get user state failed: {e} — using memory fallback")
     return USER_STATE.get(clean_phone)
@@ -85,31 +167,80 @@ def clear_user_state(user_phone: str) -> None:
 
 
 # Conversation context
+# Stored per user as a capped, time-ordered stream (history:{phone}) that expires
+# after a week without messages. Reads only ever touch the newest entries.
+CONTEXT_MAX_ENTRIES = 50
+CONTEXT_TTL_SECONDS = 60 * 60 * 24 * 7
+
+
 def store_conversation_context(user_phone: str, key: str, value: dict) -> None:
     clean_phone = user_phone.replace("whatsapp:", "").replace("+", "").replace("-", "").replace(" ", "")
-    if redis_client:
+    if redis_binary_client:
         try:
-            redis_client.hset(f"context:{clean_phone}", key, json.dumps(value))
+            stream = f"history:{clean_phone}"
+            redis_binary_client.xadd(stream, {"k": key, "v": encode_record(value)},
+                                     maxlen=CONTEXT_MAX_ENTRIES, approximate=True)
+            redis_binary_client.expire(stream, CONTEXT_TTL_SECONDS)
             return
         except Exception as e:
-            print(f"Redis hset context failed: {e} — using memory fallback")
-    CONVERSATION_CONTEXT.setdefault(clean_phone, {})[key] = value
+            print(f"Redis xadd context failed: {e} — using memory fallback")
+    history = CONVERSATION_CONTEXT.get(clean_phone)
+    if history is None or (history and time.time() - history[-1]["at"] > CONTEXT_TTL_SECONDS):
+        history = CONVERSATION_CONTEXT[clean_phone] = deque(maxlen=CONTEXT_MAX_ENTRIES)
+    history.append({"type": key, "data": value, "at": time.time()})
 
-def get_conversation_context(user_phone: str, key: Optional[str] = None):
+def get_conversation_history(user_phone: str, limit: int = 10) -> list:
+    """Last `limit` context entries of a user, oldest first."""
     clean_phone = user_phone.replace("whatsapp:", "").replace("+", "").replace("-", "").replace(" ", "")
-    if redis_client:
+    limit = min(limit, CONTEXT_MAX_ENTRIES)
+    if redis_binary_client:
         try:
-            if key:
-                raw = redis_client.hget(f"context:{clean_phone}", key)
-                return json.loads(raw) if raw else None
-            else:
-                raw = redis_client.hgetall(f"context:{clean_phone}")
-                return {k: json.loads(v) for k, v in raw.items()} if raw else {}
+            entries = redis_binary_client.xrevrange(f"history:{clean_phone}", count=limit)
+            if not entries:
+                _migrate_legacy_context(clean_phone)
+                entries = redis_binary_client.xrevrange(f"history:{clean_phone}", count=limit)
+            history = []
+            for entry_id, fields in reversed(entries):
+                history.append({
+                    "type": fields[b"k"].decode(),
+                    "data": decode_record(fields[b"v"]),
+                    "at": int(entry_id.split(b"-")[0]) / 1000,
+                })
+            return history
         except Exception as e:
-            print(f"Redis get context failed: {e} — using memory fallback")
+            print(f"Redis read context failed: {e} — using memory fallback")
+    history = CONVERSATION_CONTEXT.get(clean_phone)
+    if not history or time.time() - history[-1]["at"] > CONTEXT_TTL_SECONDS:
+        CONVERSATION_CONTEXT.pop(clean_phone, None)
+        return []
+    return list(history)[-limit:]
+
+def get_conversation_context(user_phone: str, key: Optional[str] = None, limit: int = 10):
+    """Latest value per entry type among the last `limit` entries (or just the one for `key`)."""
+    latest = {}
+    for entry in get_conversation_history(user_phone, limit):
+        latest[entry["type"]] = entry["data"]
     if key:
-        return CONVERSATION_CONTEXT.get(clean_phone, {}).get(key)
-    return CONVERSATION_CONTEXT.get(clean_phone, {})
+        return latest.get(key)
+    return latest
+
+def clear_conversation_context(user_phone: str) -> None:
+    clean_phone = user_phone.replace("whatsapp:", "").replace("+", "").replace("-", "").replace(" ", "")
+    if redis_client:
+        try:
+            redis_client.delete(f"history:{clean_phone}", f"context:{clean_phone}")
+        except Exception as e:
+            print(f"Redis delete context failed: {e}")
+    CONVERSATION_CONTEXT.pop(clean_phone, None)
+
+def _migrate_legacy_context(clean_phone: str) -> None:
+    """Move a legacy context:{phone} hash (no TTL) into the capped stream."""
+    legacy = redis_client.hgetall(f"context:{clean_phone}")
+    if not legacy:
+        return
+    for key, raw in legacy.items():
+        store_conversation_context(clean_phone, key, json.loads(raw))
+    redis_client.delete(f"context:{clean_phone}")
 
 
 # Rate limiting 
@@ -144,91 +275,34 @@ def analyze_user_preferences(user_phone: str) -> dict:
     """
     returns a summary of recent prompts and counts.
     """
-    clean_phone = user_phone.replace("whatsapp:", "").replace("+", "").replace("-", "").replace(" ", "")
-    # try Redis list, fallback to memory USER_STATE
     prompts = []
-    if redis_client:
-        try:
-            keys = redis_client.keys(f"user_job:{clean_phone}:*")
-            for k in sorted(keys, reverse=True)[:10]:
-                raw = redis_client.get(k)
-                if raw:
-                    job = json.loads(raw)
-                    p = job.get("prompt")
-                    if p:
-                        prompts.append(p)
-        except Exception:
-            pass
-    else:
-        state = USER_STATE.get(clean_phone, {})
-        for jid in state.get("jobs", [])[-10:]:
-            job = VIDEO_GENERATION_STATUS.get(jid)
-            if job:
-                p = job.get("prompt")
-                if p:
-                    prompts.append(p)
+    for job_id in get_user_job_ids(user_phone, limit=10):
+        job = get_job_data(job_id)
+        if job and job.get("prompt"):
+            prompts.append(job["prompt"])
 
     return {
         "recent_prompts": prompts,
         "prompt_count": len(prompts)
     }
 
-def get_smart_suggestions(user_phone: str, n: int = 3) -> list:
-    """
-    Return n simple prompt-suggestions based on recent prompts.
-    This is intentionally naive: it appends style tweaks to recent prompts.
-    """
-    prefs = analyze_user_preferences(user_phone)
-    base = prefs.get("recent_prompts", [])
-    suggestions = []
-    for p in base[:n]:
-        suggestions.append(f"{p} — cinematic lighting, smooth motion")
-        
-    generic = [
-        "A golden retriever playing in a park, cinematic lighting",
-        "Astronaut floating in space, stars in the background, slow motion",
-        "Ocean waves at sunset with seagulls flying"
-    ]
-    gen_index = 0 
-    while len(suggestions) < n:
-        suggestions.append(generic[gen_index % len(generic)])
-        gen_index += 1
-    return suggestions
-
-def generate_contextual_response(user_phone: str, prompt: str = None) -> str:
-    """Only provide contextual responses for appropriate scenarios"""
-
-    
-    if prompt is None or prompt.startswith('/'):
-        return None
-
-    
-    prefs = analyze_user_preferences(user_phone)
-    if prefs.get("prompt_count", 0) == 0:
-        return None  
-    
-    context = get_conversation_context(user_phone) or {}
-    suggestions = get_smart_suggestions(user_phone, n=2)
-    
-    lines = []
-    lines.append(f"Got your prompt: \"{prompt}\".")
-    
-    if prefs.get("prompt_count", 0) > 0:
-        lines.append(f"You've made {prefs['prompt_count']} recent prompts. Here are suggestions:")
-        lines += [f"- {s}" for s in suggestions]
-    
-    return "\n".join(lines) if lines else None
-
 __all__ = [
     "VIDEO_GENERATION_STATUS",
     "store_job_data",
     "get_job_data",
+    "get_jobs_data",
     "update_job_data",
+    "mark_job_cancelled",
+    "is_job_cancelled",
+    "get_user_job_ids",
+    "migrate_legacy_user_jobs",
     "store_user_state",
     "get_user_state",
     "clear_user_state",
     "store_conversation_context",
     "get_conversation_context",
+    "get_conversation_history",
+    "clear_conversation_context",
     "is_user_rate_limited",
     "get_rate_limit_message",
 ]
@@ -0,0 +1,284 @@
+# app/services/scheduler_service.py
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+from app.config import (
+    SCHEDULER_MAX_CONCURRENCY,
+    SCHEDULER_PER_USER_LIMIT,
+    SCHEDULER_BATCH_LIMIT,
+    SCHEDULER_CLASS_WEIGHTS,
+    JOB_DEADLINE_SECONDS,
+)
+from app.services.redis_service import update_job_data, is_job_cancelled
+from app.services.batch_service import VIDU_GATE
+from app.services.provider_service import first_available_provider
+from app.services.lease_service import (
+    LEASE_RENEW_SECONDS, acquire_job_lease, renew_job_lease, release_job_lease, get_lease_owner, worker_id,
+    run_with_lease,
+)
+from app.utils.deadline import Deadline
+
+JOB_CLASSES = ("whatsapp", "web", "batch")
+
+
+def vidu_gates_dispatch() -> bool:
+    """
+    Jobs need a Vidu slot only when Vidu is the provider they will try first. With its
+    circuit open, or another provider first, they run on the fallbacks up to max_concurrency.
+    """
+    return first_available_provider() == "vidu"
+
+
+class _Entry:
+    __slots__ = ("job_id", "user", "job_class", "fn", "args", "future", "tag", "vidu_slot")
+
+    def __init__(self, job_id, user, job_class, fn, args, future, tag):
+        self.job_id = job_id
+        self.user = user
+        self.job_class = job_class
+        self.fn = fn
+        self.args = args
+        self.future = future
+        self.tag = tag
+        self.vidu_slot = False
+
+
+class FairScheduler:
+    """
+    Weighted fair queueing in front of the generation pipeline.
+    Every (class, user) pair is a flow; each job gets a virtual finish tag
+    max(virtual_time, last tag of its flow) + 1/weight, and the lowest tag among
+    flows whose user is under the in-flight cap runs next. A user spamming requests
+    only delays their own flow, and classes share capacity by weight.
+    """
+
+    def __init__(self, max_concurrency: int, per_user_limit: int, batch_limit: int,
+                 weights: Dict[str, float]):
+        self.max_concurrency = max_concurrency
+        self.per_user_limit = per_user_limit
+        self.batch_limit = batch_limit
+        self.weights = weights
+        self.flows: Dict[Tuple[str, str], deque] = {}
+        self.last_tag: Dict[Tuple[str, str], float] = {}
+        self.virtual_time = 0.0
+        self.in_flight = 0
+        self.in_flight_by_user: Dict[str, int] = {}
+        self.running: Dict[str, asyncio.Task] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._leases_renewed_at = time.monotonic()
+
+    def submit(self, job_id: str, user: str, job_class: str, fn, *args) -> asyncio.Future:
+        """Queue fn(*args) for job_id; the returned future resolves when the job has run."""
+        flow = (job_class, user)
+        weight = self.weights.get(job_class, 1.0)
+        tag = max(self.virtual_time, self.last_tag.get(flow, 0.0)) + 1.0 / weight
+        self.last_tag[flow] = tag
+
+        future = asyncio.get_running_loop().create_future()
+        self.flows.setdefault(flow, deque()).append(_Entry(job_id, user, job_class, fn, args, future, tag))
+        self._ensure_dispatcher()
+        self._wakeup.set()
+        return future
+
+    def queued(self) -> int:
+        return sum(len(q) for q in self.flows.values())
+
+    def user_load(self, user: str) -> int:
+        """Jobs of a user that are queued or running in this process."""
+        queued = sum(len(q) for (_, u), q in self.flows.items() if u == user)
+        return queued + self.in_flight_by_user.get(user, 0)
+
+    def prefix_load(self, prefix: str) -> int:
+        """Queued and running jobs of every flow whose user starts with prefix (e.g. all batches of a client)."""
+        queued = sum(len(q) for (_, u), q in self.flows.items() if u.startswith(prefix))
+        return queued + sum(n for u, n in self.in_flight_by_user.items() if u.startswith(prefix))
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """1-based position by finish tag (an estimate: later arrivals may overtake)."""
+        entries = sorted((e for q in self.flows.values() for e in q), key=lambda e: e.tag)
+        for i, entry in enumerate(entries, start=1):
+            if entry.job_id == job_id:
+                return i
+        return None
+
+    def _drop(self, flow: Tuple[str, str], entry: _Entry) -> None:
+        """Take a queued entry out, give up its lease and cancel whoever waits for it."""
+        queue = self.flows[flow]
+        queue.remove(entry)
+        if not queue:
+            del self.flows[flow]
+        release_job_lease(entry.job_id)
+        entry.future.cancel()
+
+    def cancel(self, job_id: str) -> bool:
+        """Drop a queued job or cancel a running one; False if the job isn't in this process."""
+        for flow, queue in self.flows.items():
+            for entry in queue:
+                if entry.job_id == job_id:
+                    self._drop(flow, entry)
+                    return True
+        task = self.running.get(job_id)
+        if task:
+            task.cancel()  # _run releases the slots as it unwinds
+            return True
+        return False
+
+    def _ensure_dispatcher(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    def _pick(self) -> Optional[_Entry]:
+        best_flow = None
+        for flow, queue in self.flows.items():
+            if not queue:
+                continue
+            limit = self.batch_limit if flow[0] == "batch" else self.per_user_limit
+            if self.in_flight_by_user.get(flow[1], 0) >= limit:
+                continue
+            if best_flow is None or queue[0].tag < self.flows[best_flow][0].tag:
+                best_flow = flow
+        if best_flow is None:
+            return None
+
+        entry = self.flows[best_flow].popleft()
+        if not self.flows[best_flow]:
+            del self.flows[best_flow]
+        self.virtual_time = max(self.virtual_time, entry.tag)
+        return entry
+
+    def _renew_queued_leases(self) -> None:
+        """Queued jobs hold a lease too, so recovery can tell them from jobs queued by a dead worker."""
+        if time.monotonic() - self._leases_renewed_at < LEASE_RENEW_SECONDS:
+            return
+        self._leases_renewed_at = time.monotonic()
+        for flow, queue in list(self.flows.items()):
+            for entry in list(queue):
+                if not renew_job_lease(entry.job_id):
+                    print(f"⚠️ Lost lease on queued job {entry.job_id}, dropping it here")
+                    self._drop(flow, entry)
+
+    async def _dispatch_loop(self) -> None:
+        while True:
+            self._wakeup.clear()
+            self._renew_queued_leases()
+            if self.queued() and self.in_flight < self.max_concurrency:
+                vidu_slot = vidu_gates_dispatch()
+                if vidu_slot:
+                    await VIDU_GATE.refresh()
+                if not vidu_slot or VIDU_GATE.free_slots() > 0:
+                    entry = self._pick()
+                    if entry:
+                        self._start(entry, vidu_slot)
+                        continue
+            if not self.queued() and not self.in_flight:
+                self._dispatcher = None
+                return
+            try:
+                # slots free up on job completion; the timeout re-reads provider concurrency
+                await asyncio.wait_for(self._wakeup.wait(), timeout=VIDU_GATE.refresh_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def _start(self, entry: _Entry, vidu_slot: bool) -> None:
+        self.in_flight += 1
+        self.in_flight_by_user[entry.user] = self.in_flight_by_user.get(entry.user, 0) + 1
+        entry.vidu_slot = vidu_slot
+        if vidu_slot:
+            VIDU_GATE.in_flight += 1
+        self.running[entry.job_id] = asyncio.create_task(self._run(entry))
+
+    async def _run(self, entry: _Entry) -> None:
+        try:
+            if is_job_cancelled(entry.job_id):
+                # cancelled while queued in this process by another worker
+                entry.future.cancel()
+                return
+            if not acquire_job_lease(entry.job_id):
+                print(f"Job {entry.job_id} was taken over by {get_lease_owner(entry.job_id)}, not running it here")
+                entry.future.cancel()
+                return
+            # the budget starts with the slot: queued jobs hold no slot, admission bounds the wait
+            deadline = Deadline.after(JOB_DEADLINE_SECONDS)
+            update_job_data(entry.job_id, {
+                "status": "processing",
+                "message": "Video generation has started",
+                "queue_depth": self.queued() + self.in_flight,  # conditions the ETA model
+                "deadline_at": deadline.expires_at,
+            })
+            result = await run_with_lease(entry.job_id, entry.fn, *entry.args, deadline=deadline)
+            if not entry.future.done():
+                entry.future.set_result(result)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                entry.future.cancel()
+                raise
+            if not entry.future.done():
+                entry.future.set_exception(e)
+        finally:
+            release_job_lease(entry.job_id)  # no-op once run_with_lease has released it
+            self.running.pop(entry.job_id, None)
+            self.in_flight -= 1
+            self.in_flight_by_user[entry.user] -= 1
+            if not self.in_flight_by_user[entry.user]:
+                del self.in_flight_by_user[entry.user]
+            if entry.vidu_slot:
+                VIDU_GATE.release()
+            if self._wakeup:
+                self._wakeup.set()
+
+    def queued_by_class(self) -> Dict[str, int]:
+        counts = {c: 0 for c in JOB_CLASSES}
+        for (job_class, _), queue in self.flows.items():
+            counts[job_class] = counts.get(job_class, 0) + len(queue)
+        return counts
+
+    def snapshot(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "per_user_limit": self.per_user_limit,
+            "batch_limit": self.batch_limit,
+            "weights": self.weights,
+            "in_flight": self.in_flight,
+            "queued": self.queued(),
+            "queued_by_class": self.queued_by_class(),
+            "active_users": len(self.in_flight_by_user),
+            "provider_slots": VIDU_GATE.snapshot(),
+        }
+
+
+SCHEDULER = FairScheduler(
+    SCHEDULER_MAX_CONCURRENCY, SCHEDULER_PER_USER_LIMIT, SCHEDULER_BATCH_LIMIT, SCHEDULER_CLASS_WEIGHTS
+)
+
+
+def schedule_job(job_id: str, user: str, job_class: str, fn, *args) -> asyncio.Future:
+    """
+    Queue a job for fair execution (job_class: whatsapp, web or batch).
+    fn is called as fn(*args, deadline=Deadline) once the job gets a slot.
+    The job is leased while it waits; class and flow are stored so recovery can re-queue it.
+    """
+    if not acquire_job_lease(job_id):
+        print(f"Job {job_id} is owned by {get_lease_owner(job_id)}, not queueing it here")
+        future = asyncio.get_running_loop().create_future()
+        future.cancel()
+        return future
+    update_job_data(job_id, {
+        "status": "queued",
+        "message": "Waiting for a free generation slot...",
+        "owner": worker_id(),
+        "job_class": job_class,
+        "flow": user,
+    })
+    return SCHEDULER.submit(job_id, user, job_class, fn, *args)
+
+
+def get_scheduler_status() -> dict:
+    return SCHEDULER.snapshot()
+
+
+__all__ = ["SCHEDULER", "schedule_job", "get_scheduler_status"]
@@ -0,0 +1,153 @@
+# app/services/static_service.py
+import gzip
+import hashlib
+import mimetypes
+import re
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.config import STATIC_RELOAD
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+STATIC_DIR = Path(__file__).resolve().parents[1] / "static"
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+# Not worth compressing below this
+MIN_COMPRESS_BYTES = 512
+
+CONTENT_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".js": "text/javascript; charset=utf-8",
+}
+
+
+class StaticAsset:
+    """A static file held in memory with its precompressed variants."""
+
+    def __init__(self, name: str, body: bytes, mtime: float):
+        self.name = name
+        self.mtime = mtime
+        self.body = body
+        suffix = Path(name).suffix
+        self.content_type = CONTENT_TYPES.get(suffix) or mimetypes.guess_type(name)[0] or "application/octet-stream"
+        self.hash = hashlib.sha256(body).hexdigest()[:16]
+        self.etag = f'"{self.hash}"'
+        stem = name[:-len(suffix)] if suffix else name
+        self.fingerprinted_name = f"{stem}.{self.hash}{suffix}"
+
+        self.encoded: Dict[str, bytes] = {}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self.encoded["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli:
+                self.encoded["br"] = brotli.compress(body, quality=11)
+
+
+# name -> asset; index.html is stored with its asset links already fingerprinted
+ASSETS: Dict[str, StaticAsset] = {}
+_FINGERPRINTED: Dict[str, str] = {}  # fingerprinted name -> name
+
+
+def _fingerprint_links(html: str) -> str:
+    """Point <link>/<script> references at the fingerprinted /assets/ URLs."""
+    def replace(match):
+        asset = ASSETS.get(match.group(2))
+        if not asset:
+            return match.group(0)
+        return f'{match.group(1)}/assets/{asset.fingerprinted_name}"'
+    return re.sub(r'((?:href|src)=")(?:/?static/|/)?([\w.-]+\.(?:css|js))"', replace, html)
+
+
+def _read(name: str) -> Optional[StaticAsset]:
+    path = STATIC_DIR / name
+    try:
+        return StaticAsset(name, path.read_bytes(), path.stat().st_mtime)
+    except OSError:
+        return None
+
+
+def load_static_assets() -> None:
+    """Read, fingerprint and compress every static file (index.html last, it links the others)."""
+    names = sorted(p.name for p in STATIC_DIR.iterdir() if p.is_file()) if STATIC_DIR.exists() else []
+    assets = {}
+    for name in names:
+        if name != "index.html":
+            asset = _read(name)
+            if asset:
+                assets[name] = asset
+    ASSETS.clear()
+    ASSETS.update(assets)
+
+    index = _read("index.html")
+    if index:
+        html = _fingerprint_links(index.body.decode("utf-8"))
+        ASSETS["index.html"] = StaticAsset("index.html", html.encode("utf-8"), index.mtime)
+
+    _FINGERPRINTED.clear()
+    _FINGERPRINTED.update({a.fingerprinted_name: name for name, a in ASSETS.items()})
+    print(f"✅ Loaded {len(ASSETS)} static assets ({'gzip+br' if brotli else 'gzip'})")
+
+
+def _changed_on_disk() -> bool:
+    for name, asset in ASSETS.items():
+        try:
+            if (STATIC_DIR / name).stat().st_mtime != asset.mtime:
+                return True
+        except OSError:
+            return True
+    return False
+
+
+def get_asset(name: str) -> Optional[StaticAsset]:
+    """Asset by plain or fingerprinted name; reloaded from disk on change when STATIC_RELOAD is set."""
+    if not ASSETS or (STATIC_RELOAD and _changed_on_disk()):
+        load_static_assets()
+    return ASSETS.get(name) or ASSETS.get(_FINGERPRINTED.get(name, ""))
+
+
+def _accepted_encodings(header: str) -> set:
+    accepted = set()
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q=") and q[2:].strip() in ("0", "0.0", "0.00", "0.000"):
+            continue
+        if token:
+            accepted.add(token.strip().lower())
+    return accepted
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def asset_response(asset: StaticAsset, request: Request, immutable: bool = False) -> Response:
+    """Serve an asset with ETag/304 handling and Accept-Encoding negotiation."""
+    headers = {
+        "ETag": asset.etag,
+        "Cache-Control": IMMUTABLE_CACHE if immutable else REVALIDATE_CACHE,
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(request.headers.get("if-none-match", ""), asset.etag):
+        return Response(status_code=304, headers=headers)
+
+    body = asset.body
+    accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+    for encoding in ("br", "gzip"):
+        if encoding in asset.encoded and encoding in accepted:
+            body = asset.encoded[encoding]
+            headers["Content-Encoding"] = encoding
+            break
+    return Response(content=body, media_type=asset.content_type, headers=headers)
+
+
+__all__ = ["StaticAsset", "load_static_assets", "get_asset", "asset_response", "etag_matches"]
@@ -0,0 +1,330 @@
+# app/services/suggestion_service.py
+import asyncio
+import json
+import math
+import os
+import re
+import time
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; saves are then unlocked
+    fcntl = None
+
+from app.config import PROMPT_INDEX_PATH
+from app.services.redis_service import get_job_data
+from app.services.timeline_service import get_recent_job_ids
+
+INDEX_VERSION = 1
+FEATURE_DIM = 256           # hashed unigram + bigram features
+MAX_PROMPTS = 10_000        # least-trending prompts are evicted beyond this
+USER_HISTORY = 10           # recent prompts remembered per user
+TRENDING_HALF_LIFE_SECONDS = 60 * 60 * 24 * 3
+POPULARITY_WEIGHT = 0.05
+SAVE_INTERVAL_SECONDS = 60
+
+STOPWORDS = {"a", "an", "the", "of", "in", "on", "at", "with", "and", "to", "is", "for", "by", "its"}
+
+GENERIC_SUGGESTIONS = [
+    "A golden retriever playing in a park, cinematic lighting",
+    "Astronaut floating in space, stars in the background, slow motion",
+    "Ocean waves at sunset with seagulls flying",
+]
+
+
+def _normalize(prompt: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9']+", prompt.lower()))
+
+
+def vectorize(prompt: str) -> np.ndarray:
+    """Signed hashed-feature vector (sublinear tf, L2-normalised). crc32 keeps buckets stable across processes."""
+    words = [w for w in _normalize(prompt).split() if w not in STOPWORDS]
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    vec = np.zeros(FEATURE_DIM, dtype=np.float32)
+    for feature in features:
+        h = zlib.crc32(feature.encode())
+        vec[h % FEATURE_DIM] += 1.0 if h & 0x80000000 else -1.0
+    np.copysign(np.log1p(np.abs(vec)), vec, out=vec)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class PromptIndex:
+    """
+    Every prompt ever generated, one row per distinct prompt, with usage counts and
+    an exponentially decaying 'heat' for trending. Scoring is a single matrix-vector
+    product over the rows in use.
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.vectors = np.zeros((capacity, FEATURE_DIM), dtype=np.float32)
+        self.counts = np.zeros(capacity, dtype=np.float32)
+        self.heat = np.zeros(capacity, dtype=np.float32)
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.prompts: List[str] = []
+        self.rows: Dict[str, int] = {}            # normalised prompt -> row
+        self.users: Dict[str, List[str]] = {}     # user -> normalised prompts, newest last
+
+    def __len__(self) -> int:
+        return len(self.prompts)
+
+    def _current_heat(self, now: float) -> np.ndarray:
+        n = len(self)
+        decay = np.exp(-math.log(2) * (now - self.last_used[:n]) / TRENDING_HALF_LIFE_SECONDS)
+        return self.heat[:n] * decay
+
+    def _allocate(self, now: float) -> int:
+        n = len(self)
+        if n < len(self.counts):
+            self.prompts.append("")
+            return n
+        if n < MAX_PROMPTS:
+            capacity = min(MAX_PROMPTS, 2 * n)
+            for name in ("vectors", "counts", "heat", "last_used"):
+                old = getattr(self, name)
+                grown = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+                grown[:n] = old
+                setattr(self, name, grown)
+            self.prompts.append("")
+            return n
+        # full: reuse the row of the coldest prompt
+        row = int(np.argmin(self._current_heat(now)))
+        self.rows.pop(_normalize(self.prompts[row]), None)
+        return row
+
+    def add(self, prompt: str, user: Optional[str] = None, now: Optional[float] = None) -> None:
+        key = _normalize(prompt)
+        if not key:
+            return
+        now = now or time.time()
+        row = self.rows.get(key)
+        if row is None:
+            row = self._allocate(now)
+            self.rows[key] = row
+            self.prompts[row] = prompt.strip()
+            self.vectors[row] = vectorize(prompt)
+            self.counts[row] = self.heat[row] = 0
+        else:
+            self.heat[row] = self._current_heat(now)[row]
+        self.counts[row] += 1
+        self.heat[row] += 1
+        self.last_used[row] = now
+
+        if user:
+            recent = self.users.setdefault(user, [])
+            if key in recent:
+                recent.remove(key)
+            recent.append(key)
+            del recent[:-USER_HISTORY]
+
+    def user_prompt_count(self, user: str) -> int:
+        return len(self.users.get(user, []))
+
+    def _top(self, scores: np.ndarray, k: int) -> List[int]:
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        return [int(i) for i in top[np.argsort(-scores[top])]]
+
+    def suggest(self, user: Optional[str] = None, k: int = 3, text: Optional[str] = None,
+                now: Optional[float] = None) -> List[str]:
+        """Prompts similar to `text` or to the user's recent prompts, topped up with trending ones."""
+        n = len(self)
+        if not n:
+            return []
+        now = now or time.time()
+        own = [self.rows[p] for p in self.users.get(user, []) if p in self.rows] if user else []
+
+        if text:
+            query = vectorize(text)
+        elif own:
+            query = self.vectors[own].sum(axis=0)
+        else:
+            query = None
+
+        picks: List[int] = []
+        if query is not None and np.any(query):
+            similarity = self.vectors[:n] @ query
+            scores = np.where(similarity > 0, similarity + POPULARITY_WEIGHT * np.log1p(self.counts[:n]), -np.inf)
+            scores[own] = -np.inf
+            if text and _normalize(text) in self.rows:
+                scores[self.rows[_normalize(text)]] = -np.inf
+            picks = self._top(scores, k)
+
+        if len(picks) < k:
+            trending = self._current_heat(now)
+            trending[own + picks] = -np.inf
+            picks += self._top(trending, k - len(picks))
+        return [self.prompts[i] for i in picks]
+
+    # persistence
+    def save(self, path: str) -> None:
+        """Atomically write the index (arrays as .npz, prompt texts and users as JSON)."""
+        n = len(self)
+        meta = json.dumps({"version": INDEX_VERSION, "dim": FEATURE_DIM, "prompts": self.prompts, "users": self.users})
+        tmp = f"{path}.{os.getpid()}.tmp.npz"  # workers share the path
+        np.savez(tmp, vectors=self.vectors[:n], counts=self.counts[:n], heat=self.heat[:n],
+                 last_used=self.last_used[:n], meta=np.array(meta))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["PromptIndex"]:
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("version") != INDEX_VERSION or meta.get("dim") != FEATURE_DIM:
+                print(f"Prompt index at {path} has an old layout, ignoring it")
+                return None
+            n = len(meta["prompts"])
+            index = cls(capacity=max(256, n))
+            index.vectors[:n] = data["vectors"]
+            index.counts[:n] = data["counts"]
+            index.heat[:n] = data["heat"]
+            index.last_used[:n] = data["last_used"]
+        index.prompts = meta["prompts"]
+        index.rows = {_normalize(p): i for i, p in enumerate(index.prompts)}
+        index.users = meta["users"]
+        return index
+
+    def snapshot(self) -> "PromptIndex":
+        """Copy for saving from a thread while the event loop keeps adding."""
+        n = len(self)
+        copy = PromptIndex(capacity=max(1, n))
+        copy.vectors[:n] = self.vectors[:n]
+        copy.counts[:n] = self.counts[:n]
+        copy.heat[:n] = self.heat[:n]
+        copy.last_used[:n] = self.last_used[:n]
+        copy.prompts = list(self.prompts)
+        copy.rows = dict(self.rows)
+        copy.users = {u: list(p) for u, p in self.users.items()}
+        return copy
+
+
+_INDEX: Optional[PromptIndex] = None
+# Prompts added in this process since the last save, as (prompt, user, time)
+_PENDING: List[tuple] = []
+
+
+def _user_key(user_phone: Optional[str]) -> Optional[str]:
+    if not user_phone:
+        return None
+    return user_phone.replace("whatsapp:", "").replace("+", "").replace("-", "").replace(" ", "")
+
+
+def get_prompt_index() -> PromptIndex:
+    """Load the persisted index, or build it once from recent jobs if there is none."""
+    global _INDEX
+    if _INDEX is not None:
+        return _INDEX
+
+    if PROMPT_INDEX_PATH and os.path.exists(PROMPT_INDEX_PATH):
+        try:
+            _INDEX = PromptIndex.load(PROMPT_INDEX_PATH)
+            if _INDEX is not None:
+                print(f"✅ Loaded prompt index with {len(_INDEX)} prompts")
+                return _INDEX
+        except Exception as e:
+            print(f"Failed to load prompt index: {e} — rebuilding")
+
+    _INDEX = PromptIndex()
+    for job_id in reversed(get_recent_job_ids()):
+        job = get_job_data(job_id)
+        if job and job.get("status") == "completed" and job.get("prompt"):
+            _INDEX.add(job["prompt"], _user_key(job.get("user_phone")), now=job.get("started_at"))
+    print(f"Built prompt index from {len(_INDEX)} recent prompts")
+    return _INDEX
+
+
+def record_prompt(prompt: str, user_phone: Optional[str] = None) -> None:
+    """Add a generated prompt to the suggestion index"""
+    user, now = _user_key(user_phone), time.time()
+    get_prompt_index().add(prompt, user, now=now)
+    _PENDING.append((prompt, user, now))
+
+
+def get_smart_suggestions(user_phone: str, n: int = 3) -> list:
+    """n prompt suggestions: similar to the user's recent prompts, then trending ones."""
+    suggestions = get_prompt_index().suggest(_user_key(user_phone), k=n)
+    for generic in GENERIC_SUGGESTIONS:
+        if len(suggestions) >= n:
+            break
+        if generic not in suggestions:
+            suggestions.append(generic)
+    return suggestions
+
+
+def generate_contextual_response(user_phone: str, prompt: str = None) -> str:
+    """Only provide contextual responses for appropriate scenarios"""
+    if prompt is None or prompt.startswith('/'):
+        return None
+
+    index = get_prompt_index()
+    prompt_count = index.user_prompt_count(_user_key(user_phone))
+    if prompt_count == 0:
+        return None
+
+    suggestions = index.suggest(_user_key(user_phone), k=2, text=prompt) or get_smart_suggestions(user_phone, n=2)
+
+    lines = [f"Got your prompt: \"{prompt}\"."]
+    lines.append(f"You've made {prompt_count} recent prompts. Here are suggestions:")
+    lines += [f"- {s}" for s in suggestions]
+    return "\n".join(lines)
+
+
+def _merge_and_save(path: str, additions: List[tuple], local: PromptIndex) -> PromptIndex:
+    """
+    Replay this worker's new prompts onto the index on disk and write it back, holding
+    a file lock so workers never overwrite each other's prompts. Returns the merged index.
+    """
+    with open(f"{path}.lock", "a") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        merged = None
+        if os.path.exists(path):
+            try:
+                merged = PromptIndex.load(path)
+            except Exception as e:
+                print(f"Failed to read prompt index for merging: {e} — overwriting it")
+        if merged is None:
+            merged = local  # already holds the additions
+        else:
+            for prompt, user, now in additions:
+                merged.add(prompt, user, now=now)
+        merged.save(path)
+    return merged
+
+
+async def suggestion_save_loop() -> None:
+    """Periodically merge new prompts into the shared index file, off the event loop"""
+    global _INDEX
+    while True:
+        await asyncio.sleep(SAVE_INTERVAL_SECONDS)
+        if not _PENDING or not PROMPT_INDEX_PATH:
+            continue
+        additions = _PENDING[:]
+        del _PENDING[:]
+        try:
+            merged = await asyncio.to_thread(_merge_and_save, PROMPT_INDEX_PATH, additions,
+                                             get_prompt_index().snapshot())
+        except Exception as e:
+            _PENDING[:0] = additions
+            print(f"Saving prompt index failed: {e}")
+            continue
+        # adopt the merged index (other workers' prompts) plus what was added here meanwhile
+        for prompt, user, now in _PENDING:
+            merged.add(prompt, user, now=now)
+        _INDEX = merged
+
+
+__all__ = [
+    "PromptIndex",
+    "get_prompt_index",
+    "record_prompt",
+    "get_smart_suggestions",
+    "generate_contextual_response",
+    "suggestion_save_loop",
+]
@@ -0,0 +1,152 @@
+# app/services/timeline_service.py
+import math
+import time
+from collections import deque
+from typing import Optional, Dict, List
+
+from app.config import redis_client
+from app.services.redis_service import get_job_data, update_job_data
+
+# Monotonic start time per job (only known to the process running the job)
+_JOB_CLOCKS: Dict[str, float] = {}
+
+# In-memory fallback for the recent jobs index
+RECENT_JOBS = deque(maxlen=500)
+RECENT_JOBS_KEY = "timeline:recent"
+RECENT_JOBS_LIMIT = 500
+
+TERMINAL_STAGES = ("completed", "error", "delivered", "cancelled")
+
+
+def start_job_timeline(job_id: str, stage: str = "queued") -> None:
+    """Start the stage timeline for a job and index it as a recent job."""
+    _JOB_CLOCKS[job_id] = time.monotonic()
+    update_job_data(job_id, {
+        "started_at": time.time(),
+        "stage": stage,
+        "timeline": [[stage, 0]]
+    })
+
+    if redis_client:
+        try:
+            redis_client.lpush(RECENT_JOBS_KEY, job_id)
+            redis_client.ltrim(RECENT_JOBS_KEY, 0, RECENT_JOBS_LIMIT - 1)
+            return
+        except Exception as e:
+            print(f"Redis recent jobs push failed: {e} — using memory fallback")
+    RECENT_JOBS.appendleft(job_id)
+
+
+def _elapsed_ms(job_id: str, job: dict) -> int:
+    """Milliseconds since the job started, monotonic when this process owns the job."""
+    t0 = _JOB_CLOCKS.get(job_id)
+    if t0 is not None:
+        return int((time.monotonic() - t0) * 1000)
+    started_at = job.get("started_at")
+    if started_at:
+        return max(0, int((time.time() - started_at) * 1000))
+    return 0
+
+
+def record_stage(job_id: str, stage: str, update: Optional[dict] = None) -> None:
+    """
+    Append a stage transition to the job timeline.
+    Entries are compact [stage, ms_since_start] pairs; repeated stages are skipped.
+    """
+    job = get_job_data(job_id) or {}
+    timeline = job.get("timeline") or []
+    data = dict(update or {})
+
+    if not timeline or timeline[-1][0] != stage:
+        timeline.append([stage, _elapsed_ms(job_id, job)])
+        data["timeline"] = timeline
+        data["stage"] = stage
+
+    if data:
+        update_job_data(job_id, data)
+
+    if stage in TERMINAL_STAGES:
+        _JOB_CLOCKS.pop(job_id, None)
+
+
+def get_job_timeline(job_id: str) -> Optional[dict]:
+    """Return the timeline of a job with per-stage durations, or None if unknown."""
+    job = get_job_data(job_id)
+    if not job:
+        return None
+    timeline = job.get("timeline") or []
+    return {
+        "job_id": job_id,
+        "status": job.get("status", "unknown"),
+        "stage": job.get("stage"),
+        "started_at": job.get("started_at"),
+        "timeline": [{"stage": s, "at_ms": ms} for s, ms in timeline],
+        "durations_ms": stage_durations(timeline),
+    }
+
+
+def stage_durations(timeline: List[list]) -> Dict[str, int]:
+    """Time spent in each stage, i.e. the gap until the next transition."""
+    durations: Dict[str, int] = {}
+    for (stage, start), (_, end) in zip(timeline, timeline[1:]):
+        durations[stage] = durations.get(stage, 0) + (end - start)
+    if timeline and timeline[-1][0] in TERMINAL_STAGES:
+        durations["total"] = timeline[-1][1]
+    return durations
+
+
+def get_recent_job_ids(limit: int = RECENT_JOBS_LIMIT) -> list:
+    if redis_client:
+        try:
+            return redis_client.lrange(RECENT_JOBS_KEY, 0, limit - 1)
+        except Exception as e:
+            print(f"Redis recent jobs read failed: {e} — using memory fallback")
+    return list(RECENT_JOBS)[:limit]
+
+
+def _percentile(sorted_values: list, pct: float) -> int:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def get_timeline_percentiles(limit: int = 200) -> dict:
+    """Aggregate p50/p90/p95/p99 stage durations across recent finished jobs."""
+    samples: Dict[str, list] = {}
+    jobs_counted = 0
+
+    for job_id in get_recent_job_ids(limit):
+        job = get_job_data(job_id)
+        if not job:
+            continue
+        timeline = job.get("timeline") or []
+        if not timeline or timeline[-1][0] not in TERMINAL_STAGES:
+            continue
+        jobs_counted += 1
+        for stage, ms in stage_durations(timeline).items():
+            samples.setdefault(stage, []).append(ms)
+
+    stages = {}
+    for stage, values in samples.items():
+        values.sort()
+        stages[stage] = {
+            "count": len(values),
+            "p50_ms": _percentile(values, 50),
+            "p90_ms": _percentile(values, 90),
+            "p95_ms": _percentile(values, 95),
+            "p99_ms": _percentile(values, 99),
+            "max_ms": values[-1],
+        }
+
+    return {"jobs": jobs_counted, "stages": stages}
+
+
+__all__ = [
+    "start_job_timeline",
+    "record_stage",
+    "get_job_timeline",
+    "stage_durations",
+    "get_timeline_percentiles",
+]
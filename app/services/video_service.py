@@ -1,8 +1,27 @@
 
-import os, shutil, subprocess, asyncio, requests, uuid
-from app.services.redis_service import update_job_data, store_conversation_context
-from app.config import twilio_client
-from huggingface_hub import login
+import os, re, math, shutil, asyncio, requests, uuid
+from app.services.redis_service import get_job_data, update_job_data, store_conversation_context
+from app.services.suggestion_service import record_prompt
+from app.services.dedupe_service import index_video
+from app.services.delivery_service import sign_url
+from app.services.timeline_service import record_stage
+from app.services.eta_service import estimate_job, format_duration, vidu_poll_delay
+from app.services.provider_service import generate_with_providers, register_provider
+from app.services.huggingface_service import hf_generate
+from app.config import twilio_client, WHATSAPP_MAX_MEDIA_BYTES, STREAM_TRANSCODE, JOB_DEADLINE_SECONDS
+from app.utils.deadline import Deadline, DeadlineExceeded
+from app.services.media_service import (
+    run_ffmpeg,
+    probe_video,
+    delivery_issues,
+    remux_faststart,
+    extract_poster,
+    make_preview_gif,
+    encode_to_target_size,
+    stream_download_transcode,
+    concat_clips,
+    DELIVERY_MAX_VIDEO_KBPS,
+)
 
 async def compress_video(input_path: str, output_path: str, quality: str = "medium") -> str:
     
@@ -49,15 +68,10 @@ async def compress_video(input_path: str, output_path: str, quality: str = "medi
         
         print(f" Running compression: {' '.join(cmd[:5])}...")
         
-        # Run compression
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=300  
-        )
+        # Run compression (killed if the job is cancelled)
+        returncode, _, stderr = await run_ffmpeg(cmd, timeout=300)
         
-        if result.returncode == 0:
+        if returncode == 0:
             if os.path.exists(output_path):
                 original_size = os.path.getsize(input_path)
                 compressed_size = os.path.getsize(output_path)
@@ -71,11 +85,11 @@ async def compress_video(input_path: str, output_path: str, quality: str = "medi
                 print("Compression failed - output file not created")
                 return input_path
         else:
-            print(f"FFmpeg failed with code {result.returncode}")
-            print(f"Error: {result.stderr}")
+            print(f"FFmpeg failed with code {returncode}")
+            print(f"Error: {stderr}")
             return input_path
             
-    except subprocess.TimeoutExpired:
+    except asyncio.TimeoutError:
         print("Compression timeout after 5 minutes")
         return input_path
     except Exception as e:
@@ -103,167 +117,390 @@ def enhance_prompt_free(prompt: str) -> str:
     
     return enhanced_prompt
 
+SHOT_PROGRESSION = ("wide establishing shot", "medium shot", "close-up", "tracking shot", "low angle shot", "wide closing shot")
+
+def plan_shots(prompt: str, duration: int) -> list:
+    """
+    One prompt per clip of a `duration`-second video. The prompt's sentences are spread
+    over the clips in order; clips sharing a sentence get a camera progression so
+    consecutive clips don't repeat the same shot.
+    """
+    count = max(1, math.ceil(duration / VIDU_CLIP_SECONDS))
+    if count == 1:
+        return [prompt]
+    sentences = [s.strip() for s in re.split(r"(?<=[.!?;])\s+|\s+then\s+", prompt) if s.strip()] or [prompt]
+    n = len(sentences)
+    if n >= count:
+        return [" ".join(sentences[i * n // count:(i + 1) * n // count]) for i in range(count)]
+    return [f"{sentences[i * n // count].rstrip('.!?;')}, {SHOT_PROGRESSION[i % len(SHOT_PROGRESSION)]}" for i in range(count)]
+
 # VIDEO GENERATION
-async def video_generation_process(job_id: str, prompt: str, user_phone: str = None):
+PUBLIC_BASE_URL = "https://video-generation-web-app-production.up.railway.app"
+VIDU_CLIP_SECONDS = 4
+# Left for download and post-processing when Vidu polling gives up
+POST_PROCESSING_RESERVE_SECONDS = 60
+# Provider name of multi-clip videos, so their timings don't skew single-clip estimates
+LONG_VIDEO_PROVIDER = "vidu_long"
+
+async def video_generation_process(job_id: str, prompt: str, user_phone: str = None, deadline: Deadline = None):
+    """
+    Generate a video through the configured providers and prepare it for delivery.
+    Every stage's timeout comes out of `deadline`; the job fails once it has passed.
+    """
     from app.services.whatsapp_service import send_progress_update
-    """Generate Video using Vidu API"""
-    task_id = None  # Initialize task_id
-    final_video_path = None # Initialize final_video_path
-    
+
+    deadline = deadline or Deadline.after(JOB_DEADLINE_SECONDS)
     try:
         print(f" Starting video generation: {prompt}")
-        
 
-        
+        # Status Update 1 
+        record_stage(job_id, "connecting", {
+            "message": "Connecting to Vidu AI model...",
+            "status": "processing"
+        })
+
         if user_phone:
+            eta = estimate_job(job_id, get_job_data(job_id) or {})["eta_seconds"]
             await send_progress_update(user_phone, 
                 f""" *Video Generation Started*
                 
 *Your prompt:* {prompt}
 
 *Status:* Connecting to AI model...
-*Estimated time:* 2-3 minutes
+*Estimated time:* {format_duration(eta)}
 I'll keep you updated""")
-        
-        # Status Update 1 
-        update_job_data(job_id, {
-            "message": "Connecting to Vidu AI model...",
-            "status": "processing",
-            "progress" : 10
+
+        shots = (get_job_data(job_id) or {}).get("shots") or []
+        if len(shots) > 1:
+            video_path, provider = await generate_long_video(job_id, shots, deadline), LONG_VIDEO_PROVIDER
+        else:
+            video_path, provider = await generate_with_providers(job_id, prompt, user_phone, deadline)
+        await finish_video_job(job_id, prompt, video_path, provider, user_phone, deadline)
+
+    except DeadlineExceeded as e:
+        print(f" Video generation out of time: {e}")
+        record_stage(job_id, "error", {
+            "status": "error",
+            "message": "⏱️ Video generation took too long, please try again",
+            "video_url": None
         })
-        
-        # Vidu API
-        vidu_api_key = os.getenv("VIDU_API_KEY")
-        vidu_base_url = os.getenv("VIDU_BASE_URL", "https://api.vidu.com")
-        
-        if not vidu_api_key:
-            raise Exception("Missing Vidu API key")
-        
-        headers = {
-            "Authorization": f"Token {vidu_api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": "vidu1.5",
+
+    except Exception as e:
+        print(f" Video generation failed: {e}")
+        record_stage(job_id, "error", {
+            "status": "error",
+            "message": f"❌ All video generation methods failed",
+            "video_url": None
+        })
+
+async def finish_video_job(job_id: str, prompt: str, video_path: str, provider: str, user_phone: str = None,
+                           deadline: Deadline = None):
+    """Post-process a provider output (previews, remux/transcode) and mark the job completed"""
+    from app.services.whatsapp_service import send_progress_update
+
+    deadline = deadline or Deadline.after(JOB_DEADLINE_SECONDS)
+    final_video_path = video_path
+
+    record_stage(job_id, "probing", {
+        "message": "Compressing video for optimal delivery...",
+        "status": "processing",
+        "provider": provider,
+        "raw_video_path": video_path
+    })
+
+    if user_phone:
+        await send_progress_update(user_phone, 
+            " *Video Generated Successfully!* Now optimizing for WhatsApp...")
+
+    # previews go out while the full-quality file is being prepared
+    preview_task = asyncio.create_task(generate_previews(job_id, video_path, user_phone))
+    try:
+        final_video_path = await prepare_video_for_delivery(job_id, video_path, deadline)
+    except (asyncio.CancelledError, DeadlineExceeded):
+        preview_task.cancel()  # kills its ffmpeg instead of waiting for it
+        raise
+    finally:
+        await asyncio.gather(preview_task, return_exceptions=True)
+
+    if final_video_path != video_path and os.path.exists(video_path):
+        try:
+            os.remove(video_path)
+            print("Cleaned up original uncompressed file")
+        except:
+            pass
+
+    record_stage(job_id, "completed", {
+        "status": "completed",
+        "message": "✅ Demo video ready (using placeholder)" if provider == "mock" else "Yay, Video generated successfully!",
+        "video_url": f"{PUBLIC_BASE_URL}/api/download/{job_id}",
+        "video_path": final_video_path
+    })
+
+    record_prompt(prompt, user_phone)
+    if provider not in ("mock", LONG_VIDEO_PROVIDER):  # placeholder / not a one-clip answer to the prompt
+        index_video(job_id, prompt)
+
+    if user_phone:
+        store_conversation_context(user_phone, "video_completed", {
+            "job_id": job_id,
             "prompt": prompt,
-            "duration": 4,
-            "aspect_ratio": "16:9",
-            "resolution": "720p",
-            "movement_amplitude": "small"
-        }
-        
-        # Status Update 2
-        update_job_data(job_id, {
-            "message": "Sending request to AI model...",
-            "status": "processing",
-            "progress": 20
+            # handed to the user as is, so it carries its signature (the job keeps the bare URL)
+            "video_url": sign_url(f"{PUBLIC_BASE_URL}/api/download/{job_id}")
         })
-        
-        if user_phone:
-            await send_progress_update(user_phone, 
-                " *Connected* Sending your video request...")
-        
-        print(" Sending request to Vidu API...")
-        response = requests.post(
-            f"{vidu_base_url}/ent/v2/text2video",
-            headers=headers,
-            json=payload,
-            timeout=30
+
+async def generate_previews(job_id: str, video_path: str, user_phone: str = None) -> None:
+    """Poster JPEG and short GIF from the raw file; the poster is sent to WhatsApp users right away"""
+    from app.services.whatsapp_service import send_whatsapp_message
+
+    poster_path = f"./videos/{job_id}_poster.jpg"
+    gif_path = f"./videos/{job_id}_preview.gif"
+    has_poster, has_gif = await asyncio.gather(
+        extract_poster(video_path, poster_path),
+        make_preview_gif(video_path, gif_path)
+    )
+
+    update = {}
+    if has_poster:
+        update["poster_path"] = poster_path
+    if has_gif:
+        update["preview_path"] = gif_path
+    if not update:
+        return
+    update_job_data(job_id, update)
+
+    # WhatsApp media messages don't take GIFs, so users get the poster frame
+    if user_phone and has_poster:
+        send_whatsapp_message(
+            user_phone,
+            "👀 *First look* at your video — the full-quality version is on its way!",
+            media_url=f"{PUBLIC_BASE_URL}/api/preview/{job_id}/poster.jpg"
         )
-        
-        print(f" Vidu API Response Code: {response.status_code}")
-        
-        if response.status_code == 200:
-            result = response.json()
-            task_id = result.get("task_id")  #Assign task_id safely
-            
-            if not task_id:
-                raise Exception("No task_id in Vidu API response")
-            
-            update_job_data(job_id, {
-                "message": "Your video is being generated...",
-                "status": "processing",
-                "progress": 30
-            })
 
-        if user_phone:
-            await send_progress_update(user_phone, 
-                    f""" *Video Generation In Progress*
-*AI Model:* Vidu 1.5
-*Task ID:* `{task_id[:8]}...`
-*Creating:* {prompt}
-*Next update:* ~90 seconds""")
+async def prepare_video_for_delivery(job_id: str, video_path: str, deadline: Deadline) -> str:
+    """
+    Probe the provider output and do the cheapest thing that makes it deliverable:
+    a stream-copy remux with faststart when it is already compliant, a size-targeted
+    transcode only when codec, resolution or size require it.
+    """
+    streamed = (get_job_data(job_id) or {}).get("encode") or {}
+    if streamed.get("within_target") and os.path.exists(streamed.get("path", "")):
+        # already encoded while downloading
+        return streamed["path"]
 
-            print(f"Vidu task created: {task_id}")
-        
-            
-            # Poll for completion
-            video_path = await poll_vidu_task(task_id, job_id, vidu_api_key, vidu_base_url)
-            
-            if video_path:
-                final_video_path = video_path
-                print("Starting video compression...")
-                update_job_data(job_id, {
-                    "message": "Compressing video for optimal delivery...",
-                    "status": "processing",
-                    "progress": 80
-                })
-                
-                if user_phone:
-                    await send_progress_update(user_phone, 
-                        " *Video Generated Successfully!* Now optimizing for WhatsApp...")
-
-                print("Starting video compression...")
-                 
-                # Check file size 
-                original_file_size = os.path.getsize(video_path)
-                original_file_size = original_file_size / (1024 * 1024)
-                
-                # Aggressive compression if still too large
-                if original_file_size > 15:  # 15MB
-                    print(f"File still large ({original_file_size:.1f}MB), applying aggressive compression...")
-                    base_name = os.path.splitext(video_path)[0]
-                    compressed_path = f"{base_name}_ultra.mp4"
-                    final_video_path = await compress_video(video_path, compressed_path, "whatsapp")
-                
-                    
-                    
-                if final_video_path != video_path and os.path.exists(video_path):
-                    try:
-                        os.remove(video_path)
-                        print("Cleaned up original uncompressed file")
-                    except:
-                        pass
-                    
-                PUBLIC_BASE_URL = "https://video-generation-web-app-production.up.railway.app"
-                update_job_data(job_id, {
-                    "status": "completed",
-                    "message": "Yay, Video generated successfully!",
-                    "video_url": f"{PUBLIC_BASE_URL}/api/download/{job_id}",
-                    "video_path": video_path
-                })
-                
-                store_conversation_context(user_phone, "video_completed", {
-                    "job_id": job_id,
-                    "prompt": prompt,
-                    "video_url": f"{PUBLIC_BASE_URL}/api/download/{job_id}" 
-                })
-                return
-        
+    base_name = os.path.splitext(video_path)[0]
+    info = await deadline.run("probing", probe_video(video_path))
+
+    if info is None:
+        # no ffprobe: keep the old size-only rule
+        if os.path.getsize(video_path) > WHATSAPP_MAX_MEDIA_BYTES:
+            record_stage(job_id, "transcoding")
+            return await deadline.run("transcoding", compress_video(video_path, f"{base_name}_ultra.mp4", "whatsapp"))
+        return video_path
+
+    issues = delivery_issues(info, WHATSAPP_MAX_MEDIA_BYTES)
+    if not issues:
+        record_stage(job_id, "remuxing")
+        report = await deadline.run("remuxing", remux_faststart(video_path, f"{base_name}_ready.mp4"))
+    else:
+        print(f"Transcoding needed: {', '.join(issues)}")
+        record_stage(job_id, "transcoding")
+        # size problems use the whole budget, codec/resolution fixes a sane bitrate
+        size_bound = info["size"] > WHATSAPP_MAX_MEDIA_BYTES
+        report = await deadline.run("transcoding", encode_to_target_size(
+            video_path, f"{base_name}_ultra.mp4", WHATSAPP_MAX_MEDIA_BYTES,
+            max_video_kbps=None if size_bound else DELIVERY_MAX_VIDEO_KBPS,
+            info=info
+        ))
+        if report:
+            report["reasons"] = issues
+
+    if not report:
+        if info["size"] > WHATSAPP_MAX_MEDIA_BYTES:
+            # the targeted encode failed; the fixed WhatsApp preset still beats a file Twilio rejects
+            return await deadline.run("transcoding", compress_video(video_path, f"{base_name}_ultra.mp4", "whatsapp"))
+        return video_path
+    update_job_data(job_id, {"encode": report})
+    return report["path"]
+
+async def submit_vidu_task(prompt: str, api_key: str, base_url: str, deadline: Deadline) -> str:
+    """Start a Vidu text-to-video task for one clip and return its task id"""
+    headers = {
+        "Authorization": f"Token {api_key}",
+        "Content-Type": "application/json"
+    }
+    
+    payload = {
+        "model": "vidu1.5",
+        "prompt": prompt,
+        "duration": VIDU_CLIP_SECONDS,
+        "aspect_ratio": "16:9",
+        "resolution": "720p",
+        "movement_amplitude": "small"
+    }
+    
+    print(" Sending request to Vidu API...")
+    response = await deadline.run("submitting", asyncio.to_thread(
+        requests.post,
+        f"{base_url}/ent/v2/text2video",
+        headers=headers,
+        json=payload,
+        timeout=30
+    ))
+    
+    print(f" Vidu API Response Code: {response.status_code}")
     
+    if response.status_code != 200:
         raise Exception(f"Vidu API failed: {response.status_code} - {response.text}")
-        
-    except Exception as vidu_error:
-        print(f" Vidu API failed: {vidu_error}")
-        
+
+    task_id = response.json().get("task_id")
+    if not task_id:
+        raise Exception("No task_id in Vidu API response")
+    return task_id
+
+async def generate_with_vidu(job_id: str, prompt: str, user_phone: str, deadline: Deadline) -> str:
+    """Vidu provider: submit the task, poll it and download the result"""
+    from app.services.whatsapp_service import send_progress_update
+
+    # Vidu API
+    vidu_api_key = os.getenv("VIDU_API_KEY")
+    vidu_base_url = os.getenv("VIDU_BASE_URL", "https://api.vidu.com")
     
-        if task_id:
-            print(f" Failed task ID: {task_id}")
-        
-        
-        print("Using HuggingFace fallback")
-        await use_huggingface_fallback(job_id, prompt)
+    if not vidu_api_key:
+        raise Exception("Missing Vidu API key")
+
+    # Status Update 2
+    record_stage(job_id, "submitting", {
+        "message": "Sending request to AI model...",
+        "status": "processing"
+    })
+    
+    if user_phone:
+        await send_progress_update(user_phone, 
+            " *Connected* Sending your video request...")
+
+    task_id = await submit_vidu_task(prompt, vidu_api_key, vidu_base_url, deadline)
+    
+    # saved so a restarted worker can resume polling instead of paying for a new task
+    record_stage(job_id, "generating", {
+        "message": "Your video is being generated...",
+        "status": "processing",
+        "provider_task_id": task_id
+    })
+    print(f"Vidu task created: {task_id}")
+
+    if user_phone:
+        await send_progress_update(user_phone, 
+                f""" *Video Generation In Progress*
+*AI Model:* Vidu 1.5
+*Task ID:* `{task_id[:8]}...`
+*Creating:* {prompt}
+*Ready in:* {format_duration(estimate_job(job_id, get_job_data(job_id) or {})["eta_seconds"])}""")
+
+    # Poll for completion
+    video_path = await poll_vidu_task(task_id, job_id, vidu_api_key, vidu_base_url, deadline)
+    if not video_path:
+        raise Exception(f"Vidu task {task_id} did not produce a video")
+    return video_path
+
+async def resume_vidu_task(job_id: str, task_id: str, deadline: Deadline) -> str:
+    """Re-attach to a Vidu task submitted before a restart"""
+    vidu_api_key = os.getenv("VIDU_API_KEY")
+    vidu_base_url = os.getenv("VIDU_BASE_URL", "https://api.vidu.com")
+    if not vidu_api_key:
+        raise Exception("Missing Vidu API key")
+
+    print(f"Resuming Vidu task {task_id} for job {job_id}")
+    video_path = await poll_vidu_task(task_id, job_id, vidu_api_key, vidu_base_url, deadline)
+    if not video_path:
+        raise Exception(f"Vidu task {task_id} did not produce a video")
+    return video_path
+
+async def cancel_vidu_task(task_id: str) -> bool:
+    """Ask Vidu to stop a task so it doesn't keep a concurrency slot (best effort)"""
+    vidu_base_url = os.getenv("VIDU_BASE_URL", "https://api.vidu.com")
+    try:
+        response = await asyncio.to_thread(
+            requests.post,
+            f"{vidu_base_url}/ent/v2/tasks/{task_id}/cancel",
+            headers={
+                "Authorization": f"Token {os.getenv('VIDU_API_KEY')}",
+                "Content-Type": "application/json"
+            },
+            json={"id": task_id},
+            timeout=15
+        )
+    except Exception as e:
+        print(f"Vidu cancel failed: {e}")
+        return False
+    if response.status_code != 200:
+        print(f"Vidu cancel failed: {response.status_code} - {response.text}")
+        return False
+    print(f"Vidu task cancelled: {task_id}")
+    return True
+
+async def generate_long_video(job_id: str, shots: list, deadline: Deadline, clip_task_ids: list = None) -> str:
+    """
+    Multi-clip video: each shot is its own Vidu task. Clips are submitted, polled and
+    downloaded concurrently on the provider slots free now (the job's own slot covers
+    one), then joined, so N clips take about as long as one while slots allow.
+    `clip_task_ids` are tasks submitted before a restart: those clips are polled again
+    instead of paid for twice, only the missing ones are submitted.
+    """
+    from app.services.batch_service import VIDU_GATE
+
+    vidu_api_key = os.getenv("VIDU_API_KEY")
+    vidu_base_url = os.getenv("VIDU_BASE_URL", "https://api.vidu.com")
+    if not vidu_api_key:
+        raise Exception("Missing Vidu API key")
+
+    record_stage(job_id, "submitting", {
+        "message": f"Sending {len(shots)} clips to the AI model...",
+        "status": "processing",
+        "provider": LONG_VIDEO_PROVIDER
+    })
+    await VIDU_GATE.refresh()
+    extra_slots = VIDU_GATE.claim(len(shots) - 1)
+    slots = asyncio.Semaphore(1 + extra_slots)
+    task_ids = (list(clip_task_ids or []) + [None] * len(shots))[:len(shots)]
+    print(f"Long video: {len(shots)} clips on {1 + extra_slots} provider slot(s)")
+    if any(task_ids):
+        print(f"Re-attaching to {sum(1 for t in task_ids if t)} clip task(s) of job {job_id}")
+
+    async def clip(i: int, shot: str) -> str:
+        async with slots:
+            if not task_ids[i]:
+                task_ids[i] = await submit_vidu_task(shot, vidu_api_key, vidu_base_url, deadline)
+            # saved so a cancel can stop every clip at Vidu, and a restart can re-attach to them
+            record_stage(job_id, "generating", {
+                "message": f"Generating {len(shots)} clips...",
+                "clip_task_ids": list(task_ids)
+            })
+            video_path = await poll_vidu_task(task_ids[i], job_id, vidu_api_key, vidu_base_url, deadline, clip=i)
+        if not video_path:
+            raise Exception(f"Vidu clip {i + 1} of {len(shots)} did not produce a video")
+        return video_path
+
+    tasks = [asyncio.create_task(clip(i, shot)) for i, shot in enumerate(shots)]
+    try:
+        clip_paths = await asyncio.gather(*tasks)
+    except BaseException:
+        # one clip failed (or the job stopped): the rest are useless, free their Vidu slots
+        for task in tasks:
+            task.cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        unfinished = [t for t, r in zip(task_ids, results) if t and not isinstance(r, str)]
+        await asyncio.gather(*(cancel_vidu_task(t) for t in unfinished))
+        raise
+    finally:
+        VIDU_GATE.release(extra_slots)
+
+    record_stage(job_id, "concatenating", {"message": f"Joining {len(shots)} clips..."})
+    report = await deadline.run("concatenating", concat_clips(clip_paths, f"./videos/{job_id}.mp4"))
+    if not report:
+        raise Exception("Could not join the clips")
+    for path in clip_paths:
+        os.remove(path)
+    return report["path"]
 
 async def get_vidu_credits():
     """Check remaining Vidu API credits using official endpoint"""
@@ -274,9 +511,12 @@ async def get_vidu_credits():
         }
         
         # Official Vidu API endpoint
-        response = requests.get(
-            "https://api.vidu.com/ent/v2/credits",
-            headers=headers
+        vidu_base_url = os.getenv("VIDU_BASE_URL", "https://api.vidu.com")
+        response = await asyncio.to_thread(
+            requests.get,
+            f"{vidu_base_url}/ent/v2/credits",
+            headers=headers,
+            timeout=15
         )
         
         if response.status_code == 200:
@@ -319,137 +559,143 @@ def calculate_videos_remaining(credits: int) -> dict:
         
     }
 
-async def poll_vidu_task(task_id: str, job_id: str, api_key: str, base_url: str):
-    """Poll Vidu task until video is ready"""
+async def poll_vidu_task(task_id: str, job_id: str, api_key: str, base_url: str, deadline: Deadline,
+                         clip: int = None):
+    """
+    Poll Vidu task until video is ready, at intervals following the learned generation time.
+    Past the deadline (less the time the download needs) the task is cancelled at Vidu.
+    `clip` is the index of the clip within a multi-clip video.
+    """
     headers = {"Authorization": f"Token {api_key}"}
+    job = get_job_data(job_id) or {}
+    poll_deadline = deadline.minus(POST_PROCESSING_RESERVE_SECONDS)
+    attempt = 0
 
-    for attempt in range(120):  
+    while not poll_deadline.expired:
+        attempt += 1
         try:
-            response = requests.get(
+            response = await poll_deadline.run("generating", asyncio.to_thread(
+                requests.get,
                 f"{base_url}/ent/v2/tasks/{task_id}/creations",
                 headers=headers,
                 timeout=15
-            )
+            ))
 
             if response.status_code != 200:
                 print(f"HTTP {response.status_code} error")
-                await asyncio.sleep(5)
+                await asyncio.sleep(min(5, poll_deadline.remaining()))
                 continue
 
             data = response.json()
-            state = data.get("state", "")
-            print(f"Attempt {attempt + 1}: {state}")
-
-            if state == "success":
-                creations = data.get("creations", [])
-                if creations:
-                    video_url = creations[0].get("url")
-                    if video_url:
-                        return await download_vidu_video(video_url, job_id)
-                return None
-                
-            elif state == "failed":
-                print("Generation failed")
-                return None
-                
-            else:
-                await asyncio.sleep(5)
-                
+        except DeadlineExceeded:
+            break
         except Exception as e:
             print(f"Polling error: {e}")
-            await asyncio.sleep(5)
+            await asyncio.sleep(min(5, poll_deadline.remaining()))
+            continue
+
+        state = data.get("state", "")
+        print(f"Attempt {attempt}: {state}")
 
-    print("Polling timeout")
-    return None
+        if state == "success":
+            creations = data.get("creations", [])
+            if creations:
+                video_url = creations[0].get("url")
+                if video_url:
+                    if clip is None:  # a multi-clip job is still generating its other clips
+                        record_stage(job_id, "downloading")
+                    return await download_vidu_video(video_url, job_id, deadline, clip)
+            return None
 
-async def download_vidu_video(url: str, job_id: str):
+        elif state == "failed":
+            print("Generation failed")
+            return None
+
+        else:
+            await asyncio.sleep(min(vidu_poll_delay(job), poll_deadline.remaining()))
+
+    print(f"Vidu task {task_id} not ready within the job's time budget, cancelling it")
+    await cancel_vidu_task(task_id)
+    raise DeadlineExceeded("generating")
+
+async def download_vidu_video(url: str, job_id: str, deadline: Deadline, clip: int = None):
     """Download video and save locally"""
+    if STREAM_TRANSCODE and clip is None:
+        return await stream_vidu_video(url, job_id, deadline)
     try:
-        response = requests.get(url, timeout=60)
+        response = await deadline.run("downloading", asyncio.to_thread(requests.get, url, timeout=60))
         response.raise_for_status()
         
         os.makedirs("./videos", exist_ok=True)
-        video_path = f"./videos/{job_id}.mp4"
+        video_path = f"./videos/{job_id}.mp4" if clip is None else f"./videos/{job_id}_clip{clip}.mp4"
         
         with open(video_path, "wb") as f:
             f.write(response.content)
             
         print(f"Video downloaded: {video_path}")
         return video_path
-        
+
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"Download failed: {e}")
         return None
 
-
-async def use_huggingface_fallback(job_id: str, prompt: str):
-    """Fallback to HuggingFace (your original implementation)"""
+async def stream_vidu_video(url: str, job_id: str, deadline: Deadline):
+    """Download video while transcoding it for WhatsApp in the same pass"""
     try:
-        from gradio_client import Client
-        
-        hf_token = os.getenv("HUGGINGFACE_TOKEN")
-        if hf_token:
-            login(hf_token)
-            
-        update_job_data(job_id, {"message": "🤖 Using HuggingFace model..."})
-        
-        client = Client("hysts/zeroscope-v2")
-        result = client.predict(
-            prompt=prompt,
-            seed=0,
-            num_frames=24,
-            num_inference_steps=25,
-            api_name="/run"
-        )
-        
-        
-        if isinstance(result, dict) and 'video' in result:
-            temp_video_path = result['video']
-        else:
-            temp_video_path = result
-        
-        videos_dir = "./videos"
-        os.makedirs(videos_dir, exist_ok=True)
-        permanent_video_path = f"{videos_dir}/{job_id}.mp4"
-        
-        if os.path.exists(temp_video_path):
-            shutil.copy2(temp_video_path, permanent_video_path)
-            
-            update_job_data(job_id, {
-                "status": "completed",
-                "message": "✅ Video generated successfully!",
-                "video_url": f"/api/download/{job_id}",
-                "video_path": permanent_video_path
-            })
-        else:
-            raise Exception("HuggingFace video not found")
-            
-    except Exception as hf_error:
-        print(f"⚠️ HuggingFace fallback failed: {hf_error}")
-        await use_mock_video_fallback(job_id, prompt)
+        os.makedirs("./videos", exist_ok=True)
+        video_path = f"./videos/{job_id}.mp4"
+        report = await deadline.run("downloading", stream_download_transcode(
+            url, video_path, f"./videos/{job_id}_ultra.mp4",
+            expected_duration=VIDU_CLIP_SECONDS,
+            target_bytes=WHATSAPP_MAX_MEDIA_BYTES,
+            max_video_kbps=DELIVERY_MAX_VIDEO_KBPS
+        ))
+        if report:
+            update_job_data(job_id, {"encode": report})
+        print(f"Video downloaded: {video_path}")
+        return video_path
 
-async def use_mock_video_fallback(job_id: str, prompt: str):
-    """Final fallback to mock video"""
-    try:
-        videos_dir = "./videos"
-        mock_video_path = f"{videos_dir}/mock_video.mp4"
-        final_path = f"{videos_dir}/{job_id}.mp4"
-        
-        if os.path.exists(mock_video_path):
-            shutil.copy2(mock_video_path, final_path)
-            
-            update_job_data(job_id, {
-                "status": "completed",
-                "message": "✅ Demo video ready (using placeholder)",
-                "video_url": f"/api/download/{job_id}",
-                "video_path": final_path
-            })
-        else:
-            raise Exception("No mock video available")
-            
+    except DeadlineExceeded:
+        raise
     except Exception as e:
-        update_job_data(job_id, {
-            "status": "error",
-            "message": f"❌ All video generation methods failed",
-            "video_url": None
-        })
+        print(f"Download failed: {e}")
+        return None
+
+
+async def use_huggingface_fallback(job_id: str, prompt: str, user_phone: str, deadline: Deadline) -> str:
+    """HuggingFace provider (zeroscope Space through the shared client pool)"""
+    record_stage(job_id, "huggingface", {"message": "🤖 Using HuggingFace model..."})
+
+    temp_video_path = await deadline.run(
+        "huggingface", hf_generate(prompt, seed=0, num_frames=24, num_inference_steps=25)
+    )
+    
+    if not os.path.exists(temp_video_path):
+        raise Exception("HuggingFace video not found")
+
+    videos_dir = "./videos"
+    os.makedirs(videos_dir, exist_ok=True)
+    # separate name so a hedged Vidu download for the same job can't clobber it
+    permanent_video_path = f"{videos_dir}/{job_id}_hf.mp4"
+    shutil.copy2(temp_video_path, permanent_video_path)
+    return permanent_video_path
+
+async def use_mock_video_fallback(job_id: str, prompt: str, user_phone: str, deadline: Deadline) -> str:
+    """Final fallback to mock video"""
+    videos_dir = "./videos"
+    mock_video_path = f"{videos_dir}/mock_video.mp4"
+    final_path = f"{videos_dir}/{job_id}.mp4"
+    
+    if not os.path.exists(mock_video_path):
+        raise Exception("No mock video available")
+
+    record_stage(job_id, "mock", {"message": "Using placeholder video..."})
+    shutil.copy2(mock_video_path, final_path)
+    return final_path
+
+
+register_provider("vidu", generate_with_vidu)
+register_provider("huggingface", use_huggingface_fallback)
+register_provider("mock", use_mock_video_fallback, hedgeable=False)
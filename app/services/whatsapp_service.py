@@ -1,14 +1,16 @@
 import uuid, asyncio
 from app.config import twilio_client, TWILIO_WHATSAPP_FROM, redis_client
-from app.services.redis_service import store_job_data, get_job_data
-import json
+from app.services.redis_service import store_job_data, get_job_data, get_user_job_ids, is_job_cancelled
+from app.services.timeline_service import start_job_timeline, record_stage
+from app.services.delivery_service import sign_url
+from app.services.eta_service import estimate_job, format_duration, typical_job_seconds
 
 def handle_whatsapp_command(command: str, user_phone: str) -> str:
     """Handle WhatsApp bot commands"""
     command = command.lower().strip()
     
     if command == '/help':
-        return """ *AI Video Bot Help*
+        return f""" *AI Video Bot Help*
 
 *Generate Videos:*
 /generate <your prompt>
@@ -19,6 +21,7 @@ def handle_whatsapp_command(command: str, user_phone: str) -> str:
 /credits - check no of credits left
 /history - To show prompt history
 /suggestions - Get personalized video prompts based on user history
+/cancel - Stop the video being generated
 /clear - Reset conversation history for privacy
 
 *Examples:*
@@ -29,7 +32,7 @@ def handle_whatsapp_command(command: str, user_phone: str) -> str:
 *Tips:*
 • Be descriptive (min 5 words)
 • Include actions, settings, objects
-• Videos take around 3 minutes to generate"""
+• Videos take {format_duration(typical_job_seconds())} to generate"""
     
     elif command == '/status':
     
@@ -49,24 +52,18 @@ Type /help for usage instructions"""
         if not redis_client:
             return " History unavailable (Redis not connected)"
         
-        clean_phone = user_phone.replace("whatsapp:", "").replace("+", "").replace("-", "").replace(" ", "")
-        pattern = f"user_job:{clean_phone}:*"
-        job_keys = redis_client.keys(pattern)
+        job_ids = get_user_job_ids(user_phone, limit=5)  # Last 5 jobs
         
-        if not job_keys:
+        if not job_ids:
             return " No video history found."
         
         response_lines = [" *Your Recent Prompts:* "]
         
-        for key in sorted(job_keys, reverse=True)[:5]:  # Last 5 jobs
-            job_data = redis_client.get(key)
-            if job_data:
-                job = json.loads(job_data)
+        for job_id in job_ids:
+            job = get_job_data(job_id)
+            if job:
                 status = job.get("status", "unknown").capitalize()
                 prompt = job.get("prompt", "")[:30] + ("..." if len(job.get("prompt", "")) > 30 else "")
-            
-                
-                job_id = key.split(":")[-1]
                 line = f"- *{status}*: {prompt}"
                 response_lines.append(line)
         
@@ -84,6 +81,7 @@ Available commands:
 /status - Check status
 /credits - check no of credits left
 /history - To show prompt history
+/cancel - Stop the video being generated
 /clear - Reset conversation history for privacy
 /suggestions - Get personalized video prompts based on user history
 
@@ -121,47 +119,66 @@ def send_whatsapp_message(to: str, body: str, media_url: str = None):
         return None
 
 
+async def reject_if_busy(user_phone: str) -> bool:
+    """Tell the user to come back later if a new job can't be accepted now"""
+    from app.services.admission_service import AdmissionRejected, check_admission
+
+    try:
+        await check_admission(f"whatsapp:{user_phone}", "whatsapp")
+        return False
+    except AdmissionRejected as e:
+        minutes = max(1, -(-e.retry_after // 60))
+        if e.status_code == 429:
+            body = f"⏳ You already have videos in progress. Please wait for them and try again in about {minutes} min."
+        else:
+            body = f"🚦 We're busy right now. Please try again in about {minutes} min."
+        send_whatsapp_message(user_phone, body)
+        print(f"🚦 Rejected WhatsApp job for {user_phone}: {e.reason}")
+        return True
+
+
 async def handle_whatsapp_video_generation(prompt: str, user_phone: str):
     """Handle video generation for WhatsApp"""
     try:
-        
-        send_whatsapp_message(
-            user_phone, 
-            f" Generating your video: '{prompt}'\n\nThis usually takes around 3 minutes..."
-        )
-        
+        # the user may have taken a while to pick an option, so check load again
+        if await reject_if_busy(user_phone):
+            return
+
         # Create job
         job_id = str(uuid.uuid4())
         job_data = {
-            "status": "processing",
-            "message": "Processing request...",
+            "status": "queued",
+            "message": "Waiting for a free generation slot...",
             "video_url": None,
             "prompt": prompt,
             "user_phone": user_phone
         }
         store_job_data(job_id, job_data, user_phone)
+        start_job_timeline(job_id)
+
+        eta = estimate_job(job_id, get_job_data(job_id) or job_data)["eta_seconds"]
+        send_whatsapp_message(
+            user_phone, 
+            f" Generating your video: '{prompt}'\n\nThis should take {format_duration(eta)}..."
+        )
         
         # Send progress update
         await asyncio.sleep(5)
         send_whatsapp_message(user_phone, "Your video is being processed...")
         
         from app.services.video_service import video_generation_process
+        from app.services.scheduler_service import schedule_job
         
-        # Generate video
-        await video_generation_process(job_id, prompt, user_phone)
+        # Generate video once the fair scheduler gives this phone a slot
+        try:
+            await schedule_job(job_id, f"whatsapp:{user_phone}", "whatsapp", video_generation_process, job_id, prompt, user_phone)
+        except asyncio.CancelledError:
+            if is_job_cancelled(job_id):
+                return  # the user sent /cancel and already got a reply
+            raise
         
         # Check final status and send result
-        final_job_data = get_job_data(job_id)
-        if final_job_data and final_job_data["status"] == "completed":
-            PUBLIC_BASE_URL = "https://video-generation-web-app-production.up.railway.app"
-            video_url = f"{PUBLIC_BASE_URL}/api/download/{job_id}"
-            send_whatsapp_message(user_phone, "Here's your video:", media_url=video_url)
-        
-        else:
-            send_whatsapp_message(
-                user_phone,
-                " Video generation failed. Please try again with a different prompt."
-            )
+        await deliver_video_result(job_id, user_phone)
         
     except Exception as e:
         print(f" WhatsApp video generation failed: {e}")
@@ -170,6 +187,21 @@ async def handle_whatsapp_video_generation(prompt: str, user_phone: str):
             " Sorry, video generation failed. Please try again."
         )
 
+async def deliver_video_result(job_id: str, user_phone: str):
+    """Send the finished video (or a failure notice) for a job to the user"""
+    final_job_data = get_job_data(job_id)
+    if final_job_data and final_job_data["status"] == "completed":
+        PUBLIC_BASE_URL = "https://video-generation-web-app-production.up.railway.app"
+        video_url = sign_url(f"{PUBLIC_BASE_URL}/api/download/{job_id}")
+        send_whatsapp_message(user_phone, "Here's your video:", media_url=video_url)
+        record_stage(job_id, "delivered")
+    
+    else:
+        send_whatsapp_message(
+            user_phone,
+            " Video generation failed. Please try again with a different prompt."
+        )
+
 async def send_progress_update(user_phone: str, message: str):
     """Send progress update to user via WhatsApp"""
     if user_phone and twilio_client:
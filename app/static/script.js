@@ -1,23 +1,29 @@
 class VideoGenerator {
     constructor() {
         this.currentJobID = null;
-        this.pollingInterval = null;
+        this.videoURL = null;
+        this.polling = false;
+        this.estimate = null;
+        this.estimateTicker = null;
         this.initializeElements();
         this.attachEventListeners();
     }
 
     initializeElements() {
         this.promptInput = document.getElementById("promptInput");
+        this.durationSelect = document.getElementById("durationSelect");
         this.generateBtn = document.getElementById("generateBtn");
         this.btnText = document.querySelector(".btn-text");
         this.btnLoader = document.querySelector(".btn-loader");
         this.statusSection = document.getElementById("statusSection");
         this.statusMessage = document.getElementById("statusMessage");
         this.progressFill = document.getElementById("progressFill");
+        this.previewImage = document.getElementById("previewImage");
         this.videoSection = document.getElementById("videoSection");
         this.generatedVideo = document.getElementById("generatedVideo");
         this.downloadBtn = document.getElementById("downloadBtn");
         this.generateNewBtn = document.getElementById("generateNewBtn");
+        this.cancelBtn = document.getElementById("cancelBtn");
     }
 
     attachEventListeners() {
@@ -36,6 +42,9 @@ class VideoGenerator {
         
         // Generate new button
         this.generateNewBtn.addEventListener('click', () => this.resetInterface());
+
+        // Cancel Button
+        this.cancelBtn.addEventListener('click', () => this.cancelVideo());
     }
 
     async generateVideo() {
@@ -63,16 +72,23 @@ class VideoGenerator {
                 headers: {
                     'Content-Type': 'application/json'
                 },
-                body: JSON.stringify({ prompt })
+                // longer than one 4s clip: the server generates the clips in parallel and joins them
+                body: JSON.stringify({ prompt, duration: parseInt(this.durationSelect.value, 10) })
             });
 
             if (!response.ok) {
                 const error_data = await response.json();
+                const retryAfter = parseInt(response.headers.get('Retry-After'), 10);
+                if (retryAfter) {
+                    const minutes = Math.max(1, Math.ceil(retryAfter / 60));
+                    throw new Error(`${error_data.detail}. Please try again in about ${minutes} minute${minutes > 1 ? 's' : ''}.`);
+                }
                 throw new Error(error_data.detail || `HTTP error, status: ${response.status}`);
             }
 
             const data = await response.json();
             this.currentJobID = data.job_id;
+            this.videoURL = null;
             
             // Start polling for status
             this.startPollingStatus();
@@ -86,27 +102,62 @@ class VideoGenerator {
 
     startPollingStatus() {
         this.updateStatus('Started video generation', 10);
-        
-        this.pollingInterval = setInterval(async () => {
+        this.polling = true;
+        this.cancelBtn.style.display = 'inline-block';
+        this.pollStatus(this.currentJobID);
+    }
+
+    async cancelVideo() {
+        if (!this.currentJobID) {
+            return;
+        }
+        this.cancelBtn.disabled = true;
+        try {
+            // 409 means it finished first; the status poll shows the result either way
+            await fetch(`/api/jobs/${this.currentJobID}`, { method: 'DELETE' });
+        } catch (error) {
+            console.error('Error cancelling video:', error);
+        } finally {
+            this.cancelBtn.disabled = false;
+        }
+    }
+
+    async pollStatus(jobID) {
+        // Long-poll: the server holds each request until the status changes (304 after ~25s of no change)
+        let etag = null;
+
+        while (this.polling && this.currentJobID === jobID) {
             try {
-                const response = await fetch(`/api/status/${this.currentJobID}`);
-                
+                const response = await fetch(`/api/status/${jobID}?wait=25`, {
+                    headers: etag ? { 'If-None-Match': etag } : {},
+                    cache: 'no-store'
+                });
+                if (!this.polling || this.currentJobID !== jobID) {
+                    return;
+                }
+                if (response.status === 304) {
+                    continue;
+                }
                 if (!response.ok) {
                     throw new Error(`HTTP error, status: ${response.status}`);
                 }
 
+                etag = response.headers.get('ETag');
                 const status = await response.json();
                 
-                if (status.status === 'processing') {
-                    const currentProgress = this.getProgressPercentage();
-                    const newProgress = Math.min(85, currentProgress + 5);
-                    this.updateStatus(status.message, newProgress);
+                if (status.status === 'processing' || status.status === 'queued') {
+                    this.showPreview(status);
+                    this.trackEstimate(status);
                 } else if (status.status === 'completed') {
                     this.handleVideoComplete(status);
                     this.stopPollingStatus();
                 } else if (status.status === 'error') {
                     this.showError(status.message);
                     this.stopPollingStatus();
+                } else if (status.status === 'cancelled') {
+                    this.hidePreview();
+                    this.showError('Video generation cancelled');
+                    this.stopPollingStatus();
                 }
 
             } catch (error) {
@@ -114,31 +165,69 @@ class VideoGenerator {
                 this.showError(`Failed to get status: ${error.message}`);
                 this.stopPollingStatus();
             }
-        }, 3000);
+        }
     }
 
     stopPollingStatus() {
-        if (this.pollingInterval) {
-            clearInterval(this.pollingInterval);
-            this.pollingInterval = null;
-        }
+        this.polling = false;
+        this.cancelBtn.style.display = 'none';
+        this.stopEstimateTicker();
         this.setLoadingState(false);
     }
 
+    trackEstimate(status) {
+        // The server only answers when something changes, so progress and ETA move on locally in between
+        this.estimate = {
+            message: status.message,
+            progress: status.progress,
+            eta: status.eta_seconds,
+            at: Date.now()
+        };
+        this.renderEstimate();
+        if (!this.estimateTicker) {
+            this.estimateTicker = setInterval(() => this.renderEstimate(), 1000);
+        }
+    }
+
+    renderEstimate() {
+        const { message, progress, eta, at } = this.estimate;
+        if (eta === null || eta === undefined) {
+            this.updateStatus(message, progress);
+            return;
+        }
+        const passed = (Date.now() - at) / 1000;
+        const left = Math.max(0, eta - passed);
+        const current = Math.min(99, progress + (99 - progress) * Math.min(1, passed / Math.max(eta, 1)));
+        const remaining = left >= 60 ? `about ${Math.round(left / 60)} min left` : left > 0 ? `about ${Math.ceil(left / 10) * 10}s left` : 'almost done';
+        this.updateStatus(`${message} (${remaining})`, Math.round(current));
+    }
+
+    stopEstimateTicker() {
+        if (this.estimateTicker) {
+            clearInterval(this.estimateTicker);
+            this.estimateTicker = null;
+        }
+    }
+
     handleVideoComplete(status) {
         this.updateStatus('Video generation completed', 100);
         
         setTimeout(() => {
+            this.hidePreview();
+            if (status.poster_url) {
+                this.generatedVideo.poster = status.poster_url;
+            }
             this.generatedVideo.src = status.video_url;
+            // signed when DOWNLOAD_URL_SECRET is set, a bare /api/download/{id} would get a 403
+            this.videoURL = status.video_url;
             this.showVideoSection();
         }, 1000);
     }
 
     downloadVideo() {
-        if (this.currentJobID) {
-            const downloadURL = `/api/download/${this.currentJobID}`;
+        if (this.videoURL) {
             const link = document.createElement('a');
-            link.href = downloadURL;
+            link.href = this.videoURL;
             link.download = `video_${Date.now()}.mp4`;
             document.body.appendChild(link);
             link.click();
@@ -146,8 +235,25 @@ class VideoGenerator {
         }
     }
 
+    showPreview(status) {
+        // Prefer the animated preview, fall back to the poster frame
+        const src = status.preview_url || status.poster_url;
+        if (src && this.previewImage.getAttribute('src') !== src) {
+            this.previewImage.src = src;
+            this.previewImage.style.display = 'block';
+        }
+    }
+
+    hidePreview() {
+        this.previewImage.style.display = 'none';
+        this.previewImage.removeAttribute('src');
+    }
+
     resetInterface() {
         this.currentJobID = null;
+        this.videoURL = null;
+        this.hidePreview();
+        this.generatedVideo.removeAttribute('poster');
         this.promptInput.value = '';
         this.hideStatusSection();
         this.hideVideoSection();
@@ -191,10 +297,6 @@ class VideoGenerator {
         this.progressFill.style.width = `${progress}%`;
     }
 
-    getProgressPercentage() {
-        return parseInt(this.progressFill.style.width) || 0;
-    }
-
     showError(message) {
         this.updateStatus(`${message}`, 0);
         this.setLoadingState(false);
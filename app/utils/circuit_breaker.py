@@ -0,0 +1,102 @@
+import time
+from collections import deque
+from typing import Optional
+
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker.
+    closed    -> calls go through, outcomes are recorded
+    open      -> calls are rejected until open_seconds have passed
+    half_open -> a single probe call is let through; success closes, failure re-opens
+    """
+
+    def __init__(self, name: str, window: int = 20, min_calls: int = 3,
+                 failure_threshold: float = 0.5, open_seconds: float = 60,
+                 slow_call_seconds: Optional[float] = None):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.slow_call_seconds = slow_call_seconds
+
+        self.results = deque(maxlen=window)  # (ok, latency_seconds)
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+    def allow_request(self) -> bool:
+        """Return True if a call may be made now (claims the probe slot when half-open)."""
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.open_seconds:
+                return False
+            self.state = "half_open"
+            self.probe_in_flight = False
+
+        if self.state == "half_open":
+            if self.probe_in_flight:
+                return False
+            self.probe_in_flight = True
+        return True
+
+    def accepting(self) -> bool:
+        """Whether allow_request() would let a call through now, without claiming the probe."""
+        if self.state == "open":
+            return time.monotonic() - self.opened_at >= self.open_seconds
+        return not (self.state == "half_open" and self.probe_in_flight)
+
+    def record_success(self, latency: float) -> None:
+        slow = self.slow_call_seconds is not None and latency > self.slow_call_seconds
+        self.results.append((not slow, latency))
+        if self.state == "half_open":
+            if slow:
+                self._open()
+            else:
+                print(f"✅ Circuit '{self.name}' closed after successful probe")
+                self.state = "closed"
+                self.probe_in_flight = False
+                self.results.clear()
+            return
+        self._check_threshold()
+
+    def record_failure(self, latency: float) -> None:
+        self.results.append((False, latency))
+        if self.state == "half_open":
+            self._open()
+            return
+        self._check_threshold()
+
+    def release(self) -> None:
+        """Give back the probe slot of a call that was cancelled before it finished."""
+        self.probe_in_flight = False
+
+    def error_rate(self) -> float:
+        if not self.results:
+            return 0.0
+        return sum(1 for ok, _ in self.results if not ok) / len(self.results)
+
+    def _check_threshold(self) -> None:
+        if self.state == "closed" and len(self.results) >= self.min_calls \
+                and self.error_rate() >= self.failure_threshold:
+            self._open()
+
+    def _open(self) -> None:
+        print(f"⚠️ Circuit '{self.name}' opened (error rate {self.error_rate():.0%})")
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        latencies = sorted(latency for _, latency in self.results)
+        retry_in = 0.0
+        if self.state == "open":
+            retry_in = max(0.0, self.open_seconds - (time.monotonic() - self.opened_at))
+        return {
+            "state": self.state,
+            "calls": len(self.results),
+            "error_rate": round(self.error_rate(), 3),
+            "p50_latency_s": round(latencies[len(latencies) // 2], 2) if latencies else None,
+            "p95_latency_s": round(latencies[int(len(latencies) * 0.95)], 2) if latencies else None,
+            "retry_in_s": round(retry_in, 1),
+        }
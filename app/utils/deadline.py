@@ -0,0 +1,64 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class DeadlineExceeded(Exception):
+    """A job's time budget ran out; `stage` is the stage it was in."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"time budget exhausted during {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    """
+    Absolute end time of a job's budget. Wall-clock, so it can be stored on the job
+    and honoured by whichever worker resumes it. Stages take their timeout from what
+    is left (capped by their own limit), so together they can't outlast the budget.
+    """
+
+    def __init__(self, expires_at: float):
+        self.expires_at = expires_at
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        return cls(time.time() + seconds)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.time())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def minus(self, seconds: float) -> "Deadline":
+        """An earlier deadline that leaves `seconds` for the stages after this one."""
+        return Deadline(self.expires_at - seconds)
+
+    def check(self, stage: str) -> None:
+        if self.expired:
+            raise DeadlineExceeded(stage)
+
+    def timeout(self, stage: str, cap: Optional[float] = None) -> float:
+        """Seconds `stage` may take: what is left of the budget, at most `cap`."""
+        self.check(stage)
+        return min(cap, self.remaining()) if cap else self.remaining()
+
+    async def run(self, stage: str, aw, cap: Optional[float] = None):
+        """
+        Await `aw` for at most timeout(stage, cap). Running out of budget raises
+        DeadlineExceeded; hitting `cap` first raises asyncio.TimeoutError as usual.
+        """
+        try:
+            timeout = self.timeout(stage, cap)
+        except DeadlineExceeded:
+            if asyncio.iscoroutine(aw):
+                aw.close()
+            raise
+        try:
+            return await asyncio.wait_for(aw, timeout)
+        except asyncio.TimeoutError:
+            if self.expired:
+                raise DeadlineExceeded(stage) from None
+            raise
@@ -0,0 +1,96 @@
+import json
+from typing import Optional, Union
+
+import msgpack
+
+# First byte of every encoded record. Legacy records are JSON and start with "{".
+FORMAT_VERSION = 1
+_HEADER = bytes([FORMAT_VERSION])
+
+# Stand-in for the job id inside string values (paths and download URLs embed it)
+JOB_ID_MARK = "\x00"
+
+# Codes are list positions: only ever append, never reorder or remove.
+JOB_FIELDS = (
+    "status", "message", "video_url", "prompt", "user_phone", "stage", "timeline",
+    "started_at", "provider", "provider_task_id", "raw_video_path", "video_path",
+    "encode", "poster_path", "preview_path", "owner", "recoveries", "batch_id", "progress",
+    "reused_from", "version", "queue_depth", "deadline_at", "shots", "clip_task_ids",
+    "job_class", "flow",
+)
+STATUSES = ("queued", "processing", "completed", "error", "cancelled")
+STAGES = (
+    "queued", "connecting", "submitting", "generating", "downloading", "huggingface", "mock",
+    "probing", "remuxing", "transcoding", "completed", "error", "delivered", "cancelled",
+    "concatenating",
+)
+
+_FIELD_CODES = {name: i for i, name in enumerate(JOB_FIELDS)}
+_STATUS_CODES = {name: i for i, name in enumerate(STATUSES)}
+_STAGE_CODES = {name: i for i, name in enumerate(STAGES)}
+
+
+def is_legacy(raw: Union[bytes, str]) -> bool:
+    """True for records written as plain JSON before the binary format."""
+    if isinstance(raw, str):
+        return True
+    return raw[:1] == b"{"
+
+
+def _unpack(raw: bytes):
+    if raw[0] != FORMAT_VERSION:
+        raise ValueError(f"Unknown record format version {raw[0]}")
+    return msgpack.unpackb(raw[1:], raw=False, strict_map_key=False)
+
+
+def encode_record(data) -> bytes:
+    """Versioned MessagePack encoding for small records (user state and the like)."""
+    return _HEADER + msgpack.packb(data, use_bin_type=True)
+
+
+def decode_record(raw: Union[bytes, str]):
+    if is_legacy(raw):
+        return json.loads(raw)
+    return _unpack(raw)
+
+
+def encode_job(job_id: str, data: dict) -> bytes:
+    """
+    Encode a job record: known field names, statuses and stages become small ints
+    and the job id is dropped from paths/URLs. Unknown fields are kept verbatim.
+    """
+    packed = {}
+    for key, value in data.items():
+        if key == "status":
+            value = _STATUS_CODES.get(value, value)
+        elif key == "stage":
+            value = _STAGE_CODES.get(value, value)
+        elif key == "timeline" and value:
+            value = [[_STAGE_CODES.get(stage, stage), ms] for stage, ms in value]
+        elif isinstance(value, str) and job_id in value:
+            value = value.replace(job_id, JOB_ID_MARK)
+        packed[_FIELD_CODES.get(key, key)] = value
+    return encode_record(packed)
+
+
+def decode_job(job_id: str, raw: Union[bytes, str]) -> Optional[dict]:
+    """Decode a job record in either the binary or the legacy JSON format."""
+    if is_legacy(raw):
+        return json.loads(raw)
+
+    data = {}
+    for code, value in _unpack(raw).items():
+        key = JOB_FIELDS[code] if isinstance(code, int) else code
+        if key == "status" and isinstance(value, int):
+            value = STATUSES[value]
+        elif key == "stage" and isinstance(value, int):
+            value = STAGES[value]
+        elif key == "timeline" and value:
+            value = [[STAGES[s] if isinstance(s, int) else s, ms] for s, ms in value]
+        elif isinstance(value, str) and JOB_ID_MARK in value:
+            value = value.replace(JOB_ID_MARK, job_id)
+        data[key] = value
+    return data
+
+
+__all__ = ["FORMAT_VERSION", "is_legacy", "encode_record", "decode_record", "encode_job", "decode_job"]
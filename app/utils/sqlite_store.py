@@ -0,0 +1,251 @@
+import fnmatch
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import msgpack
+
+
+class SQLiteStore:
+    """
+    Minimal Redis stand-in backed by a SQLite file, shared by every worker process
+    on the node. Implements the subset of redis-py (decode_responses=True) this app
+    uses: strings, hashes, lists and streams, with per-key expiry. String values
+    written as bytes are returned as bytes, so one instance also serves binary records.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+
+    # internals
+    def _tx(self, fn):
+        """Run fn(conn) in an IMMEDIATE transaction so read-modify-write is atomic across processes."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+                self._conn.execute("COMMIT")
+                return result
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _read(conn, key: str):
+        row = conn.execute("SELECT value, expires_at FROM kv WHERE key = ?", (key,)).fetchone()
+        if not row:
+            return None, None
+        value, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+            return None, None
+        return value, expires_at
+
+    @staticmethod
+    def _write(conn, key: str, value, expires_at: Optional[float]) -> None:
+        conn.execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, value, expires_at)
+        )
+
+    def _update_json(self, key: str, default, fn, dumps=json.dumps, loads=json.loads):
+        """Apply fn to the decoded hash/list stored at key (keeping its TTL)."""
+        def run(conn):
+            raw, expires_at = self._read(conn, key)
+            data = loads(raw) if raw is not None else default
+            result = fn(data)
+            if data:
+                self._write(conn, key, dumps(data), expires_at)
+            else:
+                conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+            return result
+        return self._tx(run)
+
+    def _get_json(self, key: str, default, loads=json.loads):
+        raw = self.get(key)
+        return loads(raw) if raw is not None else default
+
+    # connection
+    def ping(self) -> bool:
+        self._conn.execute("SELECT 1")
+        return True
+
+    def pipeline(self, transaction: bool = True) -> "_Pipeline":
+        return _Pipeline(self)
+
+    # strings
+    def get(self, key: str) -> Optional[str]:
+        return self._tx(lambda conn: self._read(conn, key)[0])
+
+    def mget(self, keys) -> list:
+        return self._tx(lambda conn: [self._read(conn, key)[0] for key in keys])
+
+    def set(self, key: str, value, ex: Optional[int] = None, nx: bool = False):
+        if not isinstance(value, bytes):
+            value = str(value)
+
+        def run(conn):
+            if nx and self._read(conn, key)[0] is not None:
+                return None
+            self._write(conn, key, value, time.time() + ex if ex else None)
+            return True
+        return self._tx(run)
+
+    def setex(self, key: str, seconds: int, value) -> bool:
+        return self.set(key, value, ex=seconds)
+
+    def delete(self, *keys: str) -> int:
+        def run(conn):
+            return sum(conn.execute("DELETE FROM kv WHERE key = ?", (k,)).rowcount for k in keys)
+        return self._tx(run)
+
+    def expire(self, key: str, seconds: int) -> bool:
+        def run(conn):
+            return conn.execute(
+                "UPDATE kv SET expires_at = ? WHERE key = ?", (time.time() + seconds, key)
+            ).rowcount > 0
+        return self._tx(run)
+
+    # compare-and-set (what Lua scripts do atomically on Redis)
+    def expire_if_equal(self, key: str, value, seconds: int) -> bool:
+        """Extend the key's TTL only while it still holds value."""
+        def run(conn):
+            if self._read(conn, key)[0] != value:
+                return False
+            return conn.execute(
+                "UPDATE kv SET expires_at = ? WHERE key = ?", (time.time() + seconds, key)
+            ).rowcount > 0
+        return self._tx(run)
+
+    def delete_if_equal(self, key: str, value) -> bool:
+        """Delete the key only while it still holds value."""
+        def run(conn):
+            if self._read(conn, key)[0] != value:
+                return False
+            return conn.execute("DELETE FROM kv WHERE key = ?", (key,)).rowcount > 0
+        return self._tx(run)
+
+    def ttl(self, key: str) -> int:
+        """Seconds left, -1 without expiry, -2 if missing (as in Redis)."""
+        def run(conn):
+            value, expires_at = self._read(conn, key)
+            if value is None:
+                return -2
+            return -1 if expires_at is None else max(0, int(expires_at - time.time()))
+        return self._tx(run)
+
+    def keys(self, pattern: str = "*") -> list:
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM kv WHERE key GLOB ? AND (expires_at IS NULL OR expires_at > ?)",
+                (pattern, now)
+            ).fetchall()
+        return [k for (k,) in rows if fnmatch.fnmatchcase(k, pattern)]
+
+    def scan_iter(self, match: str = "*", count: Optional[int] = None):
+        yield from self.keys(match)
+
+    # hashes
+    def hset(self, name: str, key: str, value) -> int:
+        def run(data):
+            is_new = key not in data
+            data[key] = str(value)
+            return int(is_new)
+        return self._update_json(name, {}, run)
+
+    def hget(self, name: str, key: str) -> Optional[str]:
+        return self._get_json(name, {}).get(key)
+
+    def hgetall(self, name: str) -> dict:
+        return self._get_json(name, {})
+
+    # lists
+    def lpush(self, name: str, *values) -> int:
+        def run(data):
+            for v in values:
+                data.insert(0, str(v))
+            return len(data)
+        return self._update_json(name, [], run)
+
+    def lpop(self, name: str) -> Optional[str]:
+        return self._update_json(name, [], lambda data: data.pop(0) if data else None)
+
+    def llen(self, name: str) -> int:
+        return len(self._get_json(name, []))
+
+    def lrange(self, name: str, start: int, end: int) -> list:
+        data = self._get_json(name, [])
+        return data[start:] if end == -1 else data[start:end + 1]
+
+    def ltrim(self, name: str, start: int, end: int) -> bool:
+        def run(data):
+            data[:] = data[start:] if end == -1 else data[start:end + 1]
+            return True
+        return self._update_json(name, [], run)
+
+    # streams (entries are packed with MessagePack so binary field values survive)
+    @staticmethod
+    def _pack(data) -> bytes:
+        return msgpack.packb(data, use_bin_type=True)
+
+    @staticmethod
+    def _unpack(raw):
+        return msgpack.unpackb(raw, raw=False)
+
+    def xadd(self, name: str, fields: dict, maxlen: Optional[int] = None, approximate: bool = True) -> bytes:
+        def to_bytes(v):
+            return v if isinstance(v, bytes) else str(v).encode()
+
+        def run(entries):
+            ms = int(time.time() * 1000)
+            seq = 0
+            if entries:
+                last_ms, last_seq = (int(p) for p in entries[-1][0].split(b"-"))
+                if last_ms >= ms:
+                    ms, seq = last_ms, last_seq + 1
+            entry_id = f"{ms}-{seq}".encode()
+            entries.append([entry_id, {to_bytes(k): to_bytes(v) for k, v in fields.items()}])
+            if maxlen is not None and len(entries) > maxlen:
+                del entries[:len(entries) - maxlen]
+            return entry_id
+        return self._update_json(name, [], run, dumps=self._pack, loads=self._unpack)
+
+    def xlen(self, name: str) -> int:
+        return len(self._get_json(name, [], loads=self._unpack))
+
+    def xrevrange(self, name: str, max: str = "+", min: str = "-", count: Optional[int] = None) -> list:
+        # only full-range reads are used, so max/min are not interpreted
+        entries = [tuple(e) for e in reversed(self._get_json(name, [], loads=self._unpack))]
+        return entries[:count] if count else entries
+
+
+class _Pipeline:
+    """redis-py style pipeline: calls are queued and run in order on execute() (nothing to batch locally)."""
+
+    def __init__(self, store: SQLiteStore):
+        self._store = store
+        self._calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self._store, name)
+
+        def queue(*args, **kwargs):
+            self._calls.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self) -> list:
+        calls, self._calls = self._calls, []
+        return [method(*args, **kwargs) for method, args, kwargs in calls]
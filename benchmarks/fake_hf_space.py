@@ -0,0 +1,58 @@
+# benchmarks/fake_hf_space.py
+"""
+Local stub of the zeroscope HuggingFace Space (same /run signature) for load tests.
+Needs `pip install gradio`. Point the app at it with HF_SPACE=http://127.0.0.1:9003/
+
+    python -m benchmarks.fake_hf_space --port 9003 --latency 20
+"""
+import argparse
+import random
+import time
+
+from benchmarks.fake_vidu import _default_sample
+
+SETTINGS = {"latency": 20.0, "failure_rate": 0.0, "sample_video": None}
+
+
+def run(prompt: str, seed: float, num_frames: float, num_inference_steps: float) -> str:
+    time.sleep(random.uniform(0.5, 1.5) * SETTINGS["latency"])
+    if random.random() < SETTINGS["failure_rate"]:
+        raise RuntimeError("fake HuggingFace failure")
+    return SETTINGS["sample_video"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9003)
+    parser.add_argument("--latency", type=float, default=SETTINGS["latency"])
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=1, help="parallel predictions the Space accepts")
+    parser.add_argument("--sample-video", default=None)
+    args = parser.parse_args(argv)
+
+    try:
+        import gradio as gr
+    except ImportError:
+        raise SystemExit("The stub Space needs gradio: pip install gradio")
+
+    SETTINGS.update({
+        "latency": args.latency,
+        "failure_rate": args.failure_rate,
+        "sample_video": args.sample_video or _default_sample(),
+    })
+
+    demo = gr.Interface(
+        fn=run,
+        inputs=[gr.Textbox(label="prompt"), gr.Number(label="seed"),
+                gr.Number(label="num_frames"), gr.Number(label="num_inference_steps")],
+        outputs=gr.Video(),
+        api_name="run",
+    )
+    demo.queue(default_concurrency_limit=args.concurrency).launch(
+        server_name=args.host, server_port=args.port, show_error=True
+    )
+
+
+if __name__ == "__main__":
+    main()
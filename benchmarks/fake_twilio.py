@@ -0,0 +1,69 @@
+# benchmarks/fake_twilio.py
+"""
+Local stand-in for the Twilio Messages endpoint used by the load tests.
+Point the app at it with TWILIO_API_BASE_URL=http://127.0.0.1:9002
+
+    python -m benchmarks.fake_twilio --port 9002 --latency 0.15
+"""
+import argparse
+import asyncio
+import random
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Fake Twilio API")
+
+SETTINGS = {"latency": 0.15, "failure_rate": 0.0}
+STATS = {"messages": 0, "media_messages": 0, "failures": 0}
+
+
+@app.post("/2010-04-01/Accounts/{account_sid}/Messages.json")
+async def create_message(account_sid: str, request: Request):
+    if SETTINGS["latency"] > 0:
+        await asyncio.sleep(random.uniform(0.5, 1.5) * SETTINGS["latency"])
+
+    if random.random() < SETTINGS["failure_rate"]:
+        STATS["failures"] += 1
+        return JSONResponse(status_code=500, content={"code": 20500, "message": "fake outage", "status": 500})
+
+    form = await request.form()
+    STATS["messages"] += 1
+    if form.get("MediaUrl"):
+        STATS["media_messages"] += 1
+
+    return JSONResponse(status_code=201, content={
+        "sid": "SM" + uuid.uuid4().hex,
+        "account_sid": account_sid,
+        "to": form.get("To"),
+        "from": form.get("From"),
+        "body": form.get("Body"),
+        "status": "queued",
+        "num_media": "1" if form.get("MediaUrl") else "0",
+    })
+
+
+@app.get("/__bench__/stats")
+async def stats():
+    return dict(STATS)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9002)
+    parser.add_argument("--latency", type=float, default=SETTINGS["latency"])
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    SETTINGS.update({"latency": args.latency, "failure_rate": args.failure_rate})
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# benchmarks/fake_vidu.py
+"""
+Local stand-in for the Vidu API used by the load tests.
+
+    python -m benchmarks.fake_vidu --port 9001 --generation-time 10 --submit-failure-rate 0.05
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from pathlib import Path
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import FileResponse, JSONResponse
+
+app = FastAPI(title="Fake Vidu API")
+
+SETTINGS = {
+    "public_url": "http://127.0.0.1:9001",
+    "submit_latency": 0.3,
+    "poll_latency": 0.05,
+    "download_latency": 0.2,
+    "generation_time": 10.0,
+    "submit_failure_rate": 0.0,
+    "task_failure_rate": 0.0,
+    "concurrency_limit": 4,
+    "sample_video": None,
+}
+
+TASKS = {}
+STATS = {"submitted": 0, "submit_failures": 0, "polls": 0, "downloads": 0, "credits": 0, "cancelled": 0}
+
+
+async def _latency(mean: float) -> None:
+    """Sleep around `mean` seconds (±50% jitter)."""
+    if mean > 0:
+        await asyncio.sleep(random.uniform(0.5, 1.5) * mean)
+
+
+def _active_tasks() -> int:
+    now = time.monotonic()
+    return sum(1 for t in TASKS.values() if now - t["created"] < SETTINGS["generation_time"])
+
+
+@app.post("/ent/v2/text2video")
+async def text2video(payload: dict):
+    await _latency(SETTINGS["submit_latency"])
+    if random.random() < SETTINGS["submit_failure_rate"]:
+        STATS["submit_failures"] += 1
+        return JSONResponse(status_code=503, content={"code": 503, "message": "fake outage"})
+
+    task_id = uuid.uuid4().hex
+    TASKS[task_id] = {
+        "created": time.monotonic(),
+        "prompt": payload.get("prompt"),
+        "fail": random.random() < SETTINGS["task_failure_rate"],
+    }
+    STATS["submitted"] += 1
+    return {"task_id": task_id, "state": "created", "model": payload.get("model")}
+
+
+@app.get("/ent/v2/tasks/{task_id}/creations")
+async def task_creations(task_id: str):
+    await _latency(SETTINGS["poll_latency"])
+    STATS["polls"] += 1
+    task = TASKS.get(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="task not found")
+
+    if time.monotonic() - task["created"] < SETTINGS["generation_time"]:
+        return {"id": task_id, "state": "processing", "creations": []}
+    if task["fail"]:
+        return {"id": task_id, "state": "failed", "err_code": "FakeFailure", "creations": []}
+    return {
+        "id": task_id,
+        "state": "success",
+        "creations": [{"id": task_id, "url": f"{SETTINGS['public_url']}/files/{task_id}.mp4", "cover_url": ""}],
+    }
+
+
+@app.post("/ent/v2/tasks/{task_id}/cancel")
+async def cancel_task(task_id: str):
+    if TASKS.pop(task_id, None) is None:
+        raise HTTPException(status_code=404, detail="task not found")
+    STATS["cancelled"] += 1
+    return {}
+
+
+@app.get("/ent/v2/credits")
+async def credits():
+    STATS["credits"] += 1
+    active = _active_tasks()
+    limit = SETTINGS["concurrency_limit"]
+    return {
+        "remains": [{
+            "type": "test",
+            "credit_remain": 1_000_000,
+            "concurrency_limit": limit,
+            "current_concurrency": min(active, limit),
+            "queue_count": max(0, active - limit),
+        }]
+    }
+
+
+@app.get("/files/{name}")
+async def files(name: str):
+    await _latency(SETTINGS["download_latency"])
+    STATS["downloads"] += 1
+    return FileResponse(SETTINGS["sample_video"], media_type="video/mp4")
+
+
+@app.get("/__bench__/stats")
+async def stats():
+    return dict(STATS, tasks=len(TASKS), active=_active_tasks())
+
+
+def _default_sample() -> str:
+    videos = sorted((Path(__file__).resolve().parents[1] / "videos").glob("*.mp4"))
+    if not videos:
+        raise SystemExit("No sample video found in ./videos, pass --sample-video")
+    return str(videos[0])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--submit-latency", type=float, default=SETTINGS["submit_latency"])
+    parser.add_argument("--poll-latency", type=float, default=SETTINGS["poll_latency"])
+    parser.add_argument("--download-latency", type=float, default=SETTINGS["download_latency"])
+    parser.add_argument("--generation-time", type=float, default=SETTINGS["generation_time"])
+    parser.add_argument("--submit-failure-rate", type=float, default=0.0)
+    parser.add_argument("--task-failure-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency-limit", type=int, default=SETTINGS["concurrency_limit"])
+    parser.add_argument("--sample-video", default=None)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    SETTINGS.update({
+        "public_url": f"http://{args.host}:{args.port}",
+        "submit_latency": args.submit_latency,
+        "poll_latency": args.poll_latency,
+        "download_latency": args.download_latency,
+        "generation_time": args.generation_time,
+        "submit_failure_rate": args.submit_failure_rate,
+        "task_failure_rate": args.task_failure_rate,
+        "concurrency_limit": args.concurrency_limit,
+        "sample_video": args.sample_video or _default_sample(),
+    })
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+# benchmarks/load_test.py
+"""
+Load generator for the video API and the WhatsApp webhook.
+
+Spawns the fake Vidu and Twilio servers plus the app (benchmarks.serve_app), drives
+/api/generate-video, /api/status and /webhook/whatsapp with N concurrent simulated
+users and writes a JSON report that can be compared against a previous run:
+
+    python -m benchmarks.load_test --users 20 --duration 60 --output bench/HEAD.json
+    python -m benchmarks.load_test --users 20 --duration 60 --compare bench/HEAD.json
+"""
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+VIDEOS_DIR = ROOT_DIR / "videos"
+
+PROMPTS = [
+    "A golden retriever playing in a park",
+    "Astronaut floating in space with stars in the background",
+    "Ocean waves at sunset with seagulls flying",
+    "A cat dancing on a rooftop in the rain",
+    "Neon city street at night with flying cars",
+]
+
+
+class Recorder:
+    """Thread-safe collection of per-endpoint latencies and outcome counters."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.counters = {}
+
+    def request(self, name: str, seconds: float, ok: bool) -> None:
+        with self.lock:
+            self.latencies.setdefault(name, []).append(seconds * 1000)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+
+def percentiles(values: list) -> dict:
+    """Nearest-rank p50/p90/p95/p99/max, rounded to 0.1ms."""
+    if not values:
+        return {"p50": 0.0, "p90": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    values = sorted(values)
+
+    def pct(p):
+        return round(values[max(1, math.ceil(p / 100 * len(values))) - 1], 1)
+
+    return {"p50": pct(50), "p90": pct(90), "p95": pct(95), "p99": pct(99), "max": round(values[-1], 1)}
+
+
+def _timed(recorder: Recorder, name: str, fn, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        response = fn(*args, **kwargs)
+        recorder.request(name, time.perf_counter() - start, response.status_code < 500)
+        return response
+    except requests.RequestException:
+        recorder.request(name, time.perf_counter() - start, False)
+        return None
+
+
+def web_user(args, recorder: Recorder, stop_at: float, rng: random.Random):
+    """Submit a prompt, poll status until the job finishes, repeat."""
+    session = requests.Session()
+    while time.monotonic() < stop_at:
+        job_start = time.perf_counter()
+        response = _timed(recorder, "POST /api/generate-video", session.post,
+                          f"{args.app_url}/api/generate-video", json={"prompt": rng.choice(PROMPTS)}, timeout=30)
+        if response is None or response.status_code != 200:
+            recorder.count("web_jobs_rejected")
+            time.sleep(args.think_time)
+            continue
+
+        job_id = response.json()["job_id"]
+        recorder.count("web_jobs_submitted")
+        deadline = time.monotonic() + args.job_timeout
+        status = "processing"
+        etag = None
+        next_poll = args.poll_interval
+        first_eta = None  # (eta_seconds, when it was given), to score the estimate
+        while time.monotonic() < deadline and time.monotonic() < stop_at + args.job_timeout:
+            if args.long_poll:
+                poll = _timed(recorder, "GET /api/status", session.get,
+                              f"{args.app_url}/api/status/{job_id}", params={"wait": args.long_poll},
+                              headers={"If-None-Match": etag} if etag else {}, timeout=args.long_poll + 30)
+            else:
+                time.sleep(next_poll)
+                poll = _timed(recorder, "GET /api/status", session.get,
+                              f"{args.app_url}/api/status/{job_id}", timeout=30)
+            recorder.count("web_status_requests")
+            if poll is not None and poll.status_code == 200:
+                etag = poll.headers.get("ETag")
+                body = poll.json()
+                status = body.get("status", "unknown")
+                if args.poll_hint and body.get("next_poll_ms"):
+                    next_poll = body["next_poll_ms"] / 1000
+                if first_eta is None and status != "completed" and body.get("eta_seconds") is not None:
+                    first_eta = (body["eta_seconds"], time.perf_counter())
+                if status in ("completed", "error"):
+                    break
+
+        recorder.count(f"web_jobs_{status}")
+        if status == "completed":
+            recorder.request("job end-to-end (web)", time.perf_counter() - job_start, True)
+            if first_eta:
+                eta, given_at = first_eta
+                recorder.request("ETA absolute error (web)", abs(time.perf_counter() - given_at - eta), True)
+        time.sleep(args.think_time)
+
+
+def whatsapp_user(args, recorder: Recorder, stop_at: float, rng: random.Random, user_index: int):
+    """Send /generate and pick the enhanced prompt, like a real WhatsApp user."""
+    session = requests.Session()
+    phone = f"whatsapp:+1555{user_index:07d}"
+    message_no = 0
+
+    def send(body):
+        nonlocal message_no
+        message_no += 1
+        response = _timed(recorder, "POST /webhook/whatsapp", session.post,
+                          f"{args.app_url}/webhook/whatsapp", timeout=30, data={
+                              "From": phone,
+                              "To": "whatsapp:+14155238886",
+                              "Body": body,
+                              "MessageSid": f"SMbench{user_index:05d}{message_no:06d}",
+                          })
+        if response is not None and response.status_code == 200:
+            recorder.count(f"whatsapp_{response.json().get('status', 'unknown')}")
+
+    while time.monotonic() < stop_at:
+        send(f"/generate {rng.choice(PROMPTS)}")
+        time.sleep(args.think_time)
+        send("1")
+        time.sleep(args.think_time)
+
+
+def _spawn(module: str, extra_args: list, env: dict) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-m", module] + extra_args, cwd=str(ROOT_DIR), env=env)
+
+
+def _wait_ready(url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"Timed out waiting for {url}")
+
+
+def _get_json(url: str) -> dict:
+    try:
+        return requests.get(url, timeout=10).json()
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=str(ROOT_DIR), text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def start_servers(args) -> list:
+    """Start the fakes and the app; returns the processes to terminate afterwards."""
+    vidu_url = f"http://127.0.0.1:{args.vidu_port}"
+    twilio_url = f"http://127.0.0.1:{args.twilio_port}"
+    env = dict(os.environ)
+    processes = [
+        _spawn("benchmarks.fake_vidu", [
+            "--port", str(args.vidu_port),
+            "--generation-time", str(args.generation_time),
+            "--submit-latency", str(args.vidu_latency),
+            "--submit-failure-rate", str(args.vidu_failure_rate),
+            "--task-failure-rate", str(args.task_failure_rate),
+            "--concurrency-limit", str(args.vidu_concurrency),
+            "--seed", str(args.seed),
+        ], env),
+        _spawn("benchmarks.fake_twilio", [
+            "--port", str(args.twilio_port),
+            "--latency", str(args.twilio_latency),
+            "--failure-rate", str(args.twilio_failure_rate),
+            "--seed", str(args.seed),
+        ], env),
+    ]
+    _wait_ready(f"{vidu_url}/__bench__/stats")
+    _wait_ready(f"{twilio_url}/__bench__/stats")
+
+    # Without the stub Space, point HF at a closed port so the fallback fails fast
+    hf_space = "http://127.0.0.1:9/"
+    if args.fake_hf:
+        hf_space = f"http://127.0.0.1:{args.hf_port}/"
+        processes.append(_spawn("benchmarks.fake_hf_space", [
+            "--port", str(args.hf_port),
+            "--latency", str(args.hf_latency),
+        ], env))
+        _wait_ready(hf_space, timeout=60)
+
+    app_env = dict(env, **{
+        "VIDU_API_KEY": "bench",
+        "VIDU_BASE_URL": vidu_url,
+        "TWILIO_ACCOUNT_SID": "AC" + "0" * 32,
+        "TWILIO_AUTH_TOKEN": "bench",
+        "TWILIO_API_BASE_URL": twilio_url,
+        "HUGGINGFACE_TOKEN": "",
+        "HF_SPACE": hf_space,
+        "REDIS_URL": args.redis_url,
+        "LOOP_MONITOR": "true",
+    })
+    processes.append(_spawn("benchmarks.serve_app", ["--port", str(args.app_port)], app_env))
+    _wait_ready(f"{args.app_url}/__bench__/stats", timeout=60)
+    return processes
+
+
+def run(args) -> dict:
+    videos_before = set(VIDEOS_DIR.glob("*")) if VIDEOS_DIR.exists() else set()
+    processes = [] if args.no_spawn else start_servers(args)
+    recorder = Recorder()
+
+    try:
+        _get_json(f"{args.app_url}/__bench__/stats?reset=true")
+        stop_at = time.monotonic() + args.duration
+        threads = []
+        n_whatsapp = int(round(args.users * args.whatsapp_ratio))
+        for i in range(args.users):
+            rng = random.Random(args.seed + i)
+            if i < n_whatsapp:
+                target, extra = whatsapp_user, (i,)
+            else:
+                target, extra = web_user, ()
+            t = threading.Thread(target=target, args=(args, recorder, stop_at, rng) + extra, daemon=True)
+            threads.append(t)
+
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=args.duration + args.job_timeout + 30)
+        elapsed = time.perf_counter() - started
+
+        report = {
+            "meta": {
+                "commit": _git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "elapsed_s": round(elapsed, 1),
+                "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+            },
+            "requests": {},
+            "counters": dict(sorted(recorder.counters.items())),
+            "server": _get_json(f"{args.app_url}/__bench__/stats"),
+            "fake_vidu": _get_json(f"http://127.0.0.1:{args.vidu_port}/__bench__/stats"),
+            "fake_twilio": _get_json(f"http://127.0.0.1:{args.twilio_port}/__bench__/stats"),
+        }
+        for name, values in sorted(recorder.latencies.items()):
+            report["requests"][name] = dict(
+                count=len(values),
+                errors=recorder.errors.get(name, 0),
+                rps=round(len(values) / elapsed, 2),
+                **percentiles(values),
+            )
+        return report
+    finally:
+        for p in processes:
+            p.terminate()
+        for p in processes:
+            try:
+                p.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+        if VIDEOS_DIR.exists() and not args.keep_videos:
+            for path in set(VIDEOS_DIR.glob("*")) - videos_before:
+                path.unlink(missing_ok=True)
+
+
+def _flatten(data: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(previous: dict, current: dict) -> None:
+    """Print every numeric metric that exists in both reports with its relative change."""
+    old = _flatten({k: previous.get(k, {}) for k in ("requests", "counters", "server")})
+    new = _flatten({k: current.get(k, {}) for k in ("requests", "counters", "server")})
+    print(f"\nComparison {previous['meta']['commit']} → {current['meta']['commit']}")
+    for name in sorted(set(old) & set(new)):
+        before, after = old[name], new[name]
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"  {name:<60} {before:>10} → {after:<10} {change}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10, help="concurrent simulated users")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to keep starting new work")
+    parser.add_argument("--whatsapp-ratio", type=float, default=0.5, help="share of users that use the webhook")
+    parser.add_argument("--poll-interval", type=float, default=3.0, help="web client status poll interval")
+    parser.add_argument("--long-poll", type=float, default=0,
+                        help="long-poll status with ?wait=N and If-None-Match instead of polling every interval")
+    parser.add_argument("--poll-hint", action="store_true",
+                        help="when polling, wait the server's next_poll_ms instead of --poll-interval")
+    parser.add_argument("--think-time", type=float, default=2.0)
+    parser.add_argument("--job-timeout", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--app-port", type=int, default=8001)
+    parser.add_argument("--vidu-port", type=int, default=9001)
+    parser.add_argument("--twilio-port", type=int, default=9002)
+    parser.add_argument("--app-url", default=None, help="defaults to http://127.0.0.1:<app-port>")
+    parser.add_argument("--no-spawn", action="store_true", help="use already running servers")
+    parser.add_argument("--redis-url", default=os.getenv("BENCH_REDIS_URL", "redis://localhost:6379/15"))
+    parser.add_argument("--generation-time", type=float, default=10.0)
+    parser.add_argument("--vidu-latency", type=float, default=0.3)
+    parser.add_argument("--vidu-failure-rate", type=float, default=0.0)
+    parser.add_argument("--task-failure-rate", type=float, default=0.0)
+    parser.add_argument("--vidu-concurrency", type=int, default=4)
+    parser.add_argument("--twilio-latency", type=float, default=0.15)
+    parser.add_argument("--fake-hf", action="store_true", help="start the stub HuggingFace Space (needs gradio)")
+    parser.add_argument("--hf-port", type=int, default=9003)
+    parser.add_argument("--hf-latency", type=float, default=20.0)
+    parser.add_argument("--twilio-failure-rate", type=float, default=0.0)
+    parser.add_argument("--keep-videos", action="store_true")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="previous JSON report to diff against")
+    args = parser.parse_args(argv)
+    args.app_url = args.app_url or f"http://127.0.0.1:{args.app_port}"
+
+    report = run(args)
+    print(json.dumps({k: report[k] for k in ("requests", "counters", "server")}, indent=2))
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"Report written to {args.output}")
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# benchmarks/serve_app.py
+"""
+Run the real app with an event-loop lag sampler and a /__bench__/stats endpoint.
+Started by benchmarks.load_test; configure it through the usual environment variables.
+"""
+import argparse
+import asyncio
+import resource
+import time
+from collections import deque
+
+from main import app
+from app.services.loop_monitor_service import get_loop_metrics, reset_loop_metrics
+
+LAG_SAMPLES = deque(maxlen=100_000)
+SAMPLE_INTERVAL = 0.05
+
+
+async def _sample_loop_lag():
+    """Measure how late the loop wakes us up compared to the requested sleep."""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(SAMPLE_INTERVAL)
+        LAG_SAMPLES.append((time.perf_counter() - start - SAMPLE_INTERVAL) * 1000)
+
+
+def _rss_mb() -> float:
+    """Current resident set size (Linux), falling back to the peak."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / 1024 / 1024
+    except Exception:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@app.on_event("startup")
+async def _start_lag_sampler():
+    asyncio.create_task(_sample_loop_lag())
+
+
+@app.get("/__bench__/stats", include_in_schema=False)
+async def bench_stats(reset: bool = False):
+    samples = sorted(LAG_SAMPLES)
+    monitor = get_loop_metrics()
+    if reset:
+        LAG_SAMPLES.clear()
+        reset_loop_metrics()
+
+    def pct(p):
+        return round(samples[min(len(samples) - 1, int(p / 100 * len(samples)))], 2) if samples else 0.0
+
+    return {
+        "loop_lag_ms": {
+            "samples": len(samples),
+            "p50": pct(50),
+            "p95": pct(95),
+            "p99": pct(99),
+            "max": round(samples[-1], 2) if samples else 0.0,
+        },
+        "loop_stalls": monitor["stalls"],
+        "loop_blocked_ms": monitor["blocked_ms"],
+        "loop_stalls_by_site": {site: entry["count"] for site, entry in monitor["by_site"].items()},
+        "rss_mb": round(_rss_mb(), 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "tasks": len(asyncio.all_tasks()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args(argv)
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# benchmarks/storage_footprint.py
+"""
+Bytes per job stored in Redis, legacy JSON vs the binary record format.
+
+Without arguments it builds representative web and WhatsApp jobs (full timeline,
+encode report, preview paths) and compares both encodings, including the per-user
+JSON copy the legacy layout kept under user_job:{phone}:{id}:
+
+    python -m benchmarks.storage_footprint --jobs 1000
+
+Against a live Redis it samples job keys and reports MEMORY USAGE per job;
+--migrate rewrites legacy records first and reports again:
+
+    python -m benchmarks.storage_footprint --redis redis://localhost:6379 --migrate
+"""
+import argparse
+import json
+import os
+import random
+import time
+import uuid
+
+from app.utils.record_codec import encode_job, is_legacy
+
+PROMPTS = [
+    "A golden retriever playing in a park",
+    "Astronaut floating in space with stars in the background",
+    "Ocean waves at sunset with seagulls flying",
+    "A cat dancing on a rooftop in the rain",
+    "Neon city street at night with flying cars",
+]
+PUBLIC_BASE_URL = "https://video-generation-web-app-production.up.railway.app"
+
+# Approximate per-key overhead of a Redis string with TTL (dictEntry, robj, SDS headers, expires entry)
+REDIS_KEY_OVERHEAD = 70
+
+
+def sample_job(job_id: str, whatsapp: bool) -> dict:
+    """A completed job as the pipeline leaves it."""
+    ms = 0
+    timeline = []
+    for stage in ("queued", "connecting", "submitting", "generating", "downloading", "probing", "remuxing", "completed"):
+        timeline.append([stage, ms])
+        ms += random.randint(50, 60000)
+    job = {
+        "status": "completed",
+        "message": "Video generation completed!",
+        "video_url": f"{PUBLIC_BASE_URL}/api/download/{job_id}",
+        "prompt": random.choice(PROMPTS),
+        "started_at": time.time(),
+        "stage": "completed",
+        "timeline": timeline,
+        "provider": "vidu",
+        "provider_task_id": str(random.randint(10 ** 17, 10 ** 18)),
+        "raw_video_path": f"./videos/{job_id}.mp4",
+        "video_path": f"./videos/{job_id}_ready.mp4",
+        "poster_path": f"./videos/{job_id}_poster.jpg",
+        "preview_path": f"./videos/{job_id}_preview.gif",
+        "owner": "web-1:4312",
+        "encode": {"mode": "remux", "size_bytes": 4_812_331, "video_kbps": 2411, "attempts": 1, "seconds": 0.4},
+    }
+    if whatsapp:
+        job["user_phone"] = f"whatsapp:+1555{random.randint(1000000, 9999999)}"
+        timeline.append(["delivered", ms])
+        job["stage"] = "delivered"
+    return job
+
+
+def synthetic_report(n: int, whatsapp_share: float) -> dict:
+    legacy = binary = 0
+    for _ in range(n):
+        job_id = str(uuid.uuid4())
+        whatsapp = random.random() < whatsapp_share
+        job = sample_job(job_id, whatsapp)
+
+        payload = json.dumps(job)
+        legacy += len(f"job:{job_id}") + len(payload) + REDIS_KEY_OVERHEAD
+        if whatsapp:
+            phone = job["user_phone"].replace("whatsapp:", "").replace("+", "")
+            legacy += len(f"user_job:{phone}:{job_id}") + len(payload) + REDIS_KEY_OVERHEAD
+
+        binary += len(f"job:{job_id}") + len(encode_job(job_id, job)) + REDIS_KEY_OVERHEAD
+        if whatsapp:
+            binary += len(job_id) + 11  # one entry in the user_jobs:{phone} list
+    return {
+        "jobs": n,
+        "legacy_bytes_per_job": round(legacy / n, 1),
+        "binary_bytes_per_job": round(binary / n, 1),
+        "reduction": f"{100 * (1 - binary / legacy):.1f}%",
+    }
+
+
+def redis_report(client, sample: int) -> dict:
+    """MEMORY USAGE of sampled job records plus the legacy per-user copies."""
+    job_keys = []
+    for key in client.scan_iter(match="job:*", count=1000):
+        job_keys.append(key)
+        if len(job_keys) >= sample:
+            break
+    if not job_keys:
+        return {"jobs": 0}
+
+    job_bytes = sum(client.memory_usage(k) or 0 for k in job_keys)
+    legacy_records = sum(1 for k in job_keys if is_legacy(client.get(k)))
+    copies = list(client.scan_iter(match="user_job:*", count=1000))
+    copy_bytes = sum(client.memory_usage(k) or 0 for k in copies)
+    total_jobs = sum(1 for _ in client.scan_iter(match="job:*", count=1000))
+    return {
+        "jobs_sampled": len(job_keys),
+        "legacy_records_in_sample": legacy_records,
+        "bytes_per_job": round(job_bytes / len(job_keys), 1),
+        "user_job_copies": len(copies),
+        "copy_bytes_per_job": round(copy_bytes / max(1, total_jobs), 1),
+    }
+
+
+def migrate(client) -> int:
+    """Rewrite legacy JSON job records and fold user_job copies into the user index."""
+    from app.services.redis_service import get_job_data, migrate_legacy_user_jobs
+
+    migrated = 0
+    for key in client.scan_iter(match="job:*", count=1000):
+        if is_legacy(client.get(key)):
+            get_job_data(key.decode().split(":", 1)[1])  # reading migrates the record
+            migrated += 1
+    phones = {k.decode().split(":")[1] for k in client.scan_iter(match="user_job:*", count=1000)}
+    for phone in phones:
+        migrate_legacy_user_jobs(phone)
+    return migrated
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=1000, help="synthetic jobs to encode")
+    parser.add_argument("--whatsapp-share", type=float, default=0.5, help="share of synthetic jobs from WhatsApp")
+    parser.add_argument("--redis", help="measure a live Redis instead (URL)")
+    parser.add_argument("--sample", type=int, default=1000, help="job keys to sample from Redis")
+    parser.add_argument("--migrate", action="store_true", help="migrate legacy records and measure again")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if not args.redis:
+        random.seed(args.seed)
+        print(json.dumps(synthetic_report(args.jobs, args.whatsapp_share), indent=2))
+        return
+
+    import redis
+
+    os.environ["REDIS_URL"] = args.redis  # the app's storage layer does the migration
+    client = redis.from_url(args.redis)
+    report = {"before": redis_report(client, args.sample)}
+    if args.migrate:
+        report["migrated"] = migrate(client)
+        report["after"] = redis_report(client, args.sample)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,61 @@
+import asyncio
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from app.routes import web, whatsapp
+from app.services.recovery_service import recovery_loop
+from app.services.suggestion_service import get_prompt_index, suggestion_save_loop
+from app.services.static_service import load_static_assets
+from app.services.job_watch_service import start_job_watch
+from app.services.loop_monitor_service import LoopMonitorMiddleware, start_loop_monitor
+from app.services.eta_service import eta_model_loop
+from app.config import LOOP_MONITOR_ENABLED
 
 app = FastAPI(title="AI Video Generator API")
 
-# Mount static frontend
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
-
-
 # Attach routers
 app.include_router(web.router)
 app.include_router(whatsapp.router)
 
+if LOOP_MONITOR_ENABLED:
+    app.add_middleware(LoopMonitorMiddleware)
+
+
+@app.on_event("startup")
+async def start_recovery():
+    """Resume jobs left in flight by a previous process"""
+    asyncio.create_task(recovery_loop())
+
+@app.on_event("startup")
+async def start_suggestions():
+    """Load the prompt suggestion index and persist it as it grows"""
+    get_prompt_index()
+    asyncio.create_task(suggestion_save_loop())
+
+@app.on_event("startup")
+async def load_frontend():
+    """Read and precompress the frontend once, it is served from memory"""
+    load_static_assets()
+
+@app.on_event("startup")
+async def start_status_notifications():
+    """Wake long-polling status requests when a job changes, also across workers"""
+    start_job_watch()
+
+@app.on_event("startup")
+async def start_loop_diagnostics():
+    """Report callbacks that block the event loop (LOOP_MONITOR=true)"""
+    start_loop_monitor()
+
+@app.on_event("startup")
+async def start_eta_model():
+    """Refit the ETA model in the background, status requests only read it"""
+    asyncio.create_task(eta_model_loop())
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    from app.config import WORKER_COUNT
+
+    if WORKER_COUNT > 1:
+        # Workers re-import the app, so it has to be passed as an import string
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=WORKER_COUNT)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)